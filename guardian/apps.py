@@ -1,5 +1,5 @@
 from . import monkey_patch_user, monkey_patch_group
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 from . import monkey_patch_user
 from guardian.conf import settings
 
@@ -13,3 +13,27 @@ class GuardianConfig(AppConfig):
         monkey_patch_group()
         if settings.MONKEY_PATCH:
             monkey_patch_user()
+        from guardian.handlers import connect_memberships_handlers
+        connect_memberships_handlers()
+        if settings.CASCADE_DELETE_MODELS:
+            from guardian.handlers import register_obj_perms_cleanup
+            for label in settings.CASCADE_DELETE_MODELS:
+                register_obj_perms_cleanup(apps.get_model(label))
+        if settings.EFFECTIVE_OBJ_PERMS:
+            from guardian.handlers import connect_effective_obj_perms_handlers
+            connect_effective_obj_perms_handlers()
+        if settings.PRESENCE_CACHE_TIMEOUT is not None:
+            from guardian.handlers import connect_presence_handlers
+            connect_presence_handlers()
+        if settings.OBJ_PERMS_FILTER_TIMEOUT is not None:
+            from guardian.handlers import connect_obj_perms_filters_handlers
+            connect_obj_perms_filters_handlers()
+        if settings.OBJECTS_CACHE_TIMEOUT is not None:
+            from guardian.handlers import connect_objects_cache_handlers
+            connect_objects_cache_handlers()
+        if settings.ANONYMOUS_USER_CACHE:
+            from guardian.handlers import connect_anonymous_user_handlers
+            connect_anonymous_user_handlers()
+        if settings.ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT is not None:
+            from guardian.handlers import connect_anonymous_perms_snapshot_handlers
+            connect_anonymous_perms_snapshot_handlers()
@@ -1,9 +1,9 @@
-from django.contrib.auth import get_user_model
 from django.db import models
 from guardian.conf import settings
 from guardian.core import ObjectPermissionChecker
 from guardian.ctypes import get_content_type
 from guardian.exceptions import WrongAppError
+from guardian.utils import get_anonymous_user
 
 
 def check_object_support(obj):
@@ -31,9 +31,7 @@ def check_user_support(user_obj):
         # unauthorized
         if settings.ANONYMOUS_USER_NAME is None:
             return False, user_obj
-        User = get_user_model()
-        lookup = {User.USERNAME_FIELD: settings.ANONYMOUS_USER_NAME}
-        user_obj = User.objects.get(**lookup)
+        user_obj = get_anonymous_user()
 
     return True, user_obj
 
@@ -47,6 +45,24 @@ def check_support(user_obj, obj):
     return obj_support and user_support, user_obj
 
 
+def check_perm_app_label(perm, obj):
+    """
+    Raises ``WrongAppError`` if ``perm`` is prefixed with an app label other
+    than the one of ``obj`` (or of its content type)
+    """
+    if '.' in perm:
+        app_label, _ = perm.split('.', 1)
+        if app_label != obj._meta.app_label:
+            # Check the content_type app_label when permission
+            # and obj app labels don't match.
+            ctype = get_content_type(obj)
+            if app_label != ctype.app_label:
+                raise WrongAppError("Passed perm has app label of '%s' while "
+                                    "given obj has app label '%s' and given obj"
+                                    "content_type has app label '%s'" %
+                                    (app_label, obj._meta.app_label, ctype.app_label))
+
+
 class ObjectPermissionBackend:
     supports_object_permissions = True
     supports_anonymous_user = True
@@ -80,21 +96,32 @@ class ObjectPermissionBackend:
         if not support:
             return False
 
-        if '.' in perm:
-            app_label, _ = perm.split('.', 1)
-            if app_label != obj._meta.app_label:
-                # Check the content_type app_label when permission
-                # and obj app labels don't match.
-                ctype = get_content_type(obj)
-                if app_label != ctype.app_label:
-                    raise WrongAppError("Passed perm has app label of '%s' while "
-                                        "given obj has app label '%s' and given obj"
-                                        "content_type has app label '%s'" %
-                                        (app_label, obj._meta.app_label, ctype.app_label))
+        check_perm_app_label(perm, obj)
 
         check = ObjectPermissionChecker(user_obj)
         return check.has_perm(perm, obj, permission_expiry=check_permission_expiry)
 
+    def has_perms(self, user_obj, perm_list, obj=None, check_permission_expiry=True):
+        """
+        Returns ``True`` if given ``user_obj`` has each of permissions in
+        ``perm_list`` for ``obj``. If no ``obj`` is given, ``False`` is
+        returned.
+
+        Unlike calling :meth:`has_perm` for each permission, all of them are
+        checked with one :class:`guardian.core.ObjectPermissionChecker`, so
+        permissions of ``obj`` are fetched only once.
+        """
+        support, user_obj = check_support(user_obj, obj)
+        if not support:
+            return False
+
+        for perm in perm_list:
+            check_perm_app_label(perm, obj)
+
+        check = ObjectPermissionChecker(user_obj)
+        return all(check.has_perm(perm, obj, permission_expiry=check_permission_expiry)
+                   for perm in perm_list)
+
     def get_all_permissions(self, user_obj, obj=None):
         """
         Returns a set of permission strings that the given ``user_obj`` has for ``obj``
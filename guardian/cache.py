@@ -0,0 +1,558 @@
+"""
+Caches of data django-guardian resolves over and over while checking object
+permissions. They are invalidated by receivers from :mod:`guardian.handlers`.
+"""
+import hashlib
+import math
+import time
+import uuid
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils import timezone
+from organizations.models import Organization
+
+from guardian.conf import settings as guardian_settings
+from guardian.utils import get_generic_obj_perms_models, get_group_obj_perms_model, \
+    get_organization_obj_perms_model, get_user_obj_perms_model, is_integer_pk_model
+
+# Bumped whenever group or organization memberships change, so that ids
+# memoized on user instances are not used past the change within a process
+_memberships_version = 0
+
+# ``(pk, db, field attnames, values)`` of the anonymous user, see
+# get_cached_anonymous_user(); the version guards against storing a row
+# fetched before the user was changed
+_anonymous_user_row = None
+_anonymous_user_version = 0
+
+
+def get_cache():
+    return caches[guardian_settings.CACHE_ALIAS]
+
+
+def _get_memberships_cache_key(kind, user_id):
+    return 'guardian:%s_ids:%s' % (kind, user_id)
+
+
+def _get_membership_ids(user, kind, fetch):
+    attname = '_guardian_%s_ids' % kind
+    memoized = getattr(user, attname, None)
+    if memoized is not None and memoized[0] == _memberships_version:
+        return memoized[1]
+
+    version = _memberships_version
+    timeout = guardian_settings.MEMBERSHIPS_CACHE_TIMEOUT
+    ids = None
+    if timeout is not None:
+        key = _get_memberships_cache_key(kind, user.pk)
+        ids = get_cache().get(key)
+    if ids is None:
+        ids = frozenset(fetch())
+        if timeout is not None:
+            get_cache().set(key, ids, timeout)
+    setattr(user, attname, (version, ids))
+    return ids
+
+
+def get_user_group_ids(user):
+    """
+    Returns frozenset of primary keys of groups ``user`` is member of.
+
+    Ids are memoized on ``user`` instance (usually living for a single
+    request) and, if :setting:`GUARDIAN_MEMBERSHIPS_CACHE_TIMEOUT` is set,
+    stored in the cache shared by processes. Both are invalidated when
+    memberships of the user change.
+    """
+    if not user.pk:
+        return frozenset()
+    User = get_user_model()
+    return _get_membership_ids(user, 'group', lambda: (
+        User.groups.through.objects.filter(**{User.groups.field.m2m_field_name(): user.pk})
+        .values_list(User.groups.field.m2m_reverse_field_name(), flat=True)))
+
+
+def get_user_organization_ids(user):
+    """
+    Returns frozenset of primary keys of organizations ``user`` is member of.
+    Cached the same way as :func:`get_user_group_ids`.
+    """
+    if not user.pk:
+        return frozenset()
+    return _get_membership_ids(user, 'organization', lambda: (
+        Organization.users.through.objects.filter(user=user.pk).values_list('organization', flat=True)))
+
+
+def invalidate_memberships(user_ids):
+    """
+    Drops cached group and organization ids of users with given primary keys.
+    """
+    global _memberships_version
+    _memberships_version += 1
+    if guardian_settings.MEMBERSHIPS_CACHE_TIMEOUT is not None:
+        get_cache().delete_many([_get_memberships_cache_key(kind, user_id)
+                                 for user_id in user_ids
+                                 for kind in ('group', 'organization')])
+
+
+def get_cached_anonymous_user():
+    """
+    Returns the anonymous user (see :setting:`ANONYMOUS_USER_NAME`), fetching
+    it only once per process.
+
+    Its field values are memoized and a new instance is built from them on
+    each call, so callers may freely modify the returned instance. The memo
+    is dropped when the user is saved or deleted (see
+    :setting:`GUARDIAN_ANONYMOUS_USER_CACHE`).
+    """
+    global _anonymous_user_row
+    User = get_user_model()
+    row = _anonymous_user_row
+    if row is not None:
+        return User.from_db(*row[1:])
+
+    version = _anonymous_user_version
+    user = User.objects.get(**{User.USERNAME_FIELD: guardian_settings.ANONYMOUS_USER_NAME})
+    field_names = [field.attname for field in User._meta.concrete_fields]
+    row = (user.pk, user._state.db, field_names, tuple(getattr(user, name) for name in field_names))
+    if version == _anonymous_user_version:
+        _anonymous_user_row = row
+    return user
+
+
+def get_cached_anonymous_user_pk():
+    """
+    Returns primary key of the anonymous user memoized by
+    :func:`get_cached_anonymous_user`, or ``None`` if it is not memoized.
+    """
+    row = _anonymous_user_row
+    return row[0] if row is not None else None
+
+
+def invalidate_anonymous_user():
+    """
+    Drops the anonymous user memoized by :func:`get_cached_anonymous_user`.
+    """
+    global _anonymous_user_row, _anonymous_user_version
+    _anonymous_user_version += 1
+    _anonymous_user_row = None
+
+
+def _get_presence_cache_key(model, ctype_id):
+    return 'guardian:presence:%s:%s' % (model._meta.label_lower, ctype_id)
+
+
+def obj_perms_exist(model, ctype):
+    """
+    Returns ``False`` if there are no object permissions of generic group or
+    organization permission ``model`` for objects of content type ``ctype``,
+    so that queries for them can be skipped. Presence is cached if
+    :setting:`GUARDIAN_PRESENCE_CACHE_TIMEOUT` is set; ``True`` is returned
+    otherwise, as well as for direct foreign key models.
+    """
+    timeout = guardian_settings.PRESENCE_CACHE_TIMEOUT
+    if timeout is None or not model.objects.is_generic():
+        return True
+    key = _get_presence_cache_key(model, ctype.pk)
+    exists = get_cache().get(key)
+    if exists is None:
+        exists = model.objects.filter(content_type=ctype).exists()
+        # Does not overwrite presence marked by permissions created meanwhile
+        get_cache().add(key, exists, timeout)
+    return exists
+
+
+def mark_obj_perms_exist(model, ctype_ids):
+    """
+    Marks object permissions of ``model`` as present for content types with
+    given primary keys.
+    """
+    timeout = guardian_settings.PRESENCE_CACHE_TIMEOUT
+    if timeout is not None:
+        get_cache().set_many({_get_presence_cache_key(model, ctype_id): True
+                              for ctype_id in ctype_ids}, timeout)
+
+
+def invalidate_obj_perms_presence(model, ctype_ids):
+    """
+    Drops cached presence of object permissions of ``model`` for content types
+    with given primary keys; it is checked again on the next use.
+    """
+    if guardian_settings.PRESENCE_CACHE_TIMEOUT is not None:
+        get_cache().delete_many([_get_presence_cache_key(model, ctype_id) for ctype_id in ctype_ids])
+
+
+class BloomFilter:
+    """
+    Compact set of strings answering membership tests with false positives at
+    roughly ``error_rate`` for up to ``capacity`` items, but never with false
+    negatives.
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _get_positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._get_positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(item))
+
+
+def _get_filter_cache_keys(user_id):
+    return 'guardian:filter:%s' % user_id, 'guardian:filter_generation:%s' % user_id
+
+
+def get_obj_perms_filter_item(ctype_id, object_pk):
+    return '%s:%s' % (ctype_id, object_pk)
+
+
+def _build_obj_perms_filter(user):
+    user_model, group_model, organization_model = get_generic_obj_perms_models()
+    fields = ('content_type_id', 'object_pk')
+    queryset = user_model.objects.filter(user=user).values_list(*fields)
+    group_ids = get_user_group_ids(user)
+    if group_ids:
+        queryset = queryset.union(group_model.objects.filter(group__in=group_ids).values_list(*fields), all=True)
+    organization_ids = get_user_organization_ids(user)
+    if organization_ids:
+        queryset = queryset.union(
+            organization_model.objects.filter(organization__in=organization_ids).values_list(*fields), all=True)
+    items = {get_obj_perms_filter_item(ctype_id, object_pk) for ctype_id, object_pk in queryset}
+    obj_perms_filter = BloomFilter(len(items), guardian_settings.OBJ_PERMS_FILTER_ERROR_RATE)
+    for item in items:
+        obj_perms_filter.add(item)
+    return obj_perms_filter
+
+
+def get_obj_perms_filter(user):
+    """
+    Returns :class:`BloomFilter` of ``"<content type id>:<object pk>"`` items
+    of all objects ``user`` has generic object permissions for, directly or
+    through groups and organizations, or ``None`` if
+    :setting:`GUARDIAN_OBJ_PERMS_FILTER_TIMEOUT` is not set. Objects not in
+    the filter are certainly not granted to the user.
+
+    The filter is built with a single query and cached; it is rebuilt after
+    permissions are granted to the user or their memberships change.
+    """
+    timeout = guardian_settings.OBJ_PERMS_FILTER_TIMEOUT
+    if timeout is None or not user.pk:
+        return None
+    filter_key, generation_key = _get_filter_cache_keys(user.pk)
+    cache = get_cache()
+    cached = cache.get_many([filter_key, generation_key])
+    generation = cached.get(generation_key)
+    if generation is not None and filter_key in cached and cached[filter_key][0] == generation:
+        return cached[filter_key][1]
+
+    if generation is None:
+        cache.add(generation_key, uuid.uuid4().hex, timeout)
+        generation = cache.get(generation_key)
+    # Built filter is ignored if the generation changes while building it
+    obj_perms_filter = _build_obj_perms_filter(user)
+    cache.set(filter_key, (generation, obj_perms_filter), timeout)
+    return obj_perms_filter
+
+
+def invalidate_obj_perms_filters(user_ids):
+    """
+    Makes cached object permission filters of users with given primary keys
+    stale, so they are rebuilt on the next use.
+    """
+    timeout = guardian_settings.OBJ_PERMS_FILTER_TIMEOUT
+    if timeout is not None:
+        generation = uuid.uuid4().hex
+        get_cache().set_many({_get_filter_cache_keys(user_id)[1]: generation for user_id in user_ids}, timeout)
+
+
+class ObjectIdSet:
+    """
+    Sorted set of integer primary keys kept as an array. Pickled (i.e. when
+    stored in the cache) as packed integers or, for dense ranges of ids, as a
+    compressed bitmap, whichever is smaller.
+    """
+
+    def __init__(self, ids=()):
+        self.ids = array('q', sorted(set(ids)))
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, pk):
+        index = bisect_left(self.ids, pk)
+        return index < len(self.ids) and self.ids[index] == pk
+
+    def __getstate__(self):
+        packed = self.ids.tobytes()
+        if self.ids and (self.ids[-1] - self.ids[0]) // 8 < len(packed):
+            start = self.ids[0]
+            bitmap = bytearray((self.ids[-1] - start) // 8 + 1)
+            for pk in self.ids:
+                bitmap[(pk - start) >> 3] |= 1 << ((pk - start) & 7)
+            return {'start': start, 'bitmap': zlib.compress(bytes(bitmap))}
+        return {'ids': packed}
+
+    def __setstate__(self, state):
+        self.ids = array('q')
+        if 'ids' in state:
+            self.ids.frombytes(state['ids'])
+            return
+        start = state['start']
+        for index, byte in enumerate(zlib.decompress(state['bitmap'])):
+            for bit in range(8):
+                if byte & (1 << bit):
+                    self.ids.append(start + (index << 3) + bit)
+
+
+def use_objects_cache(model):
+    """
+    Returns ``True`` if results of
+    :func:`guardian.shortcuts.get_objects_for_user` for ``model`` should be
+    served from :func:`get_cached_object_pks`.
+    """
+    if guardian_settings.OBJECTS_CACHE_TIMEOUT is None or not is_integer_pk_model(model):
+        return False
+    models = (get_user_obj_perms_model(model), get_group_obj_perms_model(model),
+              get_organization_obj_perms_model(model))
+    return all(obj_perm_model.objects.is_generic() for obj_perm_model in models)
+
+
+def _get_objects_cache_keys(user_id, ctype_id):
+    return ('guardian:objects:%s:%s' % (user_id, ctype_id),
+            'guardian:objects_generation:%s' % user_id,
+            'guardian:objects_generation:%s:%s' % (user_id, ctype_id))
+
+
+def _get_objects_cache_entries(user_ids, ctype_id):
+    # Returns current generations of users' entries along with entries, which
+    # are empty if stored for outdated generations
+    cache = get_cache()
+    timeout = guardian_settings.OBJECTS_CACHE_TIMEOUT
+    keys = {user_id: _get_objects_cache_keys(user_id, ctype_id) for user_id in user_ids}
+    cached = cache.get_many([key for user_keys in keys.values() for key in user_keys])
+    result = {}
+    for user_id, (entries_key, *generation_keys) in keys.items():
+        for key in generation_keys:
+            if key not in cached:
+                cache.add(key, uuid.uuid4().hex, timeout)
+                cached[key] = cache.get(key)
+        generations = tuple(cached[key] for key in generation_keys)
+        generations_and_entries = cached.get(entries_key)
+        if generations_and_entries and generations_and_entries[0] == generations:
+            result[user_id] = generations_and_entries
+        else:
+            result[user_id] = (generations, {})
+    return result
+
+
+def _matches(variant, granted_codenames):
+    codenames, any_perm = variant[:2]
+    if any_perm:
+        return bool(codenames & granted_codenames)
+    return codenames <= granted_codenames
+
+
+def get_cached_object_pks(user, ctype, codenames, any_perm=False, use_groups=True):
+    """
+    Returns :class:`ObjectIdSet` of primary keys of objects of ``ctype`` for
+    which ``user`` has all (or any, if ``any_perm`` is ``True``) of
+    ``codenames`` granted as object permissions, directly or, if
+    ``use_groups`` is ``True``, through groups and organizations.
+
+    Sets are cached per user and content type if
+    :setting:`GUARDIAN_OBJECTS_CACHE_TIMEOUT` is set. Once committed, grants,
+    revokes and changed memberships make them computed again.
+    """
+    entries_key = _get_objects_cache_keys(user.pk, ctype.pk)[0]
+    generations, entries = _get_objects_cache_entries([user.pk], ctype.pk)[user.pk]
+    variant = (frozenset(codenames), any_perm, use_groups)
+    if variant not in entries:
+        granted = defaultdict(set)
+        for object_pk, codename in _get_granted_codenames(user, ctype.pk, codenames, use_groups):
+            granted[object_pk].add(codename)
+        entries[variant] = ObjectIdSet(int(object_pk) for object_pk, granted_codenames in granted.items()
+                                       if _matches(variant, granted_codenames))
+        get_cache().set(entries_key, (generations, entries), guardian_settings.OBJECTS_CACHE_TIMEOUT)
+    return entries[variant]
+
+
+def _get_granted_codenames(user, ctype_id, codenames, use_groups):
+    user_model, group_model, organization_model = get_generic_obj_perms_models()
+    querysets = [user_model.objects.filter(user=user)]
+    if use_groups:
+        group_ids = get_user_group_ids(user)
+        if group_ids:
+            querysets.append(group_model.objects.filter(group__in=group_ids))
+        organization_ids = get_user_organization_ids(user)
+        if organization_ids:
+            querysets.append(organization_model.objects.filter(organization__in=organization_ids))
+    for queryset in querysets:
+        queryset = queryset.filter(content_type_id=ctype_id, permission__codename__in=codenames)
+        yield from queryset.values_list('object_pk', 'permission__codename')
+
+
+def invalidate_cached_object_pks(user_ids, ctype_ids=None):
+    """
+    Makes cached sets of users with given primary keys computed again on the
+    next use, for objects of content types with given primary keys or all of
+    them.
+    """
+    timeout = guardian_settings.OBJECTS_CACHE_TIMEOUT
+    if timeout is None:
+        return
+    if ctype_ids is None:
+        keys = [_get_objects_cache_keys(user_id, None)[1] for user_id in user_ids]
+    else:
+        keys = [_get_objects_cache_keys(user_id, ctype_id)[2] for user_id in user_ids for ctype_id in ctype_ids]
+    generation = uuid.uuid4().hex
+    get_cache().set_many({key: generation for key in keys}, timeout)
+
+
+# Snapshot of grants of the anonymous user, see get_anonymous_perms_snapshot();
+# the version guards against storing a snapshot built before a change
+_anonymous_perms_snapshot = None
+_anonymous_perms_snapshot_version = 0
+
+
+class AnonymousPermsSnapshot:
+    """
+    In-memory index of all generic object permissions granted to the anonymous
+    user directly and through its groups and organizations, built by
+    :func:`get_anonymous_perms_snapshot`.
+
+    Grants are indexed by content type id and object primary key (as string),
+    each being a ``(codename, identity_field, permission_expiry)`` tuple where
+    ``identity_field`` is ``'user'``, ``'group'`` or ``'organization'``.
+    """
+
+    def __init__(self, identity_ids, expires_at):
+        self.identity_ids = identity_ids
+        self.user_id = identity_ids['user'][0]
+        self.expires_at = expires_at
+        self.index = defaultdict(lambda: defaultdict(list))
+
+    def _grants(self, ctype_id, identity_fields, permission_expiry):
+        now = timezone.now() if permission_expiry else None
+        for object_pk, grants in self.index.get(ctype_id, {}).items():
+            yield object_pk, {codename for codename, identity_field, expiry in grants
+                              if identity_field in identity_fields and
+                              (now is None or expiry is None or expiry >= now)}
+
+    def get_perms(self, ctype_id, object_pk, identity_fields=('user', 'group', 'organization'),
+                  permission_expiry=False):
+        """
+        Returns list of codenames granted for object of given content type and
+        primary key through ``identity_fields``.
+        """
+        now = timezone.now() if permission_expiry else None
+        grants = self.index.get(ctype_id, {}).get(str(object_pk), ())
+        return list({codename for codename, identity_field, expiry in grants
+                     if identity_field in identity_fields and (now is None or expiry is None or expiry >= now)})
+
+    def get_object_pks(self, ctype_id, codenames, any_perm=False,
+                       identity_fields=('user', 'group', 'organization'), permission_expiry=False):
+        """
+        Returns list of primary keys (as strings) of objects of given content
+        type with all (or any, if ``any_perm`` is ``True``) of ``codenames``
+        granted through ``identity_fields``.
+        """
+        codenames = set(codenames)
+        return [object_pk for object_pk, granted in self._grants(ctype_id, identity_fields, permission_expiry)
+                if (granted & codenames if any_perm else codenames <= granted)]
+
+
+def _build_anonymous_perms_snapshot(user):
+    timeout = guardian_settings.ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT
+    identity_ids = {
+        'user': [user.pk],
+        'group': list(get_user_group_ids(user)),
+        'organization': list(get_user_organization_ids(user)),
+    }
+    snapshot = AnonymousPermsSnapshot(identity_ids, time.monotonic() + timeout)
+    # Equal strings are shared by all grants to keep the index small
+    strings = {}
+    for model in get_generic_obj_perms_models():
+        identity_field = model.objects.user_or_group_field
+        if not identity_ids[identity_field]:
+            continue
+        rows = (model.objects.filter(**{'%s__in' % identity_field: identity_ids[identity_field]})
+                .values_list('content_type_id', 'object_pk', 'permission__codename', 'permission_expiry'))
+        for ctype_id, object_pk, codename, expiry in rows.iterator():
+            codename = strings.setdefault(codename, codename)
+            snapshot.index[ctype_id][object_pk].append((codename, identity_field, expiry))
+    return snapshot
+
+
+def _is_snapshot_user(user):
+    return (guardian_settings.ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT is not None and user.pk and
+            user.get_username() == guardian_settings.ANONYMOUS_USER_NAME)
+
+
+def get_anonymous_perms_snapshot(user):
+    """
+    Returns :class:`AnonymousPermsSnapshot` of grants of the anonymous user if
+    :setting:`GUARDIAN_ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT` is set and ``user``
+    is the anonymous user, ``None`` otherwise.
+
+    The snapshot is shared by the whole process and built again once it is
+    older than the timeout, or after object permissions or memberships of the
+    anonymous user change within the process.
+    """
+    global _anonymous_perms_snapshot
+    if not _is_snapshot_user(user):
+        return None
+    snapshot = _anonymous_perms_snapshot
+    if snapshot is None or snapshot.user_id != user.pk or snapshot.expires_at <= time.monotonic():
+        version = _anonymous_perms_snapshot_version
+        snapshot = _build_anonymous_perms_snapshot(user)
+        if version == _anonymous_perms_snapshot_version:
+            _anonymous_perms_snapshot = snapshot
+    return snapshot
+
+
+def use_anonymous_perms_snapshot(user, model):
+    """
+    Returns snapshot returned by :func:`get_anonymous_perms_snapshot` if
+    permissions of ``user`` for ``model`` (having only generic object
+    permissions) can be answered from it, ``None`` otherwise.
+    """
+    if not _is_snapshot_user(user):
+        return None
+    models = (get_user_obj_perms_model(model), get_group_obj_perms_model(model),
+              get_organization_obj_perms_model(model))
+    if not all(obj_perm_model.objects.is_generic() for obj_perm_model in models):
+        return None
+    return get_anonymous_perms_snapshot(user)
+
+
+def invalidate_anonymous_perms_snapshot(identity_field=None, identity_ids=None):
+    """
+    Drops the snapshot of grants of the anonymous user. If ``identity_field``
+    (``'user'``, ``'group'`` or ``'organization'``) is given, it is only
+    dropped if any of ``identity_ids`` is the anonymous user or one of its
+    groups or organizations.
+    """
+    global _anonymous_perms_snapshot, _anonymous_perms_snapshot_version
+    snapshot = _anonymous_perms_snapshot
+    if (identity_field is None or snapshot is None or
+            not set(snapshot.identity_ids[identity_field]).isdisjoint(identity_ids)):
+        _anonymous_perms_snapshot_version += 1
+        _anonymous_perms_snapshot = None
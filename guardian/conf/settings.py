@@ -30,6 +30,31 @@ AUTO_PREFETCH = getattr(settings, 'GUARDIAN_AUTO_PREFETCH', False)
 USER_OBJ_PERMS_MODEL = getattr(settings, 'GUARDIAN_USER_OBJ_PERMS_MODEL', 'guardian.UserObjectPermission')
 GROUP_OBJ_PERMS_MODEL = getattr(settings, 'GUARDIAN_GROUP_OBJ_PERMS_MODEL', 'guardian.GroupObjectPermission')
 
+NATIVE_OBJECT_PK = getattr(settings, 'GUARDIAN_NATIVE_OBJECT_PK', False)
+
+EFFECTIVE_OBJ_PERMS = getattr(settings, 'GUARDIAN_EFFECTIVE_OBJ_PERMS', False)
+
+CASCADE_DELETE_MODELS = getattr(settings, 'GUARDIAN_CASCADE_DELETE_MODELS', ())
+
+CACHE_ALIAS = getattr(settings, 'GUARDIAN_CACHE_ALIAS', 'default')
+
+MEMBERSHIPS_CACHE_TIMEOUT = getattr(settings, 'GUARDIAN_MEMBERSHIPS_CACHE_TIMEOUT', None)
+
+PRESENCE_CACHE_TIMEOUT = getattr(settings, 'GUARDIAN_PRESENCE_CACHE_TIMEOUT', None)
+
+OBJ_PERMS_FILTER_TIMEOUT = getattr(settings, 'GUARDIAN_OBJ_PERMS_FILTER_TIMEOUT', None)
+
+OBJ_PERMS_FILTER_ERROR_RATE = getattr(settings, 'GUARDIAN_OBJ_PERMS_FILTER_ERROR_RATE', 0.01)
+
+OBJECTS_CACHE_TIMEOUT = getattr(settings, 'GUARDIAN_OBJECTS_CACHE_TIMEOUT', None)
+
+ANONYMOUS_USER_CACHE = getattr(settings, 'GUARDIAN_ANONYMOUS_USER_CACHE', False)
+
+ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT = getattr(settings, 'GUARDIAN_ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT', None)
+
+EXPIRY_SWEEP_CALLBACK = getattr(settings, 'GUARDIAN_EXPIRY_SWEEP_CALLBACK',
+                                'guardian.utils.log_expiring_obj_perms')
+
 
 def check_configuration():
     if RENDER_403 and RAISE_403:
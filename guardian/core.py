@@ -5,13 +5,16 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.db.models import Q
 from django.db.models.query import QuerySet
+from django.utils import timezone
 from django.utils.encoding import force_str
 from pytz import utc
 
+from guardian.cache import get_anonymous_perms_snapshot, get_obj_perms_filter, get_obj_perms_filter_item, \
+    get_user_group_ids, get_user_organization_ids, obj_perms_exist, use_anonymous_perms_snapshot
 from guardian.conf import settings as guardian_settings
 from guardian.ctypes import get_content_type
-from guardian.utils import get_group_obj_perms_model, get_identity, get_user_obj_perms_model, \
-    get_organization_obj_perms_model
+from guardian.utils import get_group_obj_perms_model, get_identity, get_object_pk_lookup, get_user_obj_perms_model, \
+    get_organization_obj_perms_model, get_effective_obj_perms_sources, use_effective_obj_perms
 
 
 def _get_pks_model_and_ctype(objects):
@@ -63,6 +66,7 @@ class ObjectPermissionChecker:
         """
         self.user, self.group, self.organization = get_identity(user_or_group)
         self._obj_perms_cache = {}
+        self._obj_perms_filter = None
 
     def has_perm(self, perm, obj, permission_expiry=True):
         """
@@ -77,10 +81,30 @@ class ObjectPermissionChecker:
             return False
         elif self.user and self.user.is_superuser:
             return True
+        if self.user and not self.may_have_perms(obj):
+            return False
         if '.' in perm:
             _, perm = perm.split('.', maxsplit=1)
         return perm in self.get_perms(obj, permission_expiry)
 
+    def may_have_perms(self, obj):
+        """
+        Returns ``False`` if the user certainly has no object permissions for
+        ``obj``, according to the filter returned by
+        :func:`guardian.cache.get_obj_perms_filter`, without hitting database.
+        Returns ``True`` if the filter is disabled or not applicable to
+        ``obj``.
+        """
+        if self._obj_perms_filter is None:
+            self._obj_perms_filter = get_obj_perms_filter(self.user) or False
+        if self._obj_perms_filter is False:
+            return True
+        models = (get_user_obj_perms_model(obj), get_group_obj_perms_model(obj),
+                  get_organization_obj_perms_model(obj))
+        if not all(model.objects.is_generic() for model in models):
+            return True
+        return get_obj_perms_filter_item(get_content_type(obj).pk, obj.pk) in self._obj_perms_filter
+
     def get_organization_filters(self, obj, permission_expiry=False):
         User = get_user_model()
         ctype = get_content_type(obj)
@@ -89,17 +113,15 @@ class ObjectPermissionChecker:
         organization_model = get_organization_obj_perms_model(obj)
         organization_rel_name = organization_model.permission.field.related_query_name()
         if self.user:
-            fieldname = '%s__organization__%s' % (
-                organization_rel_name,
-                "users",
-            )
-            organization_filters = {fieldname: self.user}
+            organization_filters = {
+                '%s__organization__in' % organization_rel_name: get_user_organization_ids(self.user),
+            }
         else:
             organization_filters = {'%s__organization' % organization_rel_name: self.organization}
         if organization_model.objects.is_generic():
             organization_filters.update({
                 '%s__content_type' % organization_rel_name: ctype,
-                '%s__object_pk' % organization_rel_name: obj.pk,
+                '%s__%s' % (organization_rel_name, get_object_pk_lookup(organization_model, obj)): obj.pk,
             })
         else:
             organization_filters['%s__content_object' % organization_rel_name] = obj
@@ -113,23 +135,18 @@ class ObjectPermissionChecker:
         return organization_filters, org_q
 
     def get_group_filters(self, obj, permission_expiry=False):
-        User = get_user_model()
         ctype = get_content_type(obj)
 
         group_model = get_group_obj_perms_model(obj)
         group_rel_name = group_model.permission.field.related_query_name()
         if self.user:
-            fieldname = '%s__group__%s' % (
-                group_rel_name,
-                User.groups.field.related_query_name(),
-            )
-            group_filters = {fieldname: self.user}
+            group_filters = {'%s__group__in' % group_rel_name: get_user_group_ids(self.user)}
         else:
             group_filters = {'%s__group' % group_rel_name: self.group}
         if group_model.objects.is_generic():
             group_filters.update({
                 '%s__content_type' % group_rel_name: ctype,
-                '%s__object_pk' % group_rel_name: obj.pk,
+                '%s__%s' % (group_rel_name, get_object_pk_lookup(group_model, obj)): obj.pk,
             })
         else:
             group_filters['%s__content_object' % group_rel_name] = obj
@@ -145,7 +162,7 @@ class ObjectPermissionChecker:
         if model.objects.is_generic():
             user_filters.update({
                 '%s__content_type' % related_name: ctype,
-                '%s__object_pk' % related_name: obj.pk,
+                '%s__%s' % (related_name, get_object_pk_lookup(model, obj)): obj.pk,
             })
         else:
             user_filters['%s__content_object' % related_name] = obj
@@ -170,6 +187,10 @@ class ObjectPermissionChecker:
 
     def get_group_perms(self, obj, permission_expiry=False):
         ctype = get_content_type(obj)
+        if not obj_perms_exist(get_group_obj_perms_model(obj), ctype):
+            return []
+        if self.user and not get_user_group_ids(self.user):
+            return []
 
         perms_qs = Permission.objects.filter(content_type=ctype)
         group_filters, group_q = self.get_group_filters(obj, permission_expiry)
@@ -180,6 +201,10 @@ class ObjectPermissionChecker:
 
     def get_organization_perms(self, obj, permission_expiry=False):
         ctype = get_content_type(obj)
+        if not obj_perms_exist(get_organization_obj_perms_model(obj), ctype):
+            return []
+        if self.user and not get_user_organization_ids(self.user):
+            return []
 
         perms_qs = Permission.objects.filter(content_type=ctype)
         organization_filters, org_q = self.get_organization_filters(obj, permission_expiry)
@@ -188,6 +213,22 @@ class ObjectPermissionChecker:
 
         return organization_perms
 
+    def get_effective_perms(self, obj, permission_expiry=False):
+        """
+        Returns ``codename``'s of all permissions of the user for given
+        ``obj``, granted either directly or through organizations, using
+        :model:`EffectiveObjectPermission` (see
+        :setting:`GUARDIAN_EFFECTIVE_OBJ_PERMS`).
+        """
+        from guardian.models import EffectiveObjectPermission
+
+        perms_qs = EffectiveObjectPermission.objects.filter(
+            user=self.user, content_type=get_content_type(obj), object_pk=obj.pk,
+            source__in=get_effective_obj_perms_sources(group_grants=False))
+        if permission_expiry:
+            perms_qs = perms_qs.filter(Q(permission_expiry=None) | Q(permission_expiry__gte=timezone.now()))
+        return perms_qs.values_list("permission__codename", flat=True)
+
     def get_perms(self, obj, permission_expiry=False, include_group_perms=True):
         """
         Returns list of ``codename``'s of all permissions for given ``obj``.
@@ -211,6 +252,14 @@ class ObjectPermissionChecker:
                 perms = list(chain(*Permission.objects
                                    .filter(content_type=ctype)
                                    .values_list("codename")))
+            elif self.user and use_anonymous_perms_snapshot(self.user, type(obj)):
+                # Mirror sources of the branches below: user and organization
+                # grants
+                identity_fields = ('user', 'organization') if include_group_perms else ('user',)
+                perms = get_anonymous_perms_snapshot(self.user).get_perms(
+                    ctype.id, obj.pk, identity_fields, permission_expiry)
+            elif self.user and include_group_perms and use_effective_obj_perms(type(obj)):
+                perms = list(self.get_effective_perms(obj, permission_expiry))
             elif self.user:
                 # Query user and group permissions separately and then combine
                 # the results to avoid a slow query
@@ -247,14 +296,23 @@ class ObjectPermissionChecker:
         """
         Prefetches the permissions for objects in ``objects`` and puts them in the cache.
 
+        Permissions are fetched from the same sources as :meth:`get_perms` (with
+        ``include_group_perms`` set to ``True``) uses and cached both with and
+        without expired ones, so following ``has_perm``/``get_perms`` calls
+        for these objects don't hit database.
+
         :param objects: Iterable of Django model objects
 
         """
         if self.user and not self.user.is_active:
             return []
 
-        User = get_user_model()
+        objects = list(objects)
+        if not objects:
+            return True
         pks, model, ctype = _get_pks_model_and_ctype(objects)
+        keys = {(force_str(obj.pk), permission_expiry): self.get_local_cache_key(obj, True, permission_expiry)
+                for obj in objects for permission_expiry in (False, True)}
 
         if self.user and self.user.is_superuser:
             perms = list(chain(
@@ -262,74 +320,55 @@ class ObjectPermissionChecker:
                 .filter(content_type=ctype)
                 .values_list("codename")))
 
-            for pk in pks:
-                key = (ctype.id, force_str(pk))
+            for key in keys.values():
                 self._obj_perms_cache[key] = perms
 
             return True
 
         group_model = get_group_obj_perms_model(model)
-
-        group_filters = {
-            'object_pk__in': pks
-        }
-
-        if self.user:
-            fieldname = 'group__{}'.format(
-                User.groups.field.related_query_name(),
-            )
-            group_filters.update({fieldname: self.user})
-        else:
-            group_filters = {'group': self.group}
-
-        if group_model.objects.is_generic():
-            group_filters.update({
-                'content_type': ctype,
-                'object_pk__in': pks,
-            })
+        organization_model = get_organization_obj_perms_model(model)
+        if self.user and use_effective_obj_perms(model):
+            from guardian.models import EffectiveObjectPermission
+
+            perms_qs = EffectiveObjectPermission.objects.filter(
+                user=self.user, content_type=ctype, object_pk__in=pks,
+                source__in=get_effective_obj_perms_sources(group_grants=False))
+            sources = [perms_qs.values_list('object_pk', 'permission__codename', 'permission_expiry')]
         else:
-            group_filters.update({
-                'content_object_id__in': pks
-            })
-
-        if self.user:
-            model = get_user_obj_perms_model(model)
-            user_filters = {
-                'user': self.user,
-            }
-
-            if model.objects.is_generic():
-                user_filters.update({
-                    'content_type': ctype,
-                    'object_pk__in': pks
-                })
-            else:
-                user_filters.update({
-                    'content_object_id__in': pks
-                })
-
-            # Query user and group permissions separately and then combine
-            # the results to avoid a slow query
-            user_perms_qs = model.objects.filter(**user_filters).select_related('permission')
-            group_perms_qs = group_model.objects.filter(**group_filters).select_related('permission')
-            perms = chain(user_perms_qs, group_perms_qs)
-        else:
-            perms = chain(
-                *(group_model.objects.filter(**group_filters).select_related('permission'),)
-            )
-
-        # initialize entry in '_obj_perms_cache' for all prefetched objects
-        for obj in objects:
-            key = self.get_local_cache_key(obj)
-            if key not in self._obj_perms_cache:
-                self._obj_perms_cache[key] = []
-
-        for perm in perms:
-            if type(perm).objects.is_generic():
-                key = (ctype.id, perm.object_pk)
+            if self.user:
+                identities = [(get_user_obj_perms_model(model), {'user': self.user}, True)]
+                if obj_perms_exist(organization_model, ctype) and get_user_organization_ids(self.user):
+                    identities.append((organization_model,
+                                       {'organization__in': get_user_organization_ids(self.user)}, True))
+            elif self.group:
+                # group permissions are never filtered by expiry (see get_group_filters)
+                identities = [(group_model, {'group': self.group}, False)]
             else:
-                key = (ctype.id, force_str(perm.content_object_id))
+                identities = [(organization_model, {'organization': self.organization}, True)]
 
-            self._obj_perms_cache[key].append(perm.permission.codename)
+            sources = []
+            for obj_perms_model, filters, expiry in identities:
+                if obj_perms_model.objects.is_generic():
+                    field_pk = get_object_pk_lookup(obj_perms_model, model)
+                    filters.update({'content_type': ctype, '%s__in' % field_pk: pks})
+                else:
+                    field_pk = 'content_object_id'
+                    filters['content_object_id__in'] = pks
+                perms_qs = obj_perms_model.objects.filter(**filters)
+                if expiry and obj_perms_model.objects.is_generic():
+                    sources.append(perms_qs.values_list(field_pk, 'permission__codename', 'permission_expiry'))
+                else:
+                    sources.append((object_pk, codename, None)
+                                   for object_pk, codename in perms_qs.values_list(field_pk, 'permission__codename'))
+
+        now = timezone.now()
+        perms = {key: set() for key in keys.values()}
+        for object_pk, codename, expiry in chain(*sources):
+            object_pk = force_str(object_pk)
+            perms[keys[object_pk, False]].add(codename)
+            if expiry is None or expiry >= now:
+                perms[keys[object_pk, True]].add(codename)
+        for key, codenames in perms.items():
+            self._obj_perms_cache[key] = list(codenames)
 
         return True
@@ -1,3 +1,5 @@
+import asyncio
+
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import REDIRECT_FIELD_NAME
@@ -6,14 +8,20 @@ from django.db.models.base import ModelBase
 from django.db.models.query import QuerySet
 from django.shortcuts import get_object_or_404
 from django.utils.functional import wraps
+from guardian.conf import settings as guardian_settings
 from guardian.exceptions import GuardianError
-from guardian.utils import get_40x_or_None
+from guardian.shortcuts import _filter_by_grants, _get_queryset_ctype_and_codenames
+from guardian.utils import get_40x_or_None, get_40x_response, get_anonymous_user
 
 
 def permission_required(perm, lookup_variables=None, **kwargs):
     """
     Decorator for views that checks whether a user has a particular permission
-    enabled.
+    enabled. A list of permissions may be given as well, in which case user
+    must have all of them.
+
+    Coroutine (``async def``) views are supported as well: the object lookup
+    and the permission check are then run with ``sync_to_async``.
 
     Optionally, instances for which check should be made may be passed as an
     second argument or as a tuple parameters same as those passed to
@@ -40,6 +48,12 @@ def permission_required(perm, lookup_variables=None, **kwargs):
       like an extension over standard
       ``django.contrib.admin.decorators.permission_required`` as it would
       check for global permissions first. Defaults to ``False``.
+    :param object_kwarg: if set (requires ``lookup_variables``), the object is
+      fetched only if user has permissions for it, with a single query
+      filtered by grants (which have not expired) to the user, its groups and
+      organizations, and passed to the view as keyword argument of this name. A missing
+      object and a denied one are then indistinguishable, so this is best used
+      together with ``return_404``. Defaults to ``None``.
 
     Examples::
 
@@ -47,6 +61,11 @@ def permission_required(perm, lookup_variables=None, **kwargs):
         def my_view(request):
             return HttpResponse('Hello')
 
+        @permission_required(['auth.change_user', 'auth.delete_user'],
+            (User, 'username', 'username'))
+        def my_view(request, username):
+            return HttpResponse('Hello')
+
         @permission_required('auth.change_user', (User, 'username', 'username'))
         def my_view(request, username):
             '''
@@ -70,6 +89,14 @@ def permission_required(perm, lookup_variables=None, **kwargs):
                 group__name=group_name)
             return user.get_absolute_url()
 
+        @permission_required('auth.change_user',
+            (User, 'username', 'username'), return_404=True, object_kwarg='user')
+        def my_view(request, username, user):
+            '''
+            ``user`` is the instance fetched along with the permission check.
+            '''
+            return user.get_absolute_url()
+
     """
     login_url = kwargs.pop('login_url', settings.LOGIN_URL)
     redirect_field_name = kwargs.pop(
@@ -77,55 +104,111 @@ def permission_required(perm, lookup_variables=None, **kwargs):
     return_403 = kwargs.pop('return_403', False)
     return_404 = kwargs.pop('return_404', False)
     accept_global_perms = kwargs.pop('accept_global_perms', False)
-
-    # Check if perm is given as string in order not to decorate
-    # view function itself which makes debugging harder
-    if not isinstance(perm, str):
+    object_kwarg = kwargs.pop('object_kwarg', None)
+
+    # Check if perm is given as string (or list of strings) in order not to
+    # decorate view function itself which makes debugging harder
+    if isinstance(perm, str):
+        perms = [perm]
+    elif isinstance(perm, (list, tuple)) and perm and all(isinstance(p, str) for p in perm):
+        perms = list(perm)
+    else:
         raise GuardianError("First argument must be in format: "
                             "'app_label.codename or a callable which return similar string'")
+    if object_kwarg and not lookup_variables:
+        raise GuardianError("object_kwarg requires lookup_variables to be given")
+
+    def check_permissions(request, kwargs):
+        """
+        Returns response if request should be denied, ``None`` otherwise (in
+        which case object fetched with ``object_kwarg`` is put into
+        ``kwargs``).
+        """
+        # if more than one parameter is passed to the decorator we try to
+        # fetch object for which check would be made
+        obj = None
+        if lookup_variables:
+            model, lookups = lookup_variables[0], lookup_variables[1:]
+            # Parse model
+            if isinstance(model, str):
+                splitted = model.split('.')
+                if len(splitted) != 2:
+                    raise GuardianError("If model should be looked up from "
+                                        "string it needs format: 'app_label.ModelClass'")
+                model = apps.get_model(*splitted)
+            elif issubclass(model.__class__, (Model, ModelBase, QuerySet)):
+                pass
+            else:
+                raise GuardianError("First lookup argument must always be "
+                                    "a model, string pointing at app/model or queryset. "
+                                    "Given: %s (type: %s)" % (model, type(model)))
+            # Parse lookups
+            if len(lookups) % 2 != 0:
+                raise GuardianError("Lookup variables must be provided "
+                                    "as pairs of lookup_string and view_arg")
+            lookup_dict = {}
+            for lookup, view_arg in zip(lookups[::2], lookups[1::2]):
+                if view_arg not in kwargs:
+                    raise GuardianError("Argument %s was not passed "
+                                        "into view function" % view_arg)
+                lookup_dict[lookup] = kwargs[view_arg]
+            if object_kwarg:
+                obj = _get_permitted_object(request.user, perms, model, lookup_dict, accept_global_perms)
+                if obj is None:
+                    return get_40x_response(request, login_url, redirect_field_name,
+                                            return_403=return_403, return_404=return_404)
+                kwargs[object_kwarg] = obj
+                return None
+            obj = get_object_or_404(model, **lookup_dict)
+
+        return get_40x_or_None(request, perms=perms, obj=obj,
+                               login_url=login_url, redirect_field_name=redirect_field_name,
+                               return_403=return_403, return_404=return_404, accept_global_perms=accept_global_perms)
 
     def decorator(view_func):
-        def _wrapped_view(request, *args, **kwargs):
-            # if more than one parameter is passed to the decorator we try to
-            # fetch object for which check would be made
-            obj = None
-            if lookup_variables:
-                model, lookups = lookup_variables[0], lookup_variables[1:]
-                # Parse model
-                if isinstance(model, str):
-                    splitted = model.split('.')
-                    if len(splitted) != 2:
-                        raise GuardianError("If model should be looked up from "
-                                            "string it needs format: 'app_label.ModelClass'")
-                    model = apps.get_model(*splitted)
-                elif issubclass(model.__class__, (Model, ModelBase, QuerySet)):
-                    pass
-                else:
-                    raise GuardianError("First lookup argument must always be "
-                                        "a model, string pointing at app/model or queryset. "
-                                        "Given: %s (type: %s)" % (model, type(model)))
-                # Parse lookups
-                if len(lookups) % 2 != 0:
-                    raise GuardianError("Lookup variables must be provided "
-                                        "as pairs of lookup_string and view_arg")
-                lookup_dict = {}
-                for lookup, view_arg in zip(lookups[::2], lookups[1::2]):
-                    if view_arg not in kwargs:
-                        raise GuardianError("Argument %s was not passed "
-                                            "into view function" % view_arg)
-                    lookup_dict[lookup] = kwargs[view_arg]
-                obj = get_object_or_404(model, **lookup_dict)
-
-            response = get_40x_or_None(request, perms=[perm], obj=obj,
-                                       login_url=login_url, redirect_field_name=redirect_field_name,
-                                       return_403=return_403, return_404=return_404, accept_global_perms=accept_global_perms)
-            if response:
-                return response
-            return view_func(request, *args, **kwargs)
+        if asyncio.iscoroutinefunction(view_func):
+            async def _wrapped_view(request, *args, **kwargs):
+                from asgiref.sync import sync_to_async
+
+                # Django ORM is synchronous, so the object lookup and the
+                # permission check are done in a single thread hop
+                response = await sync_to_async(check_permissions, thread_sensitive=True)(request, kwargs)
+                if response:
+                    return response
+                return await view_func(request, *args, **kwargs)
+        else:
+            def _wrapped_view(request, *args, **kwargs):
+                response = check_permissions(request, kwargs)
+                if response:
+                    return response
+                return view_func(request, *args, **kwargs)
         return wraps(view_func)(_wrapped_view)
     return decorator
 
 
+def _get_permitted_object(user, perms, model, lookup_dict, accept_global_perms):
+    """
+    Returns object of ``model`` matching ``lookup_dict`` if ``user`` has all
+    ``perms`` for it, ``None`` otherwise, fetching it with a single query.
+
+    Either all ``perms`` must be granted globally (if ``accept_global_perms``)
+    or all of them for the object, by grants which have not expired - read
+    from the same sources as :meth:`ObjectPermissionChecker.has_perm`, i.e.
+    user and organization grants.
+    """
+    if user.is_authenticated and not user.is_active:
+        return None
+    if not user.is_authenticated:
+        if guardian_settings.ANONYMOUS_USER_NAME is None:
+            return None
+        user = get_anonymous_user()
+    queryset, ctype, codenames = _get_queryset_ctype_and_codenames(perms, model)
+    queryset = queryset.filter(**lookup_dict)
+    if user.is_superuser or (accept_global_perms and all(user.has_perm(perm) for perm in perms)):
+        return queryset.first()
+    return _filter_by_grants(queryset, user, ctype, codenames, permission_expiry=True, group_grants=False).first()
+
+
 def permission_required_or_403(perm, *args, **kwargs):
     """
     Simple wrapper for permission_required decorator.
@@ -29,3 +29,7 @@ class MixedContentTypeError(GuardianError):
 
 class MultipleIdentityAndObjectError(GuardianError):
     pass
+
+
+class ObjPermsMigrationError(GuardianError):
+    pass
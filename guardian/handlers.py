@@ -0,0 +1,484 @@
+"""
+Signal receivers keeping generic object permissions in sync with the objects
+they point at, :model:`EffectiveObjectPermission` in sync with object
+permissions and memberships of users and caches of :mod:`guardian.cache` up
+to date.
+"""
+import threading
+import weakref
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from organizations.models import Organization
+
+from guardian.cache import get_cached_anonymous_user_pk, invalidate_anonymous_perms_snapshot, \
+    invalidate_anonymous_user, invalidate_cached_object_pks, invalidate_memberships, invalidate_obj_perms_filters, \
+    invalidate_obj_perms_presence, mark_obj_perms_exist
+from guardian.conf import settings as guardian_settings
+from guardian.ctypes import get_content_type
+from guardian.signals import obj_perms_bulk_changed
+from guardian.utils import delete_obj_perms_for_targets, get_generic_obj_perms_models, get_identity_user_ids, \
+    refresh_effective_obj_perms
+
+_local = threading.local()
+_cleanup_models = set()
+
+
+class PendingTargets:
+    """
+    Primary keys of objects deleted on ``using`` database, grouped by content
+    type id. Object permissions pointing at them are removed once the
+    transaction commits, by a single commit hook.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.pks = defaultdict(set)
+        self.hook = None
+
+    def add(self, instance):
+        self.pks[get_content_type(instance).pk].add(instance.pk)
+
+    def schedule(self):
+        # Hooks dropped by rolled back transactions or savepoints are garbage
+        # collected, so a dead reference means a new hook is needed
+        if self.hook is not None and self.hook() is not None:
+            return
+
+        def hook():
+            self.flush()
+        self.hook = weakref.ref(hook)
+        transaction.on_commit(hook, using=self.using)
+
+    def flush(self, batch_size=500):
+        pks, self.pks = self.pks, defaultdict(set)
+        for ctype_id, object_pks in pks.items():
+            model = ContentType.objects.get_for_id(ctype_id).model_class()
+            object_pks = list(object_pks)
+            for i in range(0, len(object_pks), batch_size):
+                batch = set(object_pks[i:i + batch_size])
+                # Deletions rolled back before are kept until the next commit,
+                # so objects which still exist are skipped
+                if model is not None:
+                    batch.difference_update(model._base_manager.using(self.using).filter(pk__in=batch)
+                                            .values_list('pk', flat=True))
+                delete_obj_perms_for_targets(ctype_id, batch, batch_size)
+
+
+def delete_target_obj_perms(sender, instance, using, **kwargs):
+    """
+    ``post_delete`` receiver collecting deleted objects of models registered
+    with :func:`register_obj_perms_cleanup`.
+    """
+    if not hasattr(_local, 'pending'):
+        _local.pending = {}
+    pending = _local.pending.get(using)
+    if pending is None:
+        pending = _local.pending[using] = PendingTargets(using)
+    pending.add(instance)
+    pending.schedule()
+
+
+def register_obj_perms_cleanup(model):
+    """
+    Makes guardian remove generic object permissions pointing at instances of
+    ``model`` once they are deleted - including ``QuerySet.delete()`` and
+    cascades. Deleted objects are collected per transaction and their
+    permissions removed on commit, with one query per object permission model.
+    """
+    post_delete.connect(delete_target_obj_perms, sender=model,
+                        dispatch_uid='guardian.handlers.delete_target_obj_perms')
+    _cleanup_models.add(model)
+
+
+def unregister_obj_perms_cleanup(model):
+    post_delete.disconnect(sender=model, dispatch_uid='guardian.handlers.delete_target_obj_perms')
+    _cleanup_models.discard(model)
+
+
+def is_obj_perms_cleanup_registered(model):
+    """
+    Returns ``True`` if object permissions of ``model`` instances are removed
+    along with them.
+    """
+    return model in _cleanup_models
+
+
+def _refresh(user_ids, ctype_id=None, object_pks=None):
+    # Entries for users and permissions being deleted would violate foreign
+    # keys once the deletion completes
+    deleting = getattr(_local, 'deleting', {})
+    user_ids = set(user_ids) - deleting.get('user', set())
+    if user_ids:
+        refresh_effective_obj_perms(user_ids, ctype_id, object_pks,
+                                    exclude_permission_ids=deleting.get('permission', set()))
+
+
+def _get_deleting(sender):
+    if not hasattr(_local, 'deleting'):
+        _local.deleting = defaultdict(set)
+    return _local.deleting['permission' if issubclass(sender, Permission) else 'user']
+
+
+def mark_deleting(sender, instance, **kwargs):
+    _get_deleting(sender).add(instance.pk)
+
+
+def unmark_deleting(sender, instance, **kwargs):
+    _get_deleting(sender).discard(instance.pk)
+
+
+def _get_obj_perm_user_ids(obj_perm):
+    identity_field = type(obj_perm).objects.user_or_group_field
+    return get_identity_user_ids(identity_field, [getattr(obj_perm, '%s_id' % identity_field)])
+
+
+def collect_obj_perm_users(sender, instance, **kwargs):
+    # Group or organization memberships may be gone by the time
+    # ``post_delete`` is sent, i.e. if the group itself is being deleted
+    instance._guardian_user_ids = _get_obj_perm_user_ids(instance)
+
+
+def refresh_obj_perm_users(sender, instance, **kwargs):
+    user_ids = getattr(instance, '_guardian_user_ids', None)
+    if user_ids is None:
+        user_ids = _get_obj_perm_user_ids(instance)
+    _refresh(user_ids, instance.content_type_id, [instance.object_pk])
+
+
+def refresh_bulk_obj_perm_users(sender, action, rows, **kwargs):
+    identity_field = sender.objects.user_or_group_field
+    targets = defaultdict(lambda: (set(), set()))
+    for row in rows:
+        identity_ids, object_pks = targets[row['content_type_id']]
+        identity_ids.add(row['%s_id' % identity_field])
+        object_pks.add(row['object_pk'])
+    for ctype_id, (identity_ids, object_pks) in targets.items():
+        _refresh(get_identity_user_ids(identity_field, identity_ids), ctype_id, object_pks)
+
+
+def _get_changed_member_ids(instance, users_side, pk_set, action):
+    if users_side:
+        return [instance.pk]
+    elif action == 'post_clear':
+        return instance._guardian_user_ids
+    return pk_set
+
+
+def _invalidate_users_caches(user_ids):
+    invalidate_memberships(user_ids)
+    invalidate_obj_perms_filters(user_ids)
+    invalidate_cached_object_pks(user_ids)
+    invalidate_anonymous_perms_snapshot('user', user_ids)
+
+
+def _members_changed(user_ids, using):
+    _invalidate_users_caches(user_ids)
+    # Caches may be filled by checks made before the transaction commits
+    transaction.on_commit(lambda: _invalidate_users_caches(user_ids), using=using)
+    if guardian_settings.EFFECTIVE_OBJ_PERMS:
+        _refresh(user_ids)
+
+
+def group_members_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    # ``User.groups`` - instance is an user unless changed through the reverse
+    # ``Group.user_set`` accessor
+    if action == 'pre_clear' and reverse:
+        instance._guardian_user_ids = list(get_user_model().objects.filter(groups=instance)
+                                           .values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        _members_changed(_get_changed_member_ids(instance, not reverse, pk_set, action), using)
+
+
+def organization_members_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    # ``Organization.users`` - instance is an organization unless changed
+    # through the reverse accessor of users
+    if action == 'pre_clear' and not reverse:
+        instance._guardian_user_ids = list(instance.users.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        _members_changed(_get_changed_member_ids(instance, reverse, pk_set, action), using)
+
+
+def organization_user_changed(sender, instance, using, **kwargs):
+    _members_changed([instance.user_id], using)
+
+
+def _get_memberships_receivers():
+    organization_user_model = Organization.users.through
+    return [
+        (m2m_changed, group_members_changed, get_user_model().groups.through),
+        (m2m_changed, organization_members_changed, organization_user_model),
+        (post_save, organization_user_changed, organization_user_model),
+        (post_delete, organization_user_changed, organization_user_model),
+    ]
+
+
+def connect_memberships_handlers():
+    """
+    Connects receivers invalidating cached memberships of users (see
+    :mod:`guardian.cache`) and refreshing their
+    :model:`EffectiveObjectPermission` rows. Called on startup.
+    """
+    for signal, receiver, sender in _get_memberships_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def _get_effective_obj_perms_receivers():
+    User = get_user_model()
+    receivers = [
+        (pre_delete, mark_deleting, User),
+        (post_delete, unmark_deleting, User),
+        (pre_delete, mark_deleting, Permission),
+        (post_delete, unmark_deleting, Permission),
+    ]
+    for model in get_generic_obj_perms_models():
+        receivers += [
+            (pre_delete, collect_obj_perm_users, model),
+            (post_save, refresh_obj_perm_users, model),
+            (post_delete, refresh_obj_perm_users, model),
+            (obj_perms_bulk_changed, refresh_bulk_obj_perm_users, model),
+        ]
+    return receivers
+
+
+def connect_effective_obj_perms_handlers():
+    """
+    Connects receivers keeping :model:`EffectiveObjectPermission` up to date.
+    Called on startup if :setting:`GUARDIAN_EFFECTIVE_OBJ_PERMS` is enabled.
+    """
+    for signal, receiver, sender in _get_effective_obj_perms_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def disconnect_effective_obj_perms_handlers():
+    for signal, receiver, sender in _get_effective_obj_perms_receivers():
+        signal.disconnect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def _mark_obj_perms_exist(model, ctype_ids, using):
+    mark_obj_perms_exist(model, ctype_ids)
+    # Absence may be cached by checks made before the transaction commits
+    transaction.on_commit(lambda: mark_obj_perms_exist(model, ctype_ids), using=using)
+
+
+def obj_perm_saved(sender, instance, created, using, **kwargs):
+    if created:
+        _mark_obj_perms_exist(sender, [instance.content_type_id], using)
+
+
+def obj_perm_deleted(sender, instance, **kwargs):
+    invalidate_obj_perms_presence(sender, [instance.content_type_id])
+
+
+def obj_perms_bulk_changed_presence(sender, action, rows, **kwargs):
+    ctype_ids = {row['content_type_id'] for row in rows}
+    if action == 'create':
+        _mark_obj_perms_exist(sender, ctype_ids, router.db_for_write(sender))
+    elif action == 'delete':
+        invalidate_obj_perms_presence(sender, ctype_ids)
+
+
+def _get_presence_receivers():
+    receivers = []
+    for model in get_generic_obj_perms_models()[1:]:
+        receivers += [
+            (post_save, obj_perm_saved, model),
+            (post_delete, obj_perm_deleted, model),
+            (obj_perms_bulk_changed, obj_perms_bulk_changed_presence, model),
+        ]
+    return receivers
+
+
+def connect_presence_handlers():
+    """
+    Connects receivers keeping presence of group and organization object
+    permissions cached by :func:`guardian.cache.obj_perms_exist` up to date.
+    Called on startup if :setting:`GUARDIAN_PRESENCE_CACHE_TIMEOUT` is set.
+    """
+    for signal, receiver, sender in _get_presence_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def disconnect_presence_handlers():
+    for signal, receiver, sender in _get_presence_receivers():
+        signal.disconnect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def _invalidate_obj_perms_filters(identity_field, identity_ids, using):
+    user_ids = get_identity_user_ids(identity_field, identity_ids)
+    invalidate_obj_perms_filters(user_ids)
+    # Filters may be rebuilt by checks made before the transaction commits
+    transaction.on_commit(lambda: invalidate_obj_perms_filters(user_ids), using=using)
+
+
+def obj_perm_created_filters(sender, instance, created, using, **kwargs):
+    # Filters only produce false positives for revoked permissions
+    if created:
+        identity_field = sender.objects.user_or_group_field
+        _invalidate_obj_perms_filters(identity_field, [getattr(instance, '%s_id' % identity_field)], using)
+
+
+def obj_perms_bulk_created_filters(sender, action, rows, **kwargs):
+    if action == 'create':
+        identity_field = sender.objects.user_or_group_field
+        _invalidate_obj_perms_filters(identity_field, {row['%s_id' % identity_field] for row in rows},
+                                      router.db_for_write(sender))
+
+
+def _get_obj_perms_filters_receivers():
+    receivers = []
+    for model in get_generic_obj_perms_models():
+        receivers += [
+            (post_save, obj_perm_created_filters, model),
+            (obj_perms_bulk_changed, obj_perms_bulk_created_filters, model),
+        ]
+    return receivers
+
+
+def connect_obj_perms_filters_handlers():
+    """
+    Connects receivers making filters returned by
+    :func:`guardian.cache.get_obj_perms_filter` stale once permissions are
+    granted. Called on startup if :setting:`GUARDIAN_OBJ_PERMS_FILTER_TIMEOUT`
+    is set.
+    """
+    for signal, receiver, sender in _get_obj_perms_filters_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def disconnect_obj_perms_filters_handlers():
+    for signal, receiver, sender in _get_obj_perms_filters_receivers():
+        signal.disconnect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def _invalidate_cached_object_pks(instance, user_ids, using):
+    ctype_ids = [instance.content_type_id]
+    # Only a new generation is stored: sets updated in place could lose
+    # concurrent changes, and must not contain permissions rolled back
+    transaction.on_commit(lambda: invalidate_cached_object_pks(user_ids, ctype_ids), using=using)
+
+
+def obj_perm_created_objects(sender, instance, created, using, **kwargs):
+    if created:
+        _invalidate_cached_object_pks(instance, _get_obj_perm_user_ids(instance), using)
+
+
+def obj_perm_deleted_objects(sender, instance, using, **kwargs):
+    user_ids = getattr(instance, '_guardian_user_ids', None)
+    if user_ids is None:
+        user_ids = _get_obj_perm_user_ids(instance)
+    _invalidate_cached_object_pks(instance, user_ids, using)
+
+
+def obj_perms_bulk_changed_objects(sender, action, rows, **kwargs):
+    if action not in ('create', 'delete'):
+        return
+    identity_field = sender.objects.user_or_group_field
+    user_ids = get_identity_user_ids(identity_field, {row['%s_id' % identity_field] for row in rows})
+    ctype_ids = {row['content_type_id'] for row in rows}
+    transaction.on_commit(lambda: invalidate_cached_object_pks(user_ids, ctype_ids),
+                          using=router.db_for_write(sender))
+
+
+def _get_objects_cache_receivers():
+    receivers = []
+    for model in get_generic_obj_perms_models():
+        receivers += [
+            (pre_delete, collect_obj_perm_users, model),
+            (post_save, obj_perm_created_objects, model),
+            (post_delete, obj_perm_deleted_objects, model),
+            (obj_perms_bulk_changed, obj_perms_bulk_changed_objects, model),
+        ]
+    return receivers
+
+
+def connect_objects_cache_handlers():
+    """
+    Connects receivers keeping sets cached by
+    :func:`guardian.cache.get_cached_object_pks` up to date. Called on
+    startup if :setting:`GUARDIAN_OBJECTS_CACHE_TIMEOUT` is set.
+    """
+    for signal, receiver, sender in _get_objects_cache_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def disconnect_objects_cache_handlers():
+    for signal, receiver, sender in _get_objects_cache_receivers():
+        signal.disconnect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def anonymous_user_changed(sender, instance, **kwargs):
+    if (instance.pk == get_cached_anonymous_user_pk() or
+            instance.get_username() == guardian_settings.ANONYMOUS_USER_NAME):
+        invalidate_anonymous_user()
+
+
+def _get_anonymous_user_receivers():
+    User = get_user_model()
+    return [
+        (post_save, anonymous_user_changed, User),
+        (post_delete, anonymous_user_changed, User),
+    ]
+
+
+def connect_anonymous_user_handlers():
+    """
+    Connects receivers dropping the anonymous user memoized by
+    :func:`guardian.cache.get_cached_anonymous_user` when it changes. Called
+    on startup if :setting:`GUARDIAN_ANONYMOUS_USER_CACHE` is set.
+    """
+    for signal, receiver, sender in _get_anonymous_user_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def disconnect_anonymous_user_handlers():
+    for signal, receiver, sender in _get_anonymous_user_receivers():
+        signal.disconnect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def _invalidate_anonymous_perms_snapshot(identity_field, identity_ids, using):
+    invalidate_anonymous_perms_snapshot(identity_field, identity_ids)
+    # The snapshot may be rebuilt by checks made before the transaction commits
+    transaction.on_commit(lambda: invalidate_anonymous_perms_snapshot(identity_field, identity_ids), using=using)
+
+
+def obj_perm_changed_snapshot(sender, instance, using, **kwargs):
+    identity_field = sender.objects.user_or_group_field
+    _invalidate_anonymous_perms_snapshot(identity_field, [getattr(instance, '%s_id' % identity_field)], using)
+
+
+def obj_perms_bulk_changed_snapshot(sender, action, rows, **kwargs):
+    identity_field = sender.objects.user_or_group_field
+    _invalidate_anonymous_perms_snapshot(identity_field, {row['%s_id' % identity_field] for row in rows},
+                                         router.db_for_write(sender))
+
+
+def _get_anonymous_perms_snapshot_receivers():
+    receivers = []
+    for model in get_generic_obj_perms_models():
+        receivers += [
+            (post_save, obj_perm_changed_snapshot, model),
+            (post_delete, obj_perm_changed_snapshot, model),
+            (obj_perms_bulk_changed, obj_perms_bulk_changed_snapshot, model),
+        ]
+    return receivers
+
+
+def connect_anonymous_perms_snapshot_handlers():
+    """
+    Connects receivers dropping the snapshot returned by
+    :func:`guardian.cache.get_anonymous_perms_snapshot` when permissions of
+    the anonymous user, its groups or organizations change. Called on startup
+    if :setting:`GUARDIAN_ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT` is set.
+    """
+    for signal, receiver, sender in _get_anonymous_perms_snapshot_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
+
+
+def disconnect_anonymous_perms_snapshot_handlers():
+    for signal, receiver, sender in _get_anonymous_perms_snapshot_receivers():
+        signal.disconnect(receiver, sender=sender, dispatch_uid='guardian.handlers.%s' % receiver.__name__)
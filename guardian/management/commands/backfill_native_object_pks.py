@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from guardian.utils import backfill_native_object_pks
+
+
+class Command(BaseCommand):
+    """
+    backfill_native_object_pks command is a tiny wrapper around
+    :func:`guardian.utils.backfill_native_object_pks`. It should be run once
+    before enabling :setting:`GUARDIAN_NATIVE_OBJECT_PK`.
+
+    Usage::
+
+        $ python manage.py backfill_native_object_pks
+        Filled native object pk of 120000 object permission entries
+
+    """
+    help = "Fills integer/UUID object pk columns of existing object permissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of grants updated by a single query.")
+
+    def handle(self, **options):
+        verbosity = options['verbosity']
+
+        def progress(model, filled):
+            if verbosity > 1:
+                self.stdout.write("%s: %d entries filled" % (model._meta.label, filled))
+
+        filled = backfill_native_object_pks(batch_size=options['batch_size'], progress=progress)
+        if verbosity > 0:
+            self.stdout.write("Filled native object pk of %d object permission entries" % filled)
@@ -1,4 +1,5 @@
-from django.core.management.base import BaseCommand
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
 
 from guardian.utils import clean_orphan_obj_perms
 
@@ -13,11 +14,43 @@ class Command(BaseCommand):
         $ python manage.py clean_orphan_obj_perms
         Removed 11 object permission entries with no targets
 
+        $ python manage.py clean_orphan_obj_perms --ctype=articles.article --dry-run
+        Found 4 object permission entries with no targets
+
     """
     help = "Removes object permissions with not existing targets"
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count object permissions with not existing targets.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of object permissions removed by a single query.")
+        parser.add_argument('--ctype', action='append', dest='ctypes',
+                            help="Only clean object permissions of given content type "
+                                 "(in format app_label.model), may be given multiple times.")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Number of content types processed in parallel.")
+
     def handle(self, **options):
-        removed = clean_orphan_obj_perms()
-        if options['verbosity'] > 0:
-            print("Removed %d object permission entries with no targets" %
-                  removed)
+        verbosity = options['verbosity']
+        content_types = None
+        if options['ctypes']:
+            try:
+                content_types = [ContentType.objects.get_by_natural_key(*ctype.split('.', 1))
+                                 for ctype in options['ctypes']]
+            except (ValueError, TypeError, ContentType.DoesNotExist):
+                raise CommandError("--ctype must be an existing content type in format app_label.model")
+
+        def progress(model, ctype, removed):
+            if verbosity > 1:
+                self.stdout.write("%s: %d entries for %s.%s" % (
+                    model._meta.label, removed, ctype.app_label, ctype.model))
+
+        removed = clean_orphan_obj_perms(batch_size=options['batch_size'],
+                                         dry_run=options['dry_run'],
+                                         content_types=content_types,
+                                         workers=options['workers'],
+                                         progress=progress)
+        if verbosity > 0:
+            self.stdout.write("%s %d object permission entries with no targets" % (
+                "Found" if options['dry_run'] else "Removed", removed))
@@ -0,0 +1,58 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+MODEL_TEMPLATE = '''
+
+class {name}{identity}ObjectPermission({identity}ObjectPermissionBase):
+    content_object = models.ForeignKey({target!r}, on_delete=models.CASCADE)
+    permission_expiry = models.DateTimeField(null=True, blank=True, db_index=True)
+    permission_expiry_30day_email_sent = models.BooleanField(default=False, blank=True)
+    permission_expiry_0day_email_sent = models.BooleanField(default=False, blank=True)
+{enabled}
+    class Meta({identity}ObjectPermissionBase.Meta):
+        indexes = [
+            models.Index(fields=['content_object', '{identity_field}']),
+        ]
+'''
+
+
+class Command(BaseCommand):
+    """
+    generate_direct_obj_perms_models command prints source code of direct
+    foreign key user, group and organization object permission models (see
+    :ref:`performance-direct-fk`) for given model, to be pasted into its
+    application's ``models.py``.
+
+    Models are generated disabled by default, so that guardian keeps using
+    generic object permissions until those are moved over with
+    :command:`migrate_obj_perms_to_direct` and ``enabled = False`` lines are
+    removed.
+
+    Usage::
+
+        $ python manage.py generate_direct_obj_perms_models projects.Project >> projects/models.py
+
+    """
+    help = "Prints direct foreign key object permission models for given model"
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help="Model in format app_label.ModelName.")
+        parser.add_argument('--enabled', action='store_true',
+                            help="Do not disable generated models.")
+
+    def handle(self, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (ValueError, LookupError):
+            raise CommandError("model must be an installed model in format app_label.ModelName")
+
+        self.stdout.write("from guardian.models import GroupObjectPermissionBase, "
+                          "OrganizationObjectPermissionBase, UserObjectPermissionBase")
+        for identity in ('User', 'Group', 'Organization'):
+            self.stdout.write(MODEL_TEMPLATE.format(
+                name=model.__name__,
+                identity=identity,
+                target=model._meta.label,
+                identity_field=identity.lower(),
+                enabled='' if options['enabled'] else '    enabled = False\n',
+            ), ending='')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from guardian.utils import EXPIRY_THRESHOLDS, sweep_expiring_obj_perms
+
+
+class Command(BaseCommand):
+    """
+    guardian_expiry_sweep command is a tiny wrapper around
+    :func:`guardian.utils.sweep_expiring_obj_perms`. It is cheap enough to be
+    run every minute (i.e. from cron).
+
+    Usage::
+
+        $ python manage.py guardian_expiry_sweep --callback=myapp.emails.send_expiry_emails
+        Flagged 3 object permission entries crossing the 0day expiry threshold
+        Flagged 12 object permission entries crossing the 30day expiry threshold
+
+    """
+    help = "Notifies about and flags object permissions about to expire"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', action='append', dest='thresholds',
+                            choices=sorted(EXPIRY_THRESHOLDS),
+                            help="Threshold to sweep, may be given multiple times. "
+                                 "Defaults to all thresholds.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of grants handed to the callback at once.")
+        parser.add_argument('--callback',
+                            help="Dotted path to the callback; defaults to "
+                                 "GUARDIAN_EXPIRY_SWEEP_CALLBACK.")
+
+    def handle(self, **options):
+        callback = options['callback'] and import_string(options['callback'])
+        thresholds = options['thresholds'] or ('0day', '30day')
+        flagged = sweep_expiring_obj_perms(callback=callback or None,
+                                           thresholds=thresholds,
+                                           batch_size=options['batch_size'])
+        if options['verbosity'] > 0:
+            for threshold in thresholds:
+                self.stdout.write("Flagged %d object permission entries crossing the %s expiry threshold"
+                                  % (flagged[threshold], threshold))
@@ -0,0 +1,45 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from guardian.utils import migrate_obj_perms_to_direct_models
+
+
+class Command(BaseCommand):
+    """
+    migrate_obj_perms_to_direct command is a tiny wrapper around
+    :func:`guardian.utils.migrate_obj_perms_to_direct_models`.
+
+    Usage::
+
+        $ python manage.py migrate_obj_perms_to_direct projects.Project
+        Migrated 120000 object permission entries to projects.ProjectUserObjectPermission
+        Migrated 800 object permission entries to projects.ProjectGroupObjectPermission
+
+    """
+    help = "Moves generic object permissions of given model to its direct foreign key models"
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help="Model in format app_label.ModelName.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of grants moved by a single transaction.")
+
+    def handle(self, **options):
+        verbosity = options['verbosity']
+        try:
+            model = apps.get_model(options['model'])
+        except (ValueError, LookupError):
+            raise CommandError("model must be an installed model in format app_label.ModelName")
+
+        def progress(direct_model, migrated):
+            if verbosity > 1:
+                self.stdout.write("%s: %d entries migrated" % (direct_model._meta.label, migrated))
+
+        migrated = migrate_obj_perms_to_direct_models(model, batch_size=options['batch_size'],
+                                                      progress=progress)
+        if not migrated:
+            raise CommandError("%s has no direct foreign key object permission models"
+                               % model._meta.label)
+        if verbosity > 0:
+            for direct_model, count in migrated.items():
+                self.stdout.write("Migrated %d object permission entries to %s"
+                                  % (count, direct_model._meta.label))
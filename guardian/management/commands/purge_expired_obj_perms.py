@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from guardian.utils import purge_expired_obj_perms
+
+
+class Command(BaseCommand):
+    """
+    purge_expired_obj_perms command is a tiny wrapper around
+    :func:`guardian.utils.purge_expired_obj_perms`.
+
+    Usage::
+
+        $ python manage.py purge_expired_obj_perms --days=90 --sleep=0.5
+        Purged 24000 expired object permission entries in 12.3s (1951 entries/s)
+
+    """
+    help = "Archives or deletes object permissions expired for more than given number of days"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0,
+                            help="Only purge grants expired for more than given number of days.")
+        parser.add_argument('--delete', action='store_false', dest='archive',
+                            help="Delete expired grants instead of archiving them.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of grants purged by a single transaction.")
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="Seconds to sleep between batches.")
+
+    def handle(self, **options):
+        verbosity = options['verbosity']
+
+        def progress(model, purged):
+            if verbosity > 1:
+                self.stdout.write("%s: %d entries purged" % (model._meta.label, purged))
+
+        start = time.monotonic()
+        purged = purge_expired_obj_perms(days=options['days'],
+                                         archive=options['archive'],
+                                         batch_size=options['batch_size'],
+                                         sleep=options['sleep'],
+                                         progress=progress)
+        elapsed = time.monotonic() - start
+        total = sum(purged.values())
+        if verbosity > 0:
+            self.stdout.write("Purged %d expired object permission entries in %.1fs (%d entries/s)"
+                              % (total, elapsed, total / elapsed if elapsed else total))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from guardian.utils import rebuild_effective_obj_perms
+
+
+class Command(BaseCommand):
+    """
+    rebuild_effective_obj_perms command is a tiny wrapper around
+    :func:`guardian.utils.rebuild_effective_obj_perms`. It should be run once
+    when enabling :setting:`GUARDIAN_EFFECTIVE_OBJ_PERMS`, and to repair
+    effective permissions after object permissions or memberships were changed
+    without sending signals (i.e. by raw SQL or ``QuerySet.update``).
+
+    Usage::
+
+        $ python manage.py rebuild_effective_obj_perms
+        Rebuilt effective object permissions of 5000 users
+
+    """
+    help = "Recomputes effective object permissions of all users"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of users processed by a single transaction.")
+
+    def handle(self, **options):
+        verbosity = options['verbosity']
+
+        def progress(processed):
+            if verbosity > 1:
+                self.stdout.write("%d users processed" % processed)
+
+        processed = rebuild_effective_obj_perms(batch_size=options['batch_size'], progress=progress)
+        if verbosity > 0:
+            self.stdout.write("Rebuilt effective object permissions of %d users" % processed)
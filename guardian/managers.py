@@ -8,7 +8,8 @@ from django.contrib.auth.models import Permission
 
 import warnings
 
-from guardian.utils import calculate_permission_expiry
+from guardian.signals import obj_perms_bulk_changed
+from guardian.utils import calculate_permission_expiry, get_obj_perm_row_fields, set_native_object_pk
 
 
 class BaseObjectPermissionManager(models.Manager):
@@ -99,7 +100,7 @@ class BaseObjectPermissionManager(models.Manager):
                 else:
                     kwargs['content_object'] = instance
                 assigned_perms.append(self.model(**kwargs))
-        self.model.objects.bulk_create(assigned_perms)
+        self._bulk_create(assigned_perms)
 
         return assigned_perms
 
@@ -133,7 +134,22 @@ class BaseObjectPermissionManager(models.Manager):
                 self.model(**kwargs)
             )
 
-        return self.model.objects.bulk_create(to_add)
+        return self._bulk_create(to_add)
+
+    def _bulk_create(self, obj_perms):
+        """
+        Creates ``obj_perms`` with a single query and notifies receivers of
+        :data:`guardian.signals.obj_perms_bulk_changed`.
+        """
+        if self.is_generic():
+            for obj_perm in obj_perms:
+                set_native_object_pk(obj_perm)
+        created = self.bulk_create(obj_perms)
+        if obj_perms_bulk_changed.has_listeners(self.model):
+            fields = get_obj_perm_row_fields(self.model)
+            rows = [{field: getattr(obj_perm, field) for field in fields} for obj_perm in obj_perms]
+            obj_perms_bulk_changed.send(sender=self.model, action='create', rows=rows)
+        return created
 
     def assign(self, perm, user_or_group, obj):
         """ Depreciated function name left in for compatibility"""
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0001_initial'),
+        ('contenttypes', '0001_initial'),
+        ('guardian', '0002_generic_permissions_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedObjectPermission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('source_pk', models.BigIntegerField()),
+                ('identity_id', models.CharField(max_length=255)),
+                ('object_pk', models.CharField(max_length=255, verbose_name='object ID')),
+                ('permission_expiry', models.DateTimeField(db_index=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='auth.Permission')),
+            ],
+        ),
+    ]
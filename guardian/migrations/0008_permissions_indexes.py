@@ -0,0 +1,102 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardian', '0007_archivedobjectpermission'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='groupobjectpermission',
+            name='object_pk',
+            field=models.CharField(max_length=255, verbose_name='object ID'),
+        ),
+        migrations.AlterField(
+            model_name='groupobjectpermission',
+            name='permission_expiry_0day_email_sent',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='groupobjectpermission',
+            name='permission_expiry_30day_email_sent',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='organizationobjectpermission',
+            name='object_pk',
+            field=models.CharField(max_length=255, verbose_name='object ID'),
+        ),
+        migrations.AlterField(
+            model_name='organizationobjectpermission',
+            name='permission_expiry_0day_email_sent',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='organizationobjectpermission',
+            name='permission_expiry_30day_email_sent',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='userobjectpermission',
+            name='object_pk',
+            field=models.CharField(max_length=255, verbose_name='object ID'),
+        ),
+        migrations.AlterField(
+            model_name='userobjectpermission',
+            name='permission_expiry_0day_email_sent',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='userobjectpermission',
+            name='permission_expiry_30day_email_sent',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AddIndex(
+            model_name='groupobjectpermission',
+            index=models.Index(fields=['group', 'content_type', 'object_pk', 'permission'], name='guardian_gr_group_i_900e4e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupobjectpermission',
+            index=models.Index(condition=models.Q(permission_expiry_0day_email_sent=False), fields=['permission_expiry'], name='guardian_gr_0day_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupobjectpermission',
+            index=models.Index(condition=models.Q(permission_expiry_30day_email_sent=False), fields=['permission_expiry'], name='guardian_gr_30day_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk'], name='guardian_or_content_1508a7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationobjectpermission',
+            index=models.Index(fields=['organization', 'content_type', 'object_pk', 'permission'], name='guardian_or_organiz_ba2976_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationobjectpermission',
+            index=models.Index(condition=models.Q(permission_expiry_0day_email_sent=False), fields=['permission_expiry'], name='guardian_or_0day_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationobjectpermission',
+            index=models.Index(condition=models.Q(permission_expiry_30day_email_sent=False), fields=['permission_expiry'], name='guardian_or_30day_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(fields=['user', 'content_type', 'object_pk', 'permission'], name='guardian_us_user_id_510c56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(fields=['user', 'permission', 'permission_expiry'], name='guardian_us_user_id_8e3ed6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(condition=models.Q(permission_expiry_0day_email_sent=False), fields=['permission_expiry'], name='guardian_us_0day_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(condition=models.Q(permission_expiry_30day_email_sent=False), fields=['permission_expiry'], name='guardian_us_30day_unsent_idx'),
+        ),
+    ]
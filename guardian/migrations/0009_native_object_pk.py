@@ -0,0 +1,67 @@
+# Generated by Django 3.0.14 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardian', '0008_permissions_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupobjectpermission',
+            name='object_pk_int',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupobjectpermission',
+            name='object_pk_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='organizationobjectpermission',
+            name='object_pk_int',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='organizationobjectpermission',
+            name='object_pk_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userobjectpermission',
+            name='object_pk_int',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userobjectpermission',
+            name='object_pk_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='groupobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk_int'], name='guardian_gr_content_75f356_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk_uuid'], name='guardian_gr_content_9b1faa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk_int'], name='guardian_or_content_b52018_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk_uuid'], name='guardian_or_content_5fa225_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk_int'], name='guardian_us_content_1f9129_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(fields=['content_type', 'object_pk_uuid'], name='guardian_us_content_ca0cea_idx'),
+        ),
+    ]
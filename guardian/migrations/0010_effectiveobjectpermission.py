@@ -0,0 +1,37 @@
+# Generated by Django 3.0.14 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('auth', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('guardian', '0009_native_object_pk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveObjectPermission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_pk', models.CharField(max_length=255, verbose_name='object ID')),
+                ('permission_expiry', models.DateTimeField(blank=True, null=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='auth.Permission')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='effectiveobjectpermission',
+            index=models.Index(fields=['user', 'permission', 'object_pk'], name='guardian_ef_user_id_022008_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='effectiveobjectpermission',
+            unique_together={('user', 'content_type', 'object_pk', 'permission')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.14 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardian', '0010_effectiveobjectpermission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='effectiveobjectpermission',
+            name='source',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='effectiveobjectpermission',
+            unique_together={('user', 'content_type', 'object_pk', 'permission', 'source')},
+        ),
+    ]
@@ -1,14 +1,27 @@
+import asyncio
 from collections.abc import Iterable
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required, REDIRECT_FIELD_NAME
 from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from guardian.backends import check_support, check_user_support
+from guardian.core import ObjectPermissionChecker
 from guardian.utils import get_user_obj_perms_model
 UserObjectPermission = get_user_obj_perms_model()
 from guardian.utils import get_40x_or_None, get_anonymous_user
 from guardian.shortcuts import get_objects_for_user
 
 
+def is_async_view(view):
+    """
+    Returns ``True`` if all HTTP method handlers (except ``options``) of
+    class-based ``view`` are coroutine functions.
+    """
+    handlers = [getattr(view, method) for method in view.http_method_names
+                if method != 'options' and hasattr(view, method)]
+    return bool(handlers) and all(asyncio.iscoroutinefunction(handler) for handler in handlers)
+
+
 class LoginRequiredMixin:
     """
     A login required mixin for use with class based views. This Class is a
@@ -37,16 +50,31 @@ class LoginRequiredMixin:
 
         *Default*: ``settings.LOGIN_URL``
 
+    Views with ``async def`` handlers are supported; the check is then run with
+    ``sync_to_async``.
+
     """
     redirect_field_name = REDIRECT_FIELD_NAME
     login_url = settings.LOGIN_URL
 
     def dispatch(self, request, *args, **kwargs):
+        if is_async_view(self):
+            return self._async_login_required_dispatch(request, *args, **kwargs)
         return login_required(redirect_field_name=self.redirect_field_name,
                               login_url=self.login_url)(
             super().dispatch
         )(request, *args, **kwargs)
 
+    async def _async_login_required_dispatch(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        check = login_required(redirect_field_name=self.redirect_field_name,
+                               login_url=self.login_url)(lambda request, *args, **kwargs: None)
+        response = await sync_to_async(check, thread_sensitive=True)(request, *args, **kwargs)
+        if response:
+            return response
+        return await super().dispatch(request, *args, **kwargs)
+
 
 class PermissionRequiredMixin:
     """
@@ -76,6 +104,9 @@ class PermissionRequiredMixin:
         If the user is logged in, and passes the permission check than the view
         is executed normally.
 
+    Views with ``async def`` handlers are supported; the permission check is
+    then run with ``sync_to_async``.
+
     **Example Usage**::
 
         class SecureView(PermissionRequiredMixin, View):
@@ -124,7 +155,17 @@ class PermissionRequiredMixin:
     ``PermissionRequiredMixin.permission_object``
          *Default*: ``(not set)``, object against which test the permission; if not set fallback
          to ``self.get_permission_object()`` which return ``self.get_object()``
-         or ``self.object`` by default.
+         or ``self.object`` by default. Object returned by ``self.get_object()``
+         is memoized and returned by following calls of ``get_object`` (without
+         ``queryset`` argument) so that the view doesn't fetch it again.
+
+    ``PermissionRequiredMixin.prefetch_object_perms``
+
+        *Default*: ``False``. If set to ``True``, all permissions of
+        *request.user* for the permission object are fetched at once (see
+        :meth:`get_object_perms`), used for the permission check and put
+        into the template context as ``object_perms``, so that templates can
+        check further permissions without hitting database.
 
     """
     # default class view settings
@@ -135,6 +176,7 @@ class PermissionRequiredMixin:
     return_404 = False
     raise_exception = False
     accept_global_perms = False
+    prefetch_object_perms = False
 
     def get_required_permissions(self, request=None):
         """
@@ -158,8 +200,54 @@ class PermissionRequiredMixin:
     def get_permission_object(self):
         if hasattr(self, 'permission_object'):
             return self.permission_object
-        return (hasattr(self, 'get_object') and self.get_object() or
-                getattr(self, 'object', None))
+        if '_permission_object' not in self.__dict__:
+            has_get_object = (type(self).get_object is not PermissionRequiredMixin.get_object or
+                              hasattr(super(), 'get_object'))
+            self._permission_object = (has_get_object and self.get_object() or
+                                       getattr(self, 'object', None))
+        return self._permission_object
+
+    def get_object(self, queryset=None):
+        """
+        Returns object already fetched by :meth:`get_permission_object`, if
+        any, calling ``get_object`` of the view otherwise.
+        """
+        if queryset is None and self.__dict__.get('_permission_object') is not None:
+            return self._permission_object
+        return super().get_object(queryset)
+
+    def get_object_perms(self):
+        """
+        Returns list of codenames of all permissions *request.user* has for the
+        permission object, fetched once per request with
+        :class:`guardian.core.ObjectPermissionChecker`, or ``None`` if there is
+        no permission object.
+        """
+        if '_object_perms' not in self.__dict__:
+            obj = self.get_permission_object()
+            supported, user = check_support(self.request.user, obj)
+            if obj is None:
+                self._object_perms = None
+            elif not supported:
+                self._object_perms = []
+            else:
+                self._object_perms = ObjectPermissionChecker(user).get_perms(obj, permission_expiry=True)
+        return self._object_perms
+
+    def has_prefetched_perms(self, perms):
+        """
+        Returns ``True`` if all ``perms`` are among permissions returned by
+        :meth:`get_object_perms`.
+        """
+        obj = self.get_permission_object()
+        object_perms = self.get_object_perms()
+        if not object_perms:
+            return False
+        for perm in perms:
+            app_label, _, codename = perm.rpartition('.')
+            if app_label and app_label != obj._meta.app_label or codename not in object_perms:
+                return False
+        return True
 
     def check_permissions(self, request):
         """
@@ -170,6 +258,9 @@ class PermissionRequiredMixin:
         """
         obj = self.get_permission_object()
 
+        if self.prefetch_object_perms and self.has_prefetched_perms(self.get_required_permissions(request)):
+            return None
+
         forbidden = get_40x_or_None(request,
                                     perms=self.get_required_permissions(
                                         request),
@@ -201,11 +292,29 @@ class PermissionRequiredMixin:
         self.request = request
         self.args = args
         self.kwargs = kwargs
+        if is_async_view(self):
+            return self._async_permission_required_dispatch(request, *args, **kwargs)
         response = self.check_permissions(request)
         if response:
             return response
         return super().dispatch(request, *args, **kwargs)
 
+    async def _async_permission_required_dispatch(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        # Django ORM is synchronous, so the whole check (including fetching
+        # the permission object) is done in a single thread hop
+        response = await sync_to_async(self.check_permissions, thread_sensitive=True)(request)
+        if response:
+            return response
+        return await super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.prefetch_object_perms:
+            context.setdefault('object_perms', self.get_object_perms())
+        return context
+
 
 class GuardianUserMixin:
 
@@ -250,9 +359,26 @@ class PermissionListMixin:
 
         *Default*: ``{}``,  A extra params to pass for ```guardian.shortcuts.get_objects_for_user```
 
+    ``PermissionListMixin.prefetch_object_permissions``
+
+        *Default*: ``None``, may be set to a list of permissions in format
+        *<app_label>.<permission_codename>* (or just codenames). If set,
+        permissions of *request.user* for objects of the current page (after
+        pagination) are prefetched with a single
+        :class:`guardian.core.ObjectPermissionChecker`, which is put into the
+        template context as ``perms_checker`` (to be given to the
+        ``get_obj_perms`` template tag), and each of these objects gets
+        ``object_perms`` attribute with codenames of the listed permissions the
+        user has for it::
+
+            {% for article in object_list %}
+                {% if "change_article" in article.object_perms %}...{% endif %}
+            {% endfor %}
+
     """
     permission_required = None
     get_objects_for_user_extra_kwargs = {}
+    prefetch_object_permissions = None
 
     def get_required_permissions(self, request=None):
         """
@@ -287,3 +413,36 @@ class PermissionListMixin:
     def get_queryset(self, *args, **kwargs):
         qs = super().get_queryset(*args, **kwargs)
         return get_objects_for_user(**self.get_get_objects_for_user_kwargs(qs))
+
+    def get_permission_checker(self):
+        """
+        Returns :class:`guardian.core.ObjectPermissionChecker` of
+        *request.user* shared by the whole request, or ``None`` if the user is
+        not supported (see :func:`guardian.backends.check_user_support`).
+        """
+        if '_permission_checker' not in self.__dict__:
+            supported, user = check_user_support(self.request.user)
+            self._permission_checker = ObjectPermissionChecker(user) if supported else None
+        return self._permission_checker
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.prefetch_object_permissions:
+            checker = self.get_permission_checker()
+            object_list = context['object_list']
+            objects = list(object_list)
+            # make template iterate over the very instances permissions are
+            # attached to, instead of evaluating the page again
+            for key, value in list(context.items()):
+                if value is object_list:
+                    context[key] = objects
+            if context.get('page_obj') is not None:
+                context['page_obj'].object_list = objects
+            if checker is not None:
+                checker.prefetch_perms(objects)
+            codenames = [perm.split('.', 1)[-1] for perm in self.prefetch_object_permissions]
+            for obj in objects:
+                obj.object_perms = [codename for codename in codenames
+                                    if checker is not None and checker.has_perm(codename, obj)]
+            context['perms_checker'] = checker
+        return context
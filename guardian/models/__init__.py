@@ -10,6 +10,8 @@ from .models import (
     OrganizationObjectPermissionBase,
     OrganizationObjectPermissionAbstract,
     OrganizationObjectPermission,
+    ArchivedObjectPermission,
+    EffectiveObjectPermission,
     Permission,
     Group
 )
@@ -25,5 +27,8 @@ __all__ = [
     'Permission',
     'Group',
     'UserObjectPermission',
-    'GroupObjectPermission'
+    'GroupObjectPermission',
+    'OrganizationObjectPermission',
+    'ArchivedObjectPermission',
+    'EffectiveObjectPermission',
 ]
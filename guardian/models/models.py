@@ -3,11 +3,13 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from guardian.compat import user_model_label
 from guardian.ctypes import get_content_type
 from guardian.managers import GroupObjectPermissionManager, UserObjectPermissionManager, \
     OrganizationObjectPermissionManager
+from guardian.utils import set_native_object_pk
 from organizations.models import Organization
 
 
@@ -41,15 +43,23 @@ class BaseGenericObjectPermission(models.Model):
     object_pk = models.CharField(_('object ID'), max_length=255)
     content_object = GenericForeignKey(fk_field='object_pk')
     permission_expiry = models.DateTimeField(null=True, blank=True, db_index=True)
-    permission_expiry_30day_email_sent = models.BooleanField(null=False, default=False, blank=True, db_index=True)
-    permission_expiry_0day_email_sent = models.BooleanField(null=False, default=False, blank=True, db_index=True)
+    permission_expiry_30day_email_sent = models.BooleanField(null=False, default=False, blank=True)
+    permission_expiry_0day_email_sent = models.BooleanField(null=False, default=False, blank=True)
+    object_pk_int = models.BigIntegerField(null=True, blank=True, editable=False)
+    object_pk_uuid = models.UUIDField(null=True, blank=True, editable=False)
 
     class Meta:
         abstract = True
         indexes = [
             models.Index(fields=['content_type', 'object_pk']),
+            models.Index(fields=['content_type', 'object_pk_int']),
+            models.Index(fields=['content_type', 'object_pk_uuid']),
         ]
 
+    def save(self, *args, **kwargs):
+        set_native_object_pk(self)
+        return super().save(*args, **kwargs)
+
 
 class UserObjectPermissionBase(BaseObjectPermission):
     """
@@ -69,12 +79,24 @@ class UserObjectPermissionAbstract(UserObjectPermissionBase, BaseGenericObjectPe
     class Meta(UserObjectPermissionBase.Meta, BaseGenericObjectPermission.Meta):
         abstract = True
         unique_together = ['user', 'permission', 'object_pk']
+        indexes = [
+            *BaseGenericObjectPermission.Meta.indexes,
+            models.Index(fields=['user', 'content_type', 'object_pk', 'permission']),
+            models.Index(fields=['user', 'permission', 'permission_expiry']),
+        ]
 
 
 class UserObjectPermission(UserObjectPermissionAbstract):
 
     class Meta(UserObjectPermissionAbstract.Meta):
         abstract = False
+        indexes = [
+            *UserObjectPermissionAbstract.Meta.indexes,
+            models.Index(fields=['permission_expiry'], name='guardian_us_0day_unsent_idx',
+                         condition=Q(permission_expiry_0day_email_sent=False)),
+            models.Index(fields=['permission_expiry'], name='guardian_us_30day_unsent_idx',
+                         condition=Q(permission_expiry_30day_email_sent=False)),
+        ]
 
 
 class GroupObjectPermissionBase(BaseObjectPermission):
@@ -95,12 +117,23 @@ class GroupObjectPermissionAbstract(GroupObjectPermissionBase, BaseGenericObject
     class Meta(GroupObjectPermissionBase.Meta, BaseGenericObjectPermission.Meta):
         abstract = True
         unique_together = ['group', 'permission', 'object_pk']
+        indexes = [
+            *BaseGenericObjectPermission.Meta.indexes,
+            models.Index(fields=['group', 'content_type', 'object_pk', 'permission']),
+        ]
 
 
 class GroupObjectPermission(GroupObjectPermissionAbstract):
 
     class Meta(GroupObjectPermissionAbstract.Meta):
         abstract = False
+        indexes = [
+            *GroupObjectPermissionAbstract.Meta.indexes,
+            models.Index(fields=['permission_expiry'], name='guardian_gr_0day_unsent_idx',
+                         condition=Q(permission_expiry_0day_email_sent=False)),
+            models.Index(fields=['permission_expiry'], name='guardian_gr_30day_unsent_idx',
+                         condition=Q(permission_expiry_30day_email_sent=False)),
+        ]
 
 
 class OrganizationObjectPermissionBase(BaseObjectPermission):
@@ -121,10 +154,64 @@ class OrganizationObjectPermissionAbstract(OrganizationObjectPermissionBase, Bas
     class Meta(OrganizationObjectPermissionBase.Meta, BaseGenericObjectPermission.Meta):
         abstract = True
         unique_together = ['organization', 'permission', 'object_pk']
+        indexes = [
+            *BaseGenericObjectPermission.Meta.indexes,
+            models.Index(fields=['organization', 'content_type', 'object_pk', 'permission']),
+        ]
 
 
 class OrganizationObjectPermission(OrganizationObjectPermissionAbstract):
 
     class Meta(OrganizationObjectPermissionAbstract.Meta):
         abstract = False
+        indexes = [
+            *OrganizationObjectPermissionAbstract.Meta.indexes,
+            models.Index(fields=['permission_expiry'], name='guardian_or_0day_unsent_idx',
+                         condition=Q(permission_expiry_0day_email_sent=False)),
+            models.Index(fields=['permission_expiry'], name='guardian_or_30day_unsent_idx',
+                         condition=Q(permission_expiry_30day_email_sent=False)),
+        ]
+
+
+
+class ArchivedObjectPermission(models.Model):
+    """
+    Expired generic object permission moved out of the object permission
+    tables by :command:`purge_expired_obj_perms`.
+    """
+    source = models.CharField(max_length=100)
+    source_pk = models.BigIntegerField()
+    identity_id = models.CharField(max_length=255)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_pk = models.CharField(_('object ID'), max_length=255)
+    permission = models.ForeignKey(Permission, on_delete=models.CASCADE)
+    permission_expiry = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{} | {} | {} ({})'.format(self.source, self.identity_id, self.permission_id, self.object_pk)
+
 
+class EffectiveObjectPermission(models.Model):
+    """
+    Object permission of an user, granted either directly or through any of
+    user's groups or organizations - ``source`` is the label of the object
+    permission model granting it. Maintained by guardian only if
+    :setting:`GUARDIAN_EFFECTIVE_OBJ_PERMS` is enabled.
+    """
+    user = models.ForeignKey(user_model_label, on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_pk = models.CharField(_('object ID'), max_length=255)
+    permission = models.ForeignKey(Permission, on_delete=models.CASCADE)
+    permission_expiry = models.DateTimeField(null=True, blank=True)
+    source = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ['user', 'content_type', 'object_pk', 'permission', 'source']
+        indexes = [
+            models.Index(fields=['user', 'permission', 'object_pk']),
+        ]
+
+    def __str__(self):
+        return '{} | {} | {} | {} ({})'.format(self.source, self.user_id, self.permission_id, self.object_pk,
+                                               self.permission_expiry)
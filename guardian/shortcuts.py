@@ -4,7 +4,7 @@ Convenient shortcuts to manage or check object permissions.
 import warnings
 from collections import defaultdict
 from datetime import datetime
-from itertools import groupby
+from itertools import chain, islice
 from organizations import models as organization_models
 
 from django.apps import apps
@@ -12,25 +12,31 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
-from django.db.models import Count, Q, QuerySet
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Case, Count, DateTimeField, ExpressionWrapper, F, Q, QuerySet, Value, When
 from django.shortcuts import _get_queryset
+from django.utils import timezone
+from django.utils.encoding import force_str
 from django.db.models.functions import Cast
-from django.db.models import (
-    IntegerField,
-    AutoField,
-    BigIntegerField,
-    PositiveIntegerField,
-    PositiveSmallIntegerField,
-    SmallIntegerField,
-    ForeignKey
-)
+from django.db.models import BigIntegerField
 from pytz import utc
 
-from guardian.core import ObjectPermissionChecker
+from guardian.cache import get_cached_object_pks, get_user_group_ids, get_user_organization_ids, \
+    obj_perms_exist, use_anonymous_perms_snapshot, use_objects_cache
+from guardian.core import ObjectPermissionChecker, _get_pks_model_and_ctype
 from guardian.ctypes import get_content_type
 from guardian.exceptions import MixedContentTypeError, WrongAppError, MultipleIdentityAndObjectError
+from guardian.handlers import is_obj_perms_cleanup_registered
+from guardian.signals import obj_perms_bulk_changed
 from guardian.utils import get_anonymous_user, get_group_obj_perms_model, get_identity, get_user_obj_perms_model, \
-    get_organization_obj_perms_model
+    get_organization_obj_perms_model, get_generic_obj_perms_models, get_obj_perm_row_fields, get_object_pk_lookup, \
+    get_effective_obj_perms_sources, is_integer_pk_model, use_effective_obj_perms
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 OrganizationObjectPermission = get_group_obj_perms_model()
 GroupObjectPermission = get_group_obj_perms_model()
@@ -214,6 +220,67 @@ def remove_perm(perm, user_or_group=None, obj=None):
         return model.objects.remove_perm(perm, organization, obj)
 
 
+def renew_perms(queryset_or_filter, renewal_period, subscribe_to_emails=True, batch_size=1000, now=None):
+    """
+    Extends expiry of many generic object permissions at once, following the
+    same rules as ``assign_perm(..., renewal_period=...)``: grants without
+    expiry or already expired would expire ``renewal_period`` from now, others
+    ``renewal_period`` after their current expiry. Expiry email flags are reset
+    (or set, if ``subscribe_to_emails`` is ``False``) as well.
+
+    :param queryset_or_filter: queryset of a generic object permission model,
+      or ``Q`` object/dictionary of lookups applied to user, group and
+      organization object permissions.
+    :param renewal_period: ``datetime.timedelta`` instance.
+    :param batch_size: number of grants updated by a single ``UPDATE`` query.
+
+    Returns dictionary mapping object permission model to number of renewed
+    grants.
+
+    >>> from datetime import timedelta
+    >>> renew_perms({'permission__codename': 'view_site'}, timedelta(days=365))
+    {<class 'guardian.models.models.UserObjectPermission'>: 3, ...}
+    """
+    if isinstance(queryset_or_filter, QuerySet):
+        querysets = [queryset_or_filter]
+    else:
+        if isinstance(queryset_or_filter, dict):
+            queryset_or_filter = Q(**queryset_or_filter)
+        querysets = [model.objects.filter(queryset_or_filter) for model in get_generic_obj_perms_models()]
+
+    now = now or timezone.now()
+    renewed_expiry = Value(now + renewal_period, output_field=DateTimeField())
+    permission_expiry = Case(
+        When(permission_expiry__isnull=True, then=renewed_expiry),
+        When(permission_expiry__lt=now, then=renewed_expiry),
+        default=ExpressionWrapper(F('permission_expiry') + renewal_period, output_field=DateTimeField()),
+        output_field=DateTimeField(),
+    )
+    renewed = {}
+    for queryset in querysets:
+        model = queryset.model
+        renewed[model] = 0
+        queryset = queryset.order_by('pk')
+        last_pk = None
+        while True:
+            page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            pks = list(page.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            renewed[model] += model.objects.filter(pk__in=pks).update(
+                permission_expiry=permission_expiry,
+                permission_expiry_0day_email_sent=not subscribe_to_emails,
+                permission_expiry_30day_email_sent=not subscribe_to_emails,
+            )
+            if obj_perms_bulk_changed.has_listeners(model):
+                rows = list(model.objects.filter(pk__in=pks).values(*get_obj_perm_row_fields(model)))
+                obj_perms_bulk_changed.send(sender=model, action='update', rows=rows)
+            if len(pks) < batch_size:
+                break
+            last_pk = pks[-1]
+    return renewed
+
+
 def get_perms(user_or_group, obj):
     """
     Returns permissions for given user/group and object pair, as list of
@@ -283,7 +350,7 @@ def get_unattached_users_with_perms_qset(obj, perm,
     if user_model.objects.is_generic():
         user_filters = {
             '%s__content_type' % related_name: ctype,
-            '%s__object_pk' % related_name: obj.pk,
+            '%s__%s' % (related_name, get_object_pk_lookup(user_model, obj)): obj.pk,
         }
         if perm_id:
             user_filters.update({
@@ -309,7 +376,7 @@ def get_unattached_users_with_perms_qset(obj, perm,
         if group_model.objects.is_generic():
             group_filters = {
                 'groups__%s__content_type' % group_rel_name: ctype,
-                'groups__%s__object_pk' % group_rel_name: obj.pk,
+                'groups__%s__%s' % (group_rel_name, get_object_pk_lookup(group_model, obj)): obj.pk,
             }
             if perm_id:
                 group_filters.update({
@@ -329,9 +396,10 @@ def get_unattached_users_with_perms_qset(obj, perm,
         org_model = get_organization_obj_perms_model(obj)
         organization_rel_name = org_model.organization.field.related_query_name()
         if org_model.objects.is_generic():
+            object_pk_lookup = get_object_pk_lookup(org_model, obj)
             organization_filters = {
                 'organizations_organization__%s__content_type' % organization_rel_name: ctype,
-                'organizations_organization__%s__object_pk' % organization_rel_name: obj.pk,
+                'organizations_organization__%s__%s' % (organization_rel_name, object_pk_lookup): obj.pk,
             }
             if perm_id:
                 organization_filters.update({
@@ -419,6 +487,67 @@ def get_users_with_perms(obj, attach_perms=False, with_superusers=False,
             return users
 
 
+def get_users_with_perms_bulk(queryset, perms=None, with_group_users=True, with_superusers=False,
+                              permission_expiry=False, chunk_size=1000):
+    """
+    Returns dictionary mapping primary keys of all objects of ``queryset``
+    to sets of primary keys of users having *any* object permissions (or any
+    of ``perms`` codenames, if given) for them, directly or, if
+    ``with_group_users`` is ``True``, through groups and organizations.
+
+    Primary keys of ``queryset`` are streamed in chunks of ``chunk_size``
+    and grants of each chunk fetched with one query per grant source, group
+    and organization members being resolved in the same query.
+
+    :param with_superusers: Default: ``False``. If set to ``True`` all
+      superusers are included for every object.
+
+    :param permission_expiry: Default: ``False``. If set to ``True`` expired
+      permissions are ignored.
+
+    Example::
+
+        >>> from guardian.shortcuts import get_users_with_perms_bulk
+        >>> get_users_with_perms_bulk(Post.objects.filter(published=True), ['view_post'])
+        {1: {3, 7}, 2: set(), 5: {3}}
+    """
+    queryset = _get_queryset(queryset)
+    model = queryset.model
+    ctype = get_content_type(model)
+    User = get_user_model()
+    sources = [(get_user_obj_perms_model(model), 'user')]
+    if with_group_users:
+        sources += [(get_group_obj_perms_model(model), 'group__%s' % User.groups.field.related_query_name()),
+                    (get_organization_obj_perms_model(model), 'organization__users')]
+    superuser_ids = set()
+    if with_superusers:
+        superuser_ids = set(User.objects.filter(is_superuser=True).values_list('pk', flat=True))
+
+    users = {}
+    pks = queryset.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    for chunk in iter(lambda: list(islice(pks, chunk_size)), []):
+        for pk in chunk:
+            users[pk] = set(superuser_ids)
+        for obj_perms_model, user_lookup in sources:
+            if obj_perms_model.objects.is_generic():
+                field_pk = get_object_pk_lookup(obj_perms_model, model)
+                pk_values = chunk if field_pk != 'object_pk' else [force_str(pk) for pk in chunk]
+                filters = {'content_type': ctype, '%s__in' % field_pk: pk_values}
+            else:
+                field_pk = 'content_object_id'
+                filters = {'content_object_id__in': chunk}
+            filters['%s__isnull' % user_lookup] = False
+            obj_perms_queryset = obj_perms_model.objects.filter(**filters)
+            if perms is not None:
+                obj_perms_queryset = obj_perms_queryset.filter(permission__codename__in=perms)
+            if permission_expiry and obj_perms_model.objects.is_generic():
+                obj_perms_queryset = obj_perms_queryset.filter(
+                    Q(permission_expiry=None) | Q(permission_expiry__gte=timezone.now()))
+            for object_pk, user_id in obj_perms_queryset.values_list(field_pk, user_lookup).distinct():
+                users[model._meta.pk.to_python(object_pk)].add(user_id)
+    return users
+
+
 def get_users_with_permission(obj, perm, attach_perms=False, with_superusers=False,
                          with_group_users=True, permission_expiry=False, only_with_perms_in=None):
     qset = get_unattached_users_with_perms_qset(obj, perm,
@@ -485,7 +614,7 @@ def get_groups_with_perms(obj, attach_perms=False):
         if group_model.objects.is_generic():
             group_filters = {
                 '%s__content_type' % group_rel_name: ctype,
-                '%s__object_pk' % group_rel_name: obj.pk,
+                '%s__%s' % (group_rel_name, get_object_pk_lookup(group_model, obj)): obj.pk,
             }
         else:
             group_filters = {'%s__content_object' % group_rel_name: obj}
@@ -495,7 +624,7 @@ def get_groups_with_perms(obj, attach_perms=False):
         groups_with_perms = get_groups_with_perms(obj)
         qs = group_model.objects.filter(group__in=groups_with_perms).prefetch_related('group', 'permission')
         if group_model is GroupObjectPermission:
-            qs = qs.filter(object_pk=obj.pk, content_type=ctype)
+            qs = qs.filter(**{get_object_pk_lookup(group_model, obj): obj.pk, 'content_type': ctype})
         else:
             qs = qs.filter(content_object_id=obj.pk)
 
@@ -514,7 +643,7 @@ def get_organizations_with_perms(obj, attach_perms=False):
         if org_model.objects.is_generic():
             organization_filters = {
                 '%s__content_type' % organization_rel_name: ctype,
-                '%s__object_pk' % organization_rel_name: obj.pk,
+                '%s__%s' % (organization_rel_name, get_object_pk_lookup(org_model, obj)): obj.pk,
             }
         else:
             organization_filters = {'%s__content_object' % organization_rel_name: obj}
@@ -529,6 +658,140 @@ def get_organizations_with_perms(obj, attach_perms=False):
         return organizations
 
 
+def _get_queryset_ctype_and_codenames(perms, klass):
+    """
+    Returns queryset of ``klass`` objects (computed from ``perms`` if not
+    given), their content type and set of codenames of ``perms``.
+    """
+    if isinstance(perms, str):
+        perms = [perms]
+    ctype = None
+    app_label = None
+    codenames = set()
+
+    # Compute codenames set and ctype if possible
+    for perm in perms:
+        if '.' in perm:
+            new_app_label, codename = perm.split('.', 1)
+            if app_label is not None and app_label != new_app_label:
+                raise MixedContentTypeError("Given perms must have same app "
+                                            "label (%s != %s)" % (app_label, new_app_label))
+            else:
+                app_label = new_app_label
+        else:
+            codename = perm
+        codenames.add(codename)
+        if app_label is not None:
+            new_ctype = ContentType.objects.get(app_label=app_label,
+                                                permission__codename=codename)
+            if ctype is not None and ctype != new_ctype:
+                raise MixedContentTypeError("ContentType was once computed "
+                                            "to be %s and another one %s" % (ctype, new_ctype))
+            else:
+                ctype = new_ctype
+
+    # Compute queryset and ctype if still missing
+    if ctype is None and klass is not None:
+        queryset = _get_queryset(klass)
+        ctype = get_content_type(queryset.model)
+    elif ctype is not None and klass is None:
+        queryset = _get_queryset(ctype.model_class())
+    elif klass is None:
+        raise WrongAppError("Cannot determine content type")
+    else:
+        queryset = _get_queryset(klass)
+        if ctype.model_class() != queryset.model:
+            raise MixedContentTypeError("Content type for given perms and "
+                                        "klass differs")
+
+    return queryset, ctype, codenames
+
+
+def permission_matrix(users, objects, perms, any_perm=False, permission_expiry=True, as_numpy=False):
+    """
+    Returns which of ``users`` have *all* (or any, if ``any_perm`` is
+    ``True``) of ``perms`` granted for which of ``objects`` (all of the same
+    model), with one query per grant source.
+
+    The result is a list of integer bitmasks, one per user in the order of
+    ``users``, where bit ``j`` is set if the user has permissions for
+    ``objects[j]``, or, if ``as_numpy`` is ``True``, a NumPy boolean array of
+    shape ``(len(users), len(objects))``. As with
+    :meth:`ObjectPermissionChecker.has_perm`, inactive users have no
+    permissions, superusers have all of them and permissions are granted
+    directly or through organizations - unlike :func:`get_objects_for_user`,
+    group grants are ignored.
+
+    Example::
+
+        >>> from guardian.shortcuts import permission_matrix
+        >>> matrix = permission_matrix([joe, jane], posts, ['change_post'])
+        >>> bool(matrix[1] & (1 << 3))  # can jane change posts[3]?
+        True
+    """
+    if as_numpy and numpy is None:
+        raise ImportError("NumPy is required for as_numpy=True")
+    users = [get_anonymous_user() if user.is_anonymous else user for user in users]
+    objects = list(objects)
+    if isinstance(perms, str):
+        perms = [perms]
+    codenames = {perm.split('.', 1)[-1] for perm in perms}
+
+    cells = []
+    checked = [user.pk for user in users if user.is_active and not user.is_superuser]
+    if objects and checked:
+        pks, model, ctype = _get_pks_model_and_ctype(objects)
+        # The same grant sources as ObjectPermissionChecker.get_perms
+        if use_effective_obj_perms(model):
+            from guardian.models import EffectiveObjectPermission
+            effective_queryset = EffectiveObjectPermission.objects.filter(
+                source__in=get_effective_obj_perms_sources(group_grants=False))
+            sources = [(effective_queryset, 'user', 'object_pk', True)]
+        else:
+            sources = []
+            for obj_perms_model, user_lookup in ((get_user_obj_perms_model(model), 'user'),
+                                                 (get_organization_obj_perms_model(model), 'organization__users')):
+                if obj_perms_model.objects.is_generic():
+                    sources.append((obj_perms_model.objects.all(), user_lookup,
+                                    get_object_pk_lookup(obj_perms_model, model), True))
+                else:
+                    sources.append((obj_perms_model.objects.all(), user_lookup, 'content_object_id', False))
+        granted = defaultdict(lambda: defaultdict(set))
+        for obj_perms_queryset, user_lookup, field_pk, has_expiry in sources:
+            obj_perms_queryset = obj_perms_queryset.filter(**{
+                '%s__in' % user_lookup: checked,
+                '%s__in' % field_pk: pks,
+                'permission__content_type': ctype,
+                'permission__codename__in': codenames,
+            })
+            if permission_expiry and has_expiry:
+                obj_perms_queryset = obj_perms_queryset.filter(
+                    Q(permission_expiry=None) | Q(permission_expiry__gte=timezone.now()))
+            for user_id, object_pk, codename in obj_perms_queryset.values_list(user_lookup, field_pk,
+                                                                               'permission__codename'):
+                granted[user_id][force_str(object_pk)].add(codename)
+
+        columns = defaultdict(list)
+        for j, pk in enumerate(pks):
+            columns[pk].append(j)
+        for i, user in enumerate(users):
+            for pk, obj_codenames in granted.get(user.pk, {}).items():
+                if any_perm or codenames <= obj_codenames:
+                    cells += [(i, j) for j in columns[pk]]
+    cells += [(i, j) for i, user in enumerate(users) if user.is_active and user.is_superuser
+              for j in range(len(objects))]
+
+    if as_numpy:
+        matrix = numpy.zeros((len(users), len(objects)), dtype=bool)
+        for i, j in cells:
+            matrix[i, j] = True
+        return matrix
+    matrix = [0] * len(users)
+    for i, j in cells:
+        matrix[i] |= 1 << j
+    return matrix
+
+
 def get_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=False,
                          with_superuser=True, accept_global_perms=True):
     """
@@ -630,46 +893,7 @@ def get_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=Fals
         - If accept_global_perms is ``True``: Empty list.
         - If accept_global_perms is ``False``: Empty list.
     """
-    if isinstance(perms, str):
-        perms = [perms]
-    ctype = None
-    app_label = None
-    codenames = set()
-
-    # Compute codenames set and ctype if possible
-    for perm in perms:
-        if '.' in perm:
-            new_app_label, codename = perm.split('.', 1)
-            if app_label is not None and app_label != new_app_label:
-                raise MixedContentTypeError("Given perms must have same app "
-                                            "label (%s != %s)" % (app_label, new_app_label))
-            else:
-                app_label = new_app_label
-        else:
-            codename = perm
-        codenames.add(codename)
-        if app_label is not None:
-            new_ctype = ContentType.objects.get(app_label=app_label,
-                                                permission__codename=codename)
-            if ctype is not None and ctype != new_ctype:
-                raise MixedContentTypeError("ContentType was once computed "
-                                            "to be %s and another one %s" % (ctype, new_ctype))
-            else:
-                ctype = new_ctype
-
-    # Compute queryset and ctype if still missing
-    if ctype is None and klass is not None:
-        queryset = _get_queryset(klass)
-        ctype = get_content_type(queryset.model)
-    elif ctype is not None and klass is None:
-        queryset = _get_queryset(ctype.model_class())
-    elif klass is None:
-        raise WrongAppError("Cannot determine content type")
-    else:
-        queryset = _get_queryset(klass)
-        if ctype.model_class() != queryset.model:
-            raise MixedContentTypeError("Content type for given perms and "
-                                        "klass differs")
+    queryset, ctype, codenames = _get_queryset_ctype_and_codenames(perms, klass)
 
     # At this point, we should have both ctype and queryset and they should
     # match which means: ctype.model_class() == queryset.model
@@ -711,6 +935,23 @@ def get_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=Fals
         elif len(global_perms) > 0 and (len(codenames) > 0):
             has_global_perms = True
 
+    snapshot = codenames and not has_global_perms and use_anonymous_perms_snapshot(user, queryset.model)
+    if snapshot:
+        identity_fields = ('user', 'group', 'organization') if use_groups else ('user',)
+        object_pks = snapshot.get_object_pks(ctype.id, codenames, any_perm, identity_fields)
+        if _fits_pks_in(queryset, len(object_pks)):
+            return queryset.filter(pk__in=object_pks)
+        return _filter_by_grants(queryset, user, ctype, codenames, any_perm, use_groups)
+
+    if use_groups and use_effective_obj_perms(queryset.model):
+        return queryset.filter(pk__in=_get_effective_obj_pk_values(user, ctype, codenames, any_perm, queryset))
+
+    if codenames and not has_global_perms and use_objects_cache(queryset.model):
+        object_pks = get_cached_object_pks(user, ctype, codenames, any_perm, use_groups)
+        if _fits_pks_in(queryset, len(object_pks)):
+            return queryset.filter(pk__in=list(object_pks))
+        return _filter_by_grants(queryset, user, ctype, codenames, any_perm, use_groups)
+
     # Now we should extract list of pk values for which we would filter
     # queryset
     user_model = get_user_obj_perms_model(queryset.model)
@@ -736,15 +977,21 @@ def get_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=Fals
 
     if use_groups:
         group_model = get_group_obj_perms_model(queryset.model)
-        group_filters = {
-            'permission__content_type': ctype,
-            'group__%s' % get_user_model().groups.field.related_query_name(): user,
-        }
-        if len(codenames):
-            group_filters.update({
-                'permission__codename__in': codenames,
-            })
-        groups_obj_perms_queryset = group_model.objects.filter(**group_filters)
+        # Sources the user is not member of or with no grants for ``ctype``
+        # at all are kept out of SQL
+        has_group_perms = obj_perms_exist(group_model, ctype) and bool(get_user_group_ids(user))
+        if has_group_perms:
+            group_filters = {
+                'permission__content_type': ctype,
+                'group__in': get_user_group_ids(user),
+            }
+            if len(codenames):
+                group_filters.update({
+                    'permission__codename__in': codenames,
+                })
+            groups_obj_perms_queryset = group_model.objects.filter(**group_filters)
+        else:
+            groups_obj_perms_queryset = group_model.objects.none()
         if group_model.objects.is_generic():
             group_fields = generic_fields
         else:
@@ -752,30 +999,27 @@ def get_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=Fals
 
         # Orgs
         organization_model = get_organization_obj_perms_model(queryset.model)
-        organization_filters = {
-            'permission__content_type': ctype,
-            'permission__codename__in': codenames,
-            'organization__users': user,
-        }
-        organizations_obj_perms_queryset = organization_model.objects.filter(**organization_filters)
+        has_organization_perms = (obj_perms_exist(organization_model, ctype) and
+                                  bool(get_user_organization_ids(user)))
+        if has_organization_perms:
+            organization_filters = {
+                'permission__content_type': ctype,
+                'permission__codename__in': codenames,
+                'organization__in': get_user_organization_ids(user),
+            }
+            organizations_obj_perms_queryset = organization_model.objects.filter(**organization_filters)
+        else:
+            organizations_obj_perms_queryset = organization_model.objects.none()
         if organization_model.objects.is_generic():
             organization_fields = generic_fields
         else:
             organization_fields = direct_fields
 
         if not any_perm and len(codenames) and not has_global_perms:
-            user_obj_perms = user_obj_perms_queryset.values_list(*user_fields)
-            groups_obj_perms = groups_obj_perms_queryset.values_list(*group_fields)
-            organizations_obj_perms = organizations_obj_perms_queryset.values_list(*organization_fields)
-            data = list(user_obj_perms) + list(groups_obj_perms) + list(organizations_obj_perms)
-            # sorting/grouping by pk (first in result tuple)
-            keyfunc = lambda t: t[0]
-            data = sorted(data, key=keyfunc)
-            pk_list = []
-            for pk, group in groupby(data, keyfunc):
-                obj_codenames = set((e[1] for e in group))
-                if codenames.issubset(obj_codenames):
-                    pk_list.append(pk)
+            rows = chain(user_obj_perms_queryset.values_list(user_fields[0], 'permission_id'),
+                         groups_obj_perms_queryset.values_list(group_fields[0], 'permission_id'),
+                         organizations_obj_perms_queryset.values_list(organization_fields[0], 'permission_id'))
+            pk_list = _match_obj_perm_pks(rows, len(codenames), integer_pks=is_integer_pk_model(queryset.model))
             objects = queryset.filter(pk__in=pk_list)
             return objects
 
@@ -785,40 +1029,229 @@ def get_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=Fals
         user_obj_perms_queryset = counts.filter(
             object_pk_count__gte=len(codenames))
 
-    is_cast_integer = _is_cast_integer_pk(queryset)
+    q = Q(pk__in=_get_obj_pk_values(user_obj_perms_queryset, user_fields[0], queryset))
+    if use_groups and has_group_perms:
+        q |= Q(pk__in=_get_obj_pk_values(groups_obj_perms_queryset, group_fields[0], queryset))
+    if use_groups and has_organization_perms:
+        q |= Q(pk__in=_get_obj_pk_values(organizations_obj_perms_queryset, organization_fields[0], queryset))
 
-    field_pk = user_fields[0]
-    values = user_obj_perms_queryset
-    if is_cast_integer:
-        values = values.annotate(
-            obj_pk=Cast(field_pk, BigIntegerField())
-        )
-        field_pk = 'obj_pk'
+    return queryset.filter(q)
 
-    values = values.values_list(field_pk, flat=True)
-    q = Q(pk__in=values)
-    if use_groups:
-        field_pk = group_fields[0]
-        values = groups_obj_perms_queryset
-        if is_cast_integer:
-            values = values.annotate(
-                obj_pk=Cast(field_pk, BigIntegerField())
-            )
-            field_pk = 'obj_pk'
-        values = values.values_list(field_pk, flat=True)
-        q |= Q(pk__in=values)
-
-        field_pk = organization_fields[0]
-        values = organizations_obj_perms_queryset
-        if is_cast_integer:
-            values = values.annotate(
-                obj_pk=Cast(field_pk, BigIntegerField())
-            )
-            field_pk = 'obj_pk'
-        values = values.values_list(field_pk, flat=True)
-        q |= Q(pk__in=values)
 
-    return queryset.filter(q)
+def filter_pks_for_user(user, perms, pks, klass=None, use_groups=True, any_perm=False,
+                        with_superuser=True, accept_global_perms=True):
+    """
+    Returns list of those primary keys from ``pks`` (i.e. coming from an
+    external search index) of objects for which ``user`` has *all* (or any,
+    if ``any_perm`` is ``True``) permissions present at ``perms``, in the
+    order of ``pks``. Objects are not fetched; permissions are matched in
+    Python from grants of the objects, vectorized with NumPy if installed.
+
+    Parameters have the same meaning as for :func:`get_objects_for_user`.
+
+    Example::
+
+        >>> from guardian.shortcuts import filter_pks_for_user
+        >>> filter_pks_for_user(joe, ['testapp.change_post'], search_result_pks)
+        [12, 7]
+    """
+    queryset, ctype, codenames = _get_queryset_ctype_and_codenames(perms, klass)
+    model = queryset.model
+    pks = [model._meta.pk.to_python(pk) for pk in pks]
+    return _filter_pks_for_user(user, model, ctype, codenames, pks, use_groups, any_perm,
+                                with_superuser, accept_global_perms)
+
+
+def _filter_pks_for_user(user, model, ctype, codenames, pks, use_groups, any_perm,
+                         with_superuser, accept_global_perms):
+    if with_superuser and user.is_superuser:
+        return pks
+    if user.is_anonymous:
+        user = get_anonymous_user()
+
+    if accept_global_perms and with_superuser:
+        global_perms = {code for code in codenames if user.has_perm(ctype.app_label + '.' + code)}
+        codenames = codenames - global_perms
+        if global_perms and (not codenames or any_perm):
+            return pks
+    if not codenames:
+        return []
+
+    rows = chain.from_iterable(
+        obj_perms_queryset.filter(**{'%s__in' % field_pk: [force_str(pk) for pk in chunk]})
+                          .values_list(field_pk, 'permission_id')
+        for obj_perms_queryset, field_pk in _get_obj_perms_querysets(user, model, ctype, codenames, use_groups)
+        for chunk in (pks[i:i + 500] for i in range(0, len(pks), 500)))
+    matched = {model._meta.pk.to_python(pk) for pk in
+               _match_obj_perm_pks(rows, len(codenames), any_perm, is_integer_pk_model(model))}
+    return [pk for pk in pks if pk in matched]
+
+
+def iter_objects_for_user(user, perms, klass=None, chunk_size=1000, pks_only=False, use_groups=True,
+                          any_perm=False, with_superuser=True, accept_global_perms=True):
+    """
+    Yields objects (or only their primary keys, if ``pks_only`` is ``True``)
+    for which ``user`` has *all* (or any, if ``any_perm`` is ``True``)
+    permissions present at ``perms``, ordered by primary key.
+
+    Objects are fetched in chunks of ``chunk_size``, each selected by
+    ``pk > <last pk of previous chunk>`` together with the grants subquery,
+    so memory use and time per chunk stay the same throughout long exports
+    (unlike slicing a queryset, which uses ``OFFSET``). If more than one
+    permission is required, objects with any of them are selected and grants
+    of the chunk then checked as by :func:`filter_pks_for_user`.
+
+    Other parameters have the same meaning as for
+    :func:`get_objects_for_user`.
+
+    Example::
+
+        >>> from guardian.shortcuts import iter_objects_for_user
+        >>> for post in iter_objects_for_user(joe, 'testapp.view_post', chunk_size=500):
+        ...     export(post)
+    """
+    queryset, ctype, codenames = _get_queryset_ctype_and_codenames(perms, klass)
+    if user.is_anonymous:
+        user = get_anonymous_user()
+    object_pks = _get_cached_candidate_pks(user, queryset, ctype, codenames, use_groups, any_perm,
+                                           with_superuser, accept_global_perms)
+    if object_pks is not None:
+        # Only primary keys of each chunk are sent to the database
+        object_pks = list(object_pks)
+        for start in range(0, len(object_pks), chunk_size):
+            chunk_queryset = queryset.filter(pk__in=object_pks[start:start + chunk_size]).order_by('pk')
+            yield from (chunk_queryset.values_list('pk', flat=True) if pks_only else chunk_queryset)
+        return
+
+    match_all = not any_perm and len(codenames) > 1
+    candidates = get_objects_for_user(user, perms, queryset, use_groups=use_groups, any_perm=True,
+                                      with_superuser=with_superuser,
+                                      accept_global_perms=accept_global_perms).order_by('pk')
+    if pks_only:
+        candidates = candidates.values_list('pk', flat=True)
+
+    last_pk = None
+    while True:
+        chunk_queryset = candidates if last_pk is None else candidates.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        chunk_pks = chunk if pks_only else [obj.pk for obj in chunk]
+        last_pk = chunk_pks[-1]
+        if match_all:
+            permitted = set(_filter_pks_for_user(user, queryset.model, ctype, codenames, chunk_pks, use_groups,
+                                                 any_perm, with_superuser, accept_global_perms))
+            chunk = [item for item, pk in zip(chunk, chunk_pks) if pk in permitted]
+        yield from chunk
+        if len(chunk_pks) < chunk_size:
+            return
+
+
+def _get_cached_candidate_pks(user, queryset, ctype, codenames, use_groups, any_perm, with_superuser,
+                              accept_global_perms):
+    """
+    Returns sorted primary keys of objects :func:`get_objects_for_user` would
+    filter ``queryset`` by, if they are served from
+    :func:`guardian.cache.get_cached_object_pks`, ``None`` otherwise.
+    """
+    if not codenames or not use_objects_cache(queryset.model) or (with_superuser and user.is_superuser):
+        return None
+    if use_groups and use_effective_obj_perms(queryset.model):
+        return None
+    if (accept_global_perms and with_superuser and
+            any(user.has_perm(ctype.app_label + '.' + code) for code in codenames)):
+        return None
+    return get_cached_object_pks(user, ctype, codenames, any_perm, use_groups)
+
+
+# Longer lists of primary keys take the database longer to parse and plan
+# than the grants subqueries they stand in for
+MAX_PKS_IN = 10000
+
+
+def _fits_pks_in(queryset, count):
+    """
+    Returns ``True`` if ``queryset`` may be filtered by ``count`` primary keys
+    with ``pk__in`` - at most :data:`MAX_PKS_IN` of them, without exceeding
+    the number of query parameters its database accepts.
+    """
+    max_query_params = connections[queryset.db].features.max_query_params
+    if max_query_params is None or max_query_params > MAX_PKS_IN:
+        max_query_params = MAX_PKS_IN
+    try:
+        # Parameters of the queryset's own filters count against the limit
+        count += len(queryset.query.sql_with_params()[1])
+    except EmptyResultSet:
+        pass
+    return count <= max_query_params
+
+
+def count_objects_for_user(user, perms, klass=None, use_groups=True, any_perm=False,
+                           with_superuser=True, accept_global_perms=True, approximate=False):
+    """
+    Returns number of objects :func:`get_objects_for_user` would return for
+    the same parameters, computed in SQL without fetching grants or primary
+    keys.
+
+    Grant tables alone are counted, without joining the objects table, if
+    ``klass`` is not a filtered queryset and object permissions of its model
+    are known to point at existing objects (they are direct foreign key
+    models or the model is registered for cleanup, see
+    :setting:`GUARDIAN_CASCADE_DELETE_MODELS`). Global permissions are taken
+    into account the same way as by :func:`filter_pks_for_user`.
+
+    :param approximate: if ``True``, returns an upper bound computed by
+      counting objects granted through each source (user, groups,
+      organizations) separately, which avoids merging the sources.
+
+    Example::
+
+        >>> from guardian.shortcuts import count_objects_for_user
+        >>> count_objects_for_user(joe, 'testapp.change_post')
+        1204
+    """
+    queryset, ctype, codenames = _get_queryset_ctype_and_codenames(perms, klass)
+    if with_superuser and user.is_superuser:
+        return queryset.count()
+    if user.is_anonymous:
+        user = get_anonymous_user()
+
+    if accept_global_perms and with_superuser:
+        global_perms = {code for code in codenames if user.has_perm(ctype.app_label + '.' + code)}
+        codenames = codenames - global_perms
+        if global_perms and (not codenames or any_perm):
+            return queryset.count()
+    if not codenames:
+        return get_objects_for_user(user, perms, queryset, use_groups=use_groups, any_perm=any_perm,
+                                    with_superuser=with_superuser, accept_global_perms=accept_global_perms).count()
+
+    obj_perms_querysets = _get_obj_perms_querysets(user, queryset.model, ctype, codenames, use_groups)
+    return _count_objects(queryset, obj_perms_querysets, codenames, any_perm, approximate)
+
+
+def count_objects_for_group(group, perms, klass=None, any_perm=False, accept_global_perms=True,
+                            approximate=False):
+    """
+    Returns number of objects :func:`get_objects_for_group` would return for
+    the same parameters, computed in SQL the same way as by
+    :func:`count_objects_for_user`.
+    """
+    queryset, ctype, codenames = _get_queryset_ctype_and_codenames(perms, klass)
+    if accept_global_perms:
+        global_perms = set(group.permissions.filter(content_type=ctype, codename__in=codenames)
+                           .values_list('codename', flat=True))
+        codenames = codenames - global_perms
+        if global_perms and (not codenames or any_perm):
+            return queryset.count()
+    if not codenames:
+        return get_objects_for_group(group, perms, queryset, any_perm=any_perm,
+                                     accept_global_perms=accept_global_perms).count()
+
+    group_model = get_group_obj_perms_model(queryset.model)
+    field_pk = 'object_pk' if group_model.objects.is_generic() else 'content_object_id'
+    obj_perms_queryset = group_model.objects.filter(group=group, permission__content_type=ctype,
+                                                    permission__codename__in=codenames)
+    return _count_objects(queryset, [(obj_perms_queryset, field_pk)], codenames, any_perm, approximate)
 
 
 def get_objects_for_group(group, perms, klass=None, any_perm=False, accept_global_perms=True):
@@ -948,32 +1381,12 @@ def get_objects_for_group(group, perms, klass=None, any_perm=False, accept_globa
     else:
         fields = ['content_object__pk', 'permission__codename']
     if not any_perm and len(codenames):
-        groups_obj_perms = groups_obj_perms_queryset.values_list(*fields)
-        data = list(groups_obj_perms)
-
-        keyfunc = lambda t: t[0]  # sorting/grouping by pk (first in result tuple)
-        data = sorted(data, key=keyfunc)
-        pk_list = []
-        for pk, group in groupby(data, keyfunc):
-            obj_codenames = set((e[1] for e in group))
-            if any_perm or codenames.issubset(obj_codenames):
-                pk_list.append(pk)
+        rows = groups_obj_perms_queryset.values_list(fields[0], 'permission_id')
+        pk_list = _match_obj_perm_pks(rows, len(codenames), integer_pks=is_integer_pk_model(queryset.model))
         objects = queryset.filter(pk__in=pk_list)
         return objects
 
-    is_cast_integer = _is_cast_integer_pk(queryset)
-
-    field_pk = fields[0]
-    values = groups_obj_perms_queryset
-
-    if is_cast_integer:
-        values = values.annotate(
-            obj_pk=Cast(field_pk, BigIntegerField())
-        )
-        field_pk = 'obj_pk'
-
-    values = values.values_list(field_pk, flat=True)
-    return queryset.filter(pk__in=values)
+    return queryset.filter(pk__in=_get_obj_pk_values(groups_obj_perms_queryset, fields[0], queryset))
 
 
 def get_objects_for_organization(organization, perms, klass=None, any_perm=False, accept_global_perms=True):
@@ -1036,32 +1449,192 @@ def get_objects_for_organization(organization, perms, klass=None, any_perm=False
         fields = ['content_object__pk', 'permission__codename']
 
     if not any_perm and len(codenames):
-        organizations_obj_perms = organizations_obj_perms_queryset.values_list(*fields)
-        data = list(organizations_obj_perms)
-
-        keyfunc = lambda t: t[0]  # sorting/organizationing by pk (first in result tuple)
-        data = sorted(data, key=keyfunc)
-        pk_list = []
-        for pk, organization in groupby(data, keyfunc):
-            obj_codenames = set((e[1] for e in organization))
-            if any_perm or codenames.issubset(obj_codenames):
-                pk_list.append(pk)
+        rows = organizations_obj_perms_queryset.values_list(fields[0], 'permission_id')
+        pk_list = _match_obj_perm_pks(rows, len(codenames), integer_pks=is_integer_pk_model(queryset.model))
         objects = queryset.filter(pk__in=pk_list)
         return objects
 
-    values = organizations_obj_perms_queryset.values_list(fields[0], flat=True)
-    if organization_model.objects.is_generic():
-        values = list(values)
-    return queryset.filter(pk__in=values)
+    return queryset.filter(pk__in=_get_obj_pk_values(organizations_obj_perms_queryset, fields[0], queryset))
+
+
+def _get_obj_perms_querysets(user, model, ctype, codenames, use_groups=True, permission_expiry=False,
+                             group_grants=True):
+    """
+    Returns ``(queryset, field_pk)`` pairs of grants of ``codenames`` for
+    ``model`` objects to ``user`` and, if ``use_groups`` is ``True``, to their
+    groups (unless ``group_grants`` is ``False``, as with
+    :meth:`ObjectPermissionChecker.has_perm`) and organizations, skipping
+    sources without any grants. Expired grants are left out if
+    ``permission_expiry`` is ``True``.
+    """
+    user_model = get_user_obj_perms_model(model)
+    sources = [(user_model, {'user': user})]
+    if use_groups:
+        group_model = get_group_obj_perms_model(model)
+        if group_grants and obj_perms_exist(group_model, ctype) and get_user_group_ids(user):
+            sources.append((group_model, {'group__in': get_user_group_ids(user)}))
+        organization_model = get_organization_obj_perms_model(model)
+        if obj_perms_exist(organization_model, ctype) and get_user_organization_ids(user):
+            sources.append((organization_model, {'organization__in': get_user_organization_ids(user)}))
+
+    querysets = []
+    for obj_perms_model, filters in sources:
+        filters['permission__content_type'] = ctype
+        filters['permission__codename__in'] = codenames
+        field_pk = 'object_pk' if obj_perms_model.objects.is_generic() else 'content_object_id'
+        obj_perms_queryset = obj_perms_model.objects.filter(**filters)
+        if permission_expiry and obj_perms_model.objects.is_generic():
+            obj_perms_queryset = obj_perms_queryset.filter(
+                Q(permission_expiry=None) | Q(permission_expiry__gte=timezone.now()))
+        querysets.append((obj_perms_queryset, field_pk))
+    return querysets
+
+
+def _filter_by_grants(queryset, user, ctype, codenames, any_perm=False, use_groups=True, permission_expiry=False,
+                      group_grants=True):
+    """
+    Filters ``queryset`` by subqueries of grants of all (or any, if
+    ``any_perm`` is ``True``) of ``codenames`` to ``user`` (see
+    :func:`_get_obj_perms_querysets`), without fetching any primary keys.
+    """
+    for required in ([codenames] if any_perm else [[codename] for codename in codenames]):
+        q = Q()
+        for obj_perms_queryset, field_pk in _get_obj_perms_querysets(user, queryset.model, ctype, required,
+                                                                    use_groups, permission_expiry, group_grants):
+            q |= Q(pk__in=_get_obj_pk_values(obj_perms_queryset, field_pk, queryset))
+        queryset = queryset.filter(q)
+    return queryset
+
+
+def _count_objects(queryset, obj_perms_querysets, codenames, any_perm, approximate):
+    """
+    Counts objects of ``queryset`` granted by ``(queryset, field_pk)`` pairs
+    of grants of ``codenames``.
+    """
+    any_perm = any_perm or len(codenames) == 1
+    if approximate:
+        def count_granted(required):
+            return sum(obj_perms_queryset.filter(permission__codename__in=required)
+                       .aggregate(count=Count(field_pk, distinct=True))['count']
+                       for obj_perms_queryset, field_pk in obj_perms_querysets)
+        if any_perm:
+            return count_granted(codenames)
+        return min(count_granted([codename]) for codename in codenames)
+
+    models = [obj_perms_queryset.model for obj_perms_queryset, _ in obj_perms_querysets]
+    if all(model.objects.is_generic() for model in models):
+        grants_only = is_obj_perms_cleanup_registered(queryset.model)
+    else:
+        grants_only = not any(model.objects.is_generic() for model in models)
+    if grants_only and not queryset.query.where:
+        return _count_grants(obj_perms_querysets, len(codenames), any_perm)
+
+    if any_perm:
+        groups_of_codenames = [codenames]
+    else:
+        groups_of_codenames = [[codename] for codename in codenames]
+    for required in groups_of_codenames:
+        q = Q(pk__in=[])
+        for obj_perms_queryset, field_pk in obj_perms_querysets:
+            values = _get_obj_pk_values(obj_perms_queryset.filter(permission__codename__in=required),
+                                        field_pk, queryset)
+            q |= Q(pk__in=values)
+        queryset = queryset.filter(q)
+    return queryset.count()
+
+
+def _count_grants(obj_perms_querysets, perms_count, any_perm):
+    # Counts distinct objects of grants merged by UNION, which also drops
+    # duplicate (object, permission) pairs granted through several sources
+    field_pk = obj_perms_querysets[0][1]
+    grants = [obj_perms_queryset.values_list(field_pk, 'permission_id')
+              for obj_perms_queryset, field_pk in obj_perms_querysets]
+    grants = grants[0].union(*grants[1:]) if len(grants) > 1 else grants[0]
+    sql, params = grants.query.get_compiler(using=grants.db).as_sql()
+    connection = connections[grants.db]
+    column = connection.ops.quote_name(field_pk)
+    if any_perm:
+        sql = 'SELECT COUNT(DISTINCT %s) FROM (%s) grants' % (column, sql)
+    else:
+        sql = ('SELECT COUNT(*) FROM (SELECT %s FROM (%s) grants GROUP BY %s HAVING COUNT(*) = %%s) objects'
+               % (column, sql, column))
+        params = tuple(params) + (perms_count,)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def _match_obj_perm_pks(rows, perms_count, any_perm=False, integer_pks=False):
+    """
+    Returns object primary keys of ``(object_pk, permission_id)`` ``rows`` of
+    grants of ``perms_count`` checked permissions, for which all (or any, if
+    ``any_perm`` is ``True``) of the permissions are granted.
+
+    Permissions of each object are OR-ed into a bitmask; with NumPy installed
+    and integer ``integer_pks`` this is done by a single ``reduceat`` over
+    arrays of rows sorted by object.
+    """
+    if numpy is not None and integer_pks and perms_count < 63:
+        rows = list(rows)
+        if not rows:
+            return []
+        pks = numpy.fromiter((int(row[0]) for row in rows), numpy.int64, len(rows))
+        perm_ids, perm_indexes = numpy.unique(numpy.fromiter((row[1] for row in rows), numpy.int64, len(rows)),
+                                              return_inverse=True)
+        if not any_perm and len(perm_ids) < perms_count:
+            return []
+        order = numpy.argsort(pks, kind='stable')
+        pks = pks[order]
+        bits = numpy.left_shift(1, perm_indexes.astype(numpy.int64))[order]
+        unique_pks, starts = numpy.unique(pks, return_index=True)
+        if any_perm:
+            return unique_pks.tolist()
+        masks = numpy.bitwise_or.reduceat(bits, starts)
+        return unique_pks[masks == (1 << perms_count) - 1].tolist()
+
+    bits = {}
+    masks = defaultdict(int)
+    for pk, perm_id in rows:
+        masks[pk] |= bits.setdefault(perm_id, 1 << len(bits))
+    if any_perm:
+        return list(masks)
+    if len(bits) < perms_count:
+        return []
+    full_mask = (1 << perms_count) - 1
+    return [pk for pk, mask in masks.items() if mask == full_mask]
 
 
 def _is_cast_integer_pk(queryset):
-    pk = queryset.model._meta.pk
+    return is_integer_pk_model(queryset.model)
 
-    if isinstance(pk, ForeignKey):
-        return _is_cast_integer_pk(pk.target_field)
 
-    return isinstance(pk, (
-        IntegerField, AutoField, BigIntegerField,
-        PositiveIntegerField, PositiveSmallIntegerField,
-        SmallIntegerField))
+def _get_effective_obj_pk_values(user, ctype, codenames, any_perm, queryset):
+    from guardian.models import EffectiveObjectPermission
+
+    effective_queryset = EffectiveObjectPermission.objects.filter(user=user, content_type=ctype)
+    if len(codenames):
+        effective_queryset = effective_queryset.filter(permission__codename__in=codenames)
+        if not any_perm and len(codenames) > 1:
+            effective_queryset = (effective_queryset
+                                  .values('object_pk')
+                                  .annotate(object_pk_count=Count('permission', distinct=True))
+                                  .filter(object_pk_count__gte=len(codenames)))
+    return _get_obj_pk_values(effective_queryset, 'object_pk', queryset)
+
+
+def _get_obj_pk_values(obj_perms_queryset, field_pk, queryset):
+    """
+    Returns ``obj_perms_queryset`` values of ``field_pk`` comparable with
+    primary keys of ``queryset`` objects in SQL - native typed
+    ``object_pk_int``/``object_pk_uuid`` columns if enabled by
+    :setting:`GUARDIAN_NATIVE_OBJECT_PK`, ``object_pk`` cast to integer
+    otherwise.
+    """
+    if field_pk == 'object_pk':
+        native_field = get_object_pk_lookup(obj_perms_queryset.model, queryset.model)
+        if native_field != 'object_pk':
+            return obj_perms_queryset.values_list(native_field, flat=True)
+    if _is_cast_integer_pk(queryset):
+        obj_perms_queryset = obj_perms_queryset.annotate(obj_pk=Cast(field_pk, BigIntegerField()))
+        field_pk = 'obj_pk'
+    return obj_perms_queryset.values_list(field_pk, flat=True)
@@ -0,0 +1,14 @@
+"""
+Signals sent by django-guardian.
+"""
+from django.dispatch import Signal
+
+#: Sent after object permissions were created, updated or deleted in bulk,
+#: that is without ``post_save``/``post_delete`` being sent for each of them.
+#: ``sender`` is the object permission model, ``action`` is one of
+#: ``"create"``, ``"update"`` or ``"delete"`` and ``rows`` is a list of
+#: dictionaries with values of affected grants (as returned by
+#: :func:`guardian.utils.get_obj_perm_row_fields`; ``pk`` of created grants is
+#: ``None`` on backends not returning it from bulk inserts). Guardian's own
+#: caches are invalidated by receivers of this signal.
+obj_perms_bulk_changed = Signal()
@@ -26,11 +26,12 @@ except ImportError:
 
 class ObjectPermissionsNode(template.Node):
 
-    def __init__(self, for_whom, obj, include_group_permissions, context_var):
+    def __init__(self, for_whom, obj, include_group_permissions, context_var, checker=None):
         self.for_whom = template.Variable(for_whom)
         self.obj = template.Variable(obj)
         self.include_group_permissions = include_group_permissions
         self.context_var = context_var
+        self.checker = template.Variable(checker) if checker else None
 
     def render(self, context):
         for_whom = self.for_whom.resolve(context)
@@ -53,7 +54,9 @@ class ObjectPermissionsNode(template.Node):
         if not obj:
             return ''
 
-        check = ObjectPermissionChecker(for_whom)
+        check = self.checker.resolve(context) if self.checker else None
+        if check is None:
+            check = ObjectPermissionChecker(for_whom)
         perms = check.get_perms(obj, include_group_perms=self.include_group_permissions)
 
         context[self.context_var] = perms
@@ -92,21 +95,29 @@ def get_obj_perms(parser, token):
     As of v1.2, passing ``None`` as ``obj`` for this template tag won't rise
     obfuscated exception and would return empty permissions set instead.
 
+    Optionally, an :class:`guardian.core.ObjectPermissionChecker` for the same
+    ``user``/``group`` (or ``None``) may be given as the last argument, in
+    which case permissions are taken from it - that is from its cache, if they
+    were prefetched (see ``PermissionListMixin.prefetch_object_permissions``)::
+
+        {% get_obj_perms request.user for flatpage as "flatpage_perms" perms_checker %}
+
     """
     bits = token.split_contents()
-    format = '{% get_obj_perms user/group for obj as "context_var" %}'
-    if len(bits) != 6 or bits[2] != 'for' or bits[4] != 'as':
+    format = '{% get_obj_perms user/group for obj as "context_var" [checker] %}'
+    if len(bits) not in (6, 7) or bits[2] != 'for' or bits[4] != 'as':
         raise template.TemplateSyntaxError("get_obj_perms tag should be in "
                                            "format: %s" % format)
 
     for_whom = bits[1]
     obj = bits[3]
     context_var = bits[5]
+    checker = bits[6] if len(bits) == 7 else None
     if context_var[0] != context_var[-1] or context_var[0] not in ('"', "'"):
         raise template.TemplateSyntaxError("get_obj_perms tag's context_var "
                                            "argument should be in quotes")
     context_var = context_var[1:-1]
-    return ObjectPermissionsNode(for_whom, obj, True, context_var)
+    return ObjectPermissionsNode(for_whom, obj, True, context_var, checker)
 
 
 @register.tag
@@ -143,16 +154,17 @@ def get_obj_local_perms(parser, token):
 
     """
     bits = token.split_contents()
-    format = '{% get_obj_perms user/group for obj as "context_var" %}'
-    if len(bits) != 6 or bits[2] != 'for' or bits[4] != 'as':
+    format = '{% get_obj_perms user/group for obj as "context_var" [checker] %}'
+    if len(bits) not in (6, 7) or bits[2] != 'for' or bits[4] != 'as':
         raise template.TemplateSyntaxError("get_obj_perms tag should be in "
                                            "format: %s" % format)
 
     for_whom = bits[1]
     obj = bits[3]
     context_var = bits[5]
+    checker = bits[6] if len(bits) == 7 else None
     if context_var[0] != context_var[-1] or context_var[0] not in ('"', "'"):
         raise template.TemplateSyntaxError("get_obj_perms tag's context_var "
                                            "argument should be in quotes")
     context_var = context_var[1:-1]
-    return ObjectPermissionsNode(for_whom, obj, False, context_var)
+    return ObjectPermissionsNode(for_whom, obj, False, context_var, checker)
@@ -0,0 +1,20 @@
+# Generated by Django 3.0.14 on 2026-10-18 17:03
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0004_childtestmodel_parenttestmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UUIDPKModel',
+            fields=[
+                ('uuid_pk', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
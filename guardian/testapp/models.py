@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime
 
 from django.db import models
@@ -47,6 +48,24 @@ class Project(models.Model):
 Project.not_a_relation_descriptor = DynamicAccessor()
 
 
+class DocumentUserObjectPermission(UserObjectPermissionBase):
+    content_object = models.ForeignKey('Document', on_delete=models.CASCADE)
+    permission_expiry = models.DateTimeField(null=True, blank=True, db_index=True)
+    permission_expiry_30day_email_sent = models.BooleanField(default=False, blank=True)
+    permission_expiry_0day_email_sent = models.BooleanField(default=False, blank=True)
+
+
+class Document(models.Model):
+    """
+    Model for tests of direct user object permissions model with expiry
+    fields.
+    """
+    name = models.CharField(max_length=128, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class MixedGroupObjectPermission(GroupObjectPermissionBase):
     content_object = models.ForeignKey('Mixed', on_delete=models.CASCADE)
 
@@ -91,6 +110,14 @@ class NonIntPKModel(models.Model):
     char_pk = models.CharField(primary_key=True, max_length=128)
 
 
+class UUIDPKModel(models.Model):
+    """
+    Model for testing whether get_objects_for_user will work when the objects to
+    be returned have UUID primary keys.
+    """
+    uuid_pk = models.UUIDField(primary_key=True, default=uuid.uuid4)
+
+
 class CustomUser(AbstractUser, GuardianUserMixin):
     custom_id = models.AutoField(primary_key=True)
 
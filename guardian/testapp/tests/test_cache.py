@@ -0,0 +1,509 @@
+import pickle
+
+import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from organizations.models import Organization, OrganizationUser
+
+from guardian import cache as guardian_cache
+from guardian.backends import ObjectPermissionBackend
+from guardian.cache import BloomFilter, ObjectIdSet, get_anonymous_perms_snapshot, get_cache, \
+    get_cached_anonymous_user_pk, get_cached_object_pks, get_obj_perms_filter, get_user_group_ids, \
+    get_user_organization_ids, invalidate_anonymous_perms_snapshot, invalidate_anonymous_user, obj_perms_exist, \
+    use_anonymous_perms_snapshot
+from guardian.core import ObjectPermissionChecker
+from guardian.ctypes import get_content_type
+from guardian.handlers import connect_anonymous_perms_snapshot_handlers, connect_anonymous_user_handlers, \
+    connect_obj_perms_filters_handlers, connect_objects_cache_handlers, connect_presence_handlers, \
+    disconnect_anonymous_perms_snapshot_handlers, disconnect_anonymous_user_handlers, \
+    disconnect_obj_perms_filters_handlers, disconnect_objects_cache_handlers, disconnect_presence_handlers
+from guardian.models import GroupObjectPermission, OrganizationObjectPermission
+from guardian.shortcuts import assign_perm, get_objects_for_user, iter_objects_for_user, remove_perm
+from guardian.testapp.models import Post
+from guardian.utils import get_anonymous_user, get_identity
+
+User = get_user_model()
+
+
+class MembershipsCacheTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.post = Post.objects.create(title='post')
+
+    def test_memoized_on_user(self):
+        self.user.groups.add(self.group)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_group_ids(self.user), {self.group.pk})
+            self.assertEqual(get_user_group_ids(self.user), {self.group.pk})
+
+    def test_invalidated_by_group_changes(self):
+        self.assertEqual(get_user_group_ids(self.user), set())
+        self.group.user_set.add(self.user)
+        self.assertEqual(get_user_group_ids(self.user), {self.group.pk})
+        self.group.user_set.clear()
+        self.assertEqual(get_user_group_ids(self.user), set())
+
+    def test_invalidated_by_organization_changes(self):
+        self.assertEqual(get_user_organization_ids(self.user), set())
+        membership = OrganizationUser.objects.create(user=self.user, organization=self.organization)
+        self.assertEqual(get_user_organization_ids(self.user), {self.organization.pk})
+        membership.delete()
+        self.assertEqual(get_user_organization_ids(self.user), set())
+        self.organization.users.add(self.user)
+        self.assertEqual(get_user_organization_ids(self.user), {self.organization.pk})
+
+    @mock.patch('guardian.conf.settings.MEMBERSHIPS_CACHE_TIMEOUT', 60)
+    def test_shared_cache(self):
+        self.addCleanup(get_cache().clear)
+        self.user.groups.add(self.group)
+        self.assertEqual(get_user_group_ids(self.user), {self.group.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_group_ids(User(pk=self.user.pk)), {self.group.pk})
+
+        self.group.user_set.remove(self.user)
+        self.assertEqual(get_user_group_ids(User(pk=self.user.pk)), set())
+
+    def test_checker_skips_sources_without_memberships(self):
+        assign_perm('change_post', self.user, self.post)
+        checker = ObjectPermissionChecker(self.user)
+        # memberships, user grants
+        with self.assertNumQueries(2):
+            self.assertEqual(list(checker.get_perms(self.post)), ['change_post'])
+
+    def test_checker_uses_memberships(self):
+        self.user.groups.add(self.group)
+        self.organization.users.add(self.user)
+        assign_perm('change_post', self.organization, self.post)
+        self.assertEqual(ObjectPermissionChecker(self.user).get_perms(self.post), ['change_post'])
+        self.assertEqual(list(ObjectPermissionChecker(self.user).get_group_perms(self.post)), [])
+        assign_perm('delete_post', self.group, self.post)
+        self.assertEqual(list(ObjectPermissionChecker(self.user).get_group_perms(self.post)), ['delete_post'])
+
+    def test_get_objects_for_user(self):
+        other_post = Post.objects.create(title='other post')
+        assign_perm('change_post', self.group, self.post)
+        assign_perm('change_post', self.organization, other_post)
+        self.assertQuerysetEqual(get_objects_for_user(self.user, 'testapp.change_post'), [])
+
+        self.user.groups.add(self.group)
+        self.assertEqual(set(get_objects_for_user(self.user, 'testapp.change_post')), {self.post})
+        self.organization.users.add(self.user)
+        self.assertEqual(set(get_objects_for_user(self.user, 'testapp.change_post')), {self.post, other_post})
+
+
+class PresenceCacheTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('guardian.conf.settings.PRESENCE_CACHE_TIMEOUT', 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connect_presence_handlers()
+        self.addCleanup(disconnect_presence_handlers)
+        self.addCleanup(get_cache().clear)
+        get_cache().clear()
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.user.groups.add(self.group)
+        self.organization.users.add(self.user)
+        self.post = Post.objects.create(title='post')
+        self.ctype = get_content_type(Post)
+
+    def test_obj_perms_exist(self):
+        self.assertFalse(obj_perms_exist(GroupObjectPermission, self.ctype))
+        assign_perm('change_post', self.group, self.post)
+        with self.assertNumQueries(0):
+            self.assertTrue(obj_perms_exist(GroupObjectPermission, self.ctype))
+        self.assertFalse(obj_perms_exist(OrganizationObjectPermission, self.ctype))
+
+        remove_perm('change_post', self.group, self.post)
+        self.assertFalse(obj_perms_exist(GroupObjectPermission, self.ctype))
+
+    @mock.patch('guardian.conf.settings.PRESENCE_CACHE_TIMEOUT', None)
+    def test_disabled(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(obj_perms_exist(GroupObjectPermission, self.ctype))
+
+    def test_checker_skips_absent_sources(self):
+        assign_perm('change_post', self.user, self.post)
+        self.assertEqual(ObjectPermissionChecker(self.user).get_perms(self.post), ['change_post'])
+        with self.assertNumQueries(1):
+            self.assertEqual(ObjectPermissionChecker(self.user).get_perms(self.post), ['change_post'])
+
+        assign_perm('delete_post', self.organization, self.post)
+        self.assertEqual(set(ObjectPermissionChecker(self.user).get_perms(self.post)),
+                         {'change_post', 'delete_post'})
+
+    def test_get_objects_for_user(self):
+        self.assertQuerysetEqual(get_objects_for_user(self.user, 'testapp.change_post'), [])
+        assign_perm('change_post', self.group, self.post)
+        self.assertEqual(list(get_objects_for_user(self.user, 'testapp.change_post')), [self.post])
+
+
+class BloomFilterTest(TestCase):
+
+    def test_membership(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom_filter.add('1:%s' % i)
+        self.assertTrue(all('1:%s' % i in bloom_filter for i in range(1000)))
+        false_positives = sum('2:%s' % i in bloom_filter for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_empty(self):
+        self.assertNotIn('1:1', BloomFilter(0, 0.01))
+
+
+class ObjPermsFilterTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('guardian.conf.settings.OBJ_PERMS_FILTER_TIMEOUT', 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connect_obj_perms_filters_handlers()
+        self.addCleanup(disconnect_obj_perms_filters_handlers)
+        self.addCleanup(get_cache().clear)
+        get_cache().clear()
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.post = Post.objects.create(title='post')
+        self.other_post = Post.objects.create(title='other post')
+
+    def test_denies_without_queries(self):
+        assign_perm('change_post', self.user, self.post)
+        checker = ObjectPermissionChecker(self.user)
+        checker.may_have_perms(self.post)
+        with self.assertNumQueries(0):
+            self.assertFalse(checker.has_perm('change_post', self.other_post))
+        self.assertTrue(checker.may_have_perms(self.post))
+
+    def test_cached(self):
+        get_obj_perms_filter(self.user)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(get_obj_perms_filter(User(pk=self.user.pk)))
+
+    def test_rebuilt_on_grants(self):
+        self.assertFalse(ObjectPermissionChecker(self.user).may_have_perms(self.post))
+        assign_perm('change_post', self.user, self.post)
+        self.assertTrue(ObjectPermissionChecker(self.user).may_have_perms(self.post))
+
+        assign_perm('change_post', self.group, self.other_post)
+        self.assertFalse(ObjectPermissionChecker(self.user).may_have_perms(self.other_post))
+        self.user.groups.add(self.group)
+        self.assertTrue(ObjectPermissionChecker(self.user).may_have_perms(self.other_post))
+
+    def test_organization_grants(self):
+        self.organization.users.add(self.user)
+        self.assertFalse(ObjectPermissionChecker(self.user).may_have_perms(self.post))
+        assign_perm('change_post', self.organization, self.post)
+        self.assertTrue(ObjectPermissionChecker(self.user).may_have_perms(self.post))
+
+    def test_stale_build_ignored(self):
+        build_obj_perms_filter = guardian_cache._build_obj_perms_filter
+
+        def build_racing_grant(user):
+            obj_perms_filter = build_obj_perms_filter(user)
+            assign_perm('change_post', self.user, self.post)
+            return obj_perms_filter
+
+        with mock.patch('guardian.cache._build_obj_perms_filter', build_racing_grant):
+            get_obj_perms_filter(self.user)
+        self.assertTrue(ObjectPermissionChecker(self.user).may_have_perms(self.post))
+
+    @mock.patch('guardian.conf.settings.OBJ_PERMS_FILTER_TIMEOUT', None)
+    def test_disabled(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(ObjectPermissionChecker(self.user).may_have_perms(self.post))
+
+
+class ObjectIdSetTest(TestCase):
+
+    def test_set(self):
+        ids = ObjectIdSet([5, 1, 3, 3])
+        self.assertEqual(list(ids), [1, 3, 5])
+        self.assertIn(3, ids)
+        self.assertNotIn(4, ids)
+
+    def test_pickle(self):
+        sparse = ObjectIdSet(range(0, 10 ** 6, 1000))
+        dense = ObjectIdSet(i for i in range(10 ** 5, 2 * 10 ** 5) if i % 7)
+        for ids in (sparse, dense, ObjectIdSet()):
+            self.assertEqual(list(pickle.loads(pickle.dumps(ids))), list(ids))
+        self.assertLess(len(pickle.dumps(dense)), len(dense) // 10)
+
+
+class ObjectsCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('guardian.conf.settings.OBJECTS_CACHE_TIMEOUT', 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connect_objects_cache_handlers()
+        self.addCleanup(disconnect_objects_cache_handlers)
+        self.addCleanup(get_cache().clear)
+        get_cache().clear()
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.posts = [Post.objects.create(title='post %s' % i) for i in range(3)]
+        self.ctype = get_content_type(Post)
+
+    def get_posts(self, perms='testapp.change_post', **kwargs):
+        return set(get_objects_for_user(self.user, perms, accept_global_perms=False, **kwargs))
+
+    def test_cached(self):
+        assign_perm('change_post', self.user, self.posts[0])
+        self.assertEqual(self.get_posts(), {self.posts[0]})
+        # content type lookup, posts
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_posts(), {self.posts[0]})
+
+    def test_grants_and_revokes(self):
+        self.assertEqual(self.get_posts(), set())
+        assign_perm('change_post', self.user, self.posts[0])
+        self.assertEqual(self.get_posts(), {self.posts[0]})
+        remove_perm('change_post', self.user, self.posts[0])
+        self.assertEqual(self.get_posts(), set())
+
+    def test_concurrent_grants(self):
+        self.assertEqual(self.get_posts(), set())
+        # Grants committed by two processes reading the same cached sets
+        invalidate = guardian_cache.invalidate_cached_object_pks
+        with mock.patch('guardian.handlers.invalidate_cached_object_pks'):
+            assign_perm('change_post', self.user, self.posts[0])
+            assign_perm('change_post', self.user, self.posts[1])
+        invalidate([self.user.pk], [self.ctype.pk])
+        invalidate([self.user.pk], [self.ctype.pk])
+        self.assertEqual(self.get_posts(), {self.posts[0], self.posts[1]})
+
+    def test_too_many_pks_for_query(self):
+        for post in self.posts:
+            assign_perm('change_post', self.user, post)
+        self.assertEqual(self.get_posts(), set(self.posts))
+        with mock.patch.object(connection.features, 'max_query_params', 2):
+            queryset = get_objects_for_user(self.user, 'testapp.change_post', accept_global_perms=False)
+            self.assertNotIn('IN (%s' % self.posts[0].pk, str(queryset.query))
+            self.assertEqual(set(queryset), set(self.posts))
+            self.assertEqual(list(iter_objects_for_user(self.user, 'testapp.change_post', chunk_size=2,
+                                                        accept_global_perms=False)), self.posts)
+
+    def test_iter_sends_pks_of_chunk(self):
+        for post in self.posts:
+            assign_perm('change_post', self.user, post)
+        self.assertEqual(self.get_posts(), set(self.posts))
+        with CaptureQueriesContext(connection) as queries:
+            pks = list(iter_objects_for_user(self.user, 'testapp.change_post', chunk_size=2, pks_only=True,
+                                             accept_global_perms=False))
+        self.assertEqual(pks, [post.pk for post in self.posts])
+        selects = [query['sql'] for query in queries if 'testapp_post' in query['sql']]
+        self.assertEqual(len(selects), 2)
+        self.assertNotIn(str(self.posts[2].pk), selects[0].split('IN', 1)[1])
+
+    def test_all_and_any_perms(self):
+        perms = ['testapp.change_post', 'testapp.delete_post']
+        self.user.groups.add(self.group)
+        self.assertEqual(self.get_posts(perms), set())
+        self.assertEqual(self.get_posts(perms, any_perm=True), set())
+
+        assign_perm('change_post', self.user, self.posts[0])
+        assign_perm('delete_post', self.group, self.posts[0])
+        assign_perm('delete_post', self.group, self.posts[1])
+        self.assertEqual(self.get_posts(perms), {self.posts[0]})
+        self.assertEqual(self.get_posts(perms, any_perm=True), {self.posts[0], self.posts[1]})
+        self.assertEqual(self.get_posts(perms, any_perm=True, use_groups=False), {self.posts[0]})
+
+        remove_perm('delete_post', self.group, self.posts[0])
+        self.assertEqual(self.get_posts(perms), set())
+        self.assertEqual(self.get_posts(perms, any_perm=True), {self.posts[0], self.posts[1]})
+
+    def test_memberships(self):
+        assign_perm('change_post', self.group, self.posts[1])
+        self.assertEqual(self.get_posts(), set())
+        self.group.user_set.add(self.user)
+        self.assertEqual(self.get_posts(), {self.posts[1]})
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.get_posts(), set())
+
+    def test_rollback(self):
+        self.assertEqual(self.get_posts(), set())
+        try:
+            with transaction.atomic():
+                assign_perm('change_post', self.user, self.posts[0])
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.get_posts(), set())
+
+    def test_stale_computation_ignored(self):
+        get_granted_codenames = guardian_cache._get_granted_codenames
+
+        def get_racing_grant(*args):
+            rows = list(get_granted_codenames(*args))
+            assign_perm('change_post', self.user, self.posts[2])
+            return rows
+
+        with mock.patch('guardian.cache._get_granted_codenames', get_racing_grant):
+            get_cached_object_pks(self.user, self.ctype, {'change_post'})
+        self.assertEqual(self.get_posts(), {self.posts[2]})
+
+
+class AnonymousUserCacheTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('guardian.conf.settings.ANONYMOUS_USER_CACHE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connect_anonymous_user_handlers()
+        self.addCleanup(disconnect_anonymous_user_handlers)
+        invalidate_anonymous_user()
+        self.addCleanup(invalidate_anonymous_user)
+        self.post = Post.objects.create(title='post')
+
+    def test_fetched_once(self):
+        anonymous = get_anonymous_user()
+        self.assertEqual(get_cached_anonymous_user_pk(), anonymous.pk)
+        with self.assertNumQueries(0):
+            other = get_anonymous_user()
+            self.assertEqual(get_identity(AnonymousUser())[0], anonymous)
+            self.assertEqual(ObjectPermissionBackend().get_all_permissions(AnonymousUser(), None), set())
+        self.assertEqual(other, anonymous)
+        self.assertIsNot(other, anonymous)
+        self.assertEqual(other.get_username(), anonymous.get_username())
+        self.assertFalse(other._state.adding)
+
+    def test_shared_by_entry_points(self):
+        anonymous = get_anonymous_user()
+        assign_perm('change_post', anonymous, self.post)
+        backend = ObjectPermissionBackend()
+        with self.assertNumQueries(0):
+            get_anonymous_user()
+        self.assertEqual(list(get_objects_for_user(AnonymousUser(), 'testapp.change_post')), [self.post])
+        self.assertTrue(backend.has_perm(AnonymousUser(), 'change_post', self.post,
+                                         check_permission_expiry=False))
+
+    def test_invalidated_on_save(self):
+        anonymous = get_anonymous_user()
+        anonymous.first_name = 'Anonymous'
+        anonymous.save()
+        self.assertIsNone(get_cached_anonymous_user_pk())
+        self.assertEqual(get_anonymous_user().first_name, 'Anonymous')
+
+    def test_invalidated_on_delete(self):
+        get_anonymous_user().delete()
+        self.assertIsNone(get_cached_anonymous_user_pk())
+        with self.assertRaises(User.DoesNotExist):
+            get_anonymous_user()
+
+    def test_other_users_dont_invalidate(self):
+        get_anonymous_user()
+        User.objects.create(username='joe')
+        self.assertIsNotNone(get_cached_anonymous_user_pk())
+
+    @mock.patch('guardian.conf.settings.ANONYMOUS_USER_CACHE', False)
+    def test_disabled(self):
+        get_anonymous_user()
+        self.assertIsNone(get_cached_anonymous_user_pk())
+        with self.assertNumQueries(1):
+            get_anonymous_user()
+
+
+class AnonymousPermsSnapshotTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('guardian.conf.settings.ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT', 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connect_anonymous_perms_snapshot_handlers()
+        self.addCleanup(disconnect_anonymous_perms_snapshot_handlers)
+        invalidate_anonymous_perms_snapshot()
+        self.addCleanup(invalidate_anonymous_perms_snapshot)
+        self.anonymous = get_anonymous_user()
+        self.group = Group.objects.create(name='public')
+        self.anonymous.groups.add(self.group)
+        self.post = Post.objects.create(title='post')
+        self.group_post = Post.objects.create(title='group post')
+        self.hidden_post = Post.objects.create(title='hidden post')
+        assign_perm('change_post', self.anonymous, self.post)
+        assign_perm('change_post', self.group, self.group_post)
+
+    def test_other_users_skip_models(self):
+        user = User.objects.create(username='joe')
+        with mock.patch('guardian.cache.get_user_obj_perms_model') as get_user_obj_perms_model:
+            self.assertIsNone(use_anonymous_perms_snapshot(user, Post))
+            with mock.patch('guardian.conf.settings.ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT', None):
+                self.assertIsNone(use_anonymous_perms_snapshot(self.anonymous, Post))
+        get_user_obj_perms_model.assert_not_called()
+        self.assertIsNotNone(use_anonymous_perms_snapshot(self.anonymous, Post))
+
+    def test_checks_answered_from_snapshot(self):
+        get_anonymous_perms_snapshot(self.anonymous)
+        with self.assertNumQueries(0):
+            checker = ObjectPermissionChecker(self.anonymous)
+            self.assertTrue(checker.has_perm('change_post', self.post))
+            self.assertFalse(checker.has_perm('change_post', self.hidden_post))
+            self.assertEqual(checker.get_perms(self.post, include_group_perms=False), ['change_post'])
+        # Content type of the permission and the posts only
+        with self.assertNumQueries(2):
+            posts = get_objects_for_user(self.anonymous, 'testapp.change_post', accept_global_perms=False)
+            self.assertEqual(set(posts), {self.post, self.group_post})
+        self.assertEqual(list(get_objects_for_user(self.anonymous, 'testapp.change_post', use_groups=False,
+                                                   accept_global_perms=False)), [self.post])
+
+    def test_too_many_pks_for_query(self):
+        get_anonymous_perms_snapshot(self.anonymous)
+        with mock.patch('guardian.shortcuts.MAX_PKS_IN', 1):
+            queryset = get_objects_for_user(self.anonymous, 'testapp.change_post', accept_global_perms=False)
+            self.assertIn('"testapp_post"."id" IN (SELECT', str(queryset.query))
+            self.assertEqual(set(queryset), {self.post, self.group_post})
+
+    def test_shared_by_checkers(self):
+        snapshot = get_anonymous_perms_snapshot(self.anonymous)
+        self.assertIs(get_anonymous_perms_snapshot(get_anonymous_user()), snapshot)
+        ctype_id = get_content_type(Post).id
+        self.assertEqual(snapshot.get_object_pks(ctype_id, {'change_post'}, identity_fields=('group',)),
+                         [str(self.group_post.pk)])
+
+    def test_refreshed_after_timeout(self):
+        snapshot = get_anonymous_perms_snapshot(self.anonymous)
+        with mock.patch('guardian.cache.time.monotonic', return_value=snapshot.expires_at):
+            self.assertIsNot(get_anonymous_perms_snapshot(self.anonymous), snapshot)
+
+    def test_invalidated_on_grant(self):
+        get_anonymous_perms_snapshot(self.anonymous)
+        assign_perm('delete_post', self.group, self.hidden_post)
+        self.assertIsNone(guardian_cache._anonymous_perms_snapshot)
+        self.assertEqual(list(get_objects_for_user(self.anonymous, 'testapp.delete_post',
+                                                   accept_global_perms=False)), [self.hidden_post])
+
+    def test_invalidated_on_revoke(self):
+        get_anonymous_perms_snapshot(self.anonymous)
+        remove_perm('change_post', self.anonymous, self.post)
+        self.assertIsNone(guardian_cache._anonymous_perms_snapshot)
+        self.assertFalse(ObjectPermissionChecker(self.anonymous).has_perm('change_post', self.post))
+
+    def test_invalidated_on_membership_change(self):
+        get_anonymous_perms_snapshot(self.anonymous)
+        self.anonymous.groups.remove(self.group)
+        self.assertIsNone(guardian_cache._anonymous_perms_snapshot)
+        self.assertEqual(list(get_objects_for_user(self.anonymous, 'testapp.change_post',
+                                                   accept_global_perms=False)), [self.post])
+
+    def test_other_identities_dont_invalidate(self):
+        snapshot = get_anonymous_perms_snapshot(self.anonymous)
+        assign_perm('change_post', User.objects.create(username='joe'), self.hidden_post)
+        assign_perm('change_post', Group.objects.create(name='staff'), self.hidden_post)
+        self.assertIs(guardian_cache._anonymous_perms_snapshot, snapshot)
+
+    def test_not_used_for_other_users(self):
+        joe = User.objects.create(username='joe')
+        self.assertIsNone(get_anonymous_perms_snapshot(joe))
+
+    @mock.patch('guardian.conf.settings.ANONYMOUS_PERMS_SNAPSHOT_TIMEOUT', None)
+    def test_disabled(self):
+        self.assertIsNone(get_anonymous_perms_snapshot(self.anonymous))
@@ -207,10 +207,10 @@ class ObjectPermissionCheckerTest(ObjectPermissionTestCase):
             self.assertTrue(checker.prefetch_perms(prefetched_objects))
             query_count = len(connection.queries)
 
-            # Checking cache is filled
+            # Checking cache is filled, with and without expired permissions
             self.assertEqual(
                 len(checker._obj_perms_cache),
-                len(prefetched_objects)
+                2 * len(prefetched_objects)
             )
 
             # Checking shouldn't spawn any queries
@@ -251,10 +251,10 @@ class ObjectPermissionCheckerTest(ObjectPermissionTestCase):
             self.assertTrue(checker.prefetch_perms(prefetched_objects))
             query_count = len(connection.queries)
 
-            # Checking cache is filled
+            # Checking cache is filled, with and without expired permissions
             self.assertEqual(
                 len(checker._obj_perms_cache),
-                len(prefetched_objects)
+                2 * len(prefetched_objects)
             )
 
             # Checking shouldn't spawn any queries
@@ -290,10 +290,10 @@ class ObjectPermissionCheckerTest(ObjectPermissionTestCase):
 
             query_count = len(connection.queries)
 
-            # Checking cache is filled
+            # Checking cache is filled, with and without expired permissions
             self.assertEqual(
                 len(checker._obj_perms_cache),
-                len(prefetched_objects)
+                2 * len(prefetched_objects)
             )
 
             # Checking shouldn't spawn any queries
@@ -337,7 +337,7 @@ class ObjectPermissionCheckerTest(ObjectPermissionTestCase):
             query_count = len(connection.queries)
 
             # Checking cache is filled
-            self.assertEqual(len(checker._obj_perms_cache), len(projects))
+            self.assertEqual(len(checker._obj_perms_cache), 2 * len(projects))
 
             # Checking shouldn't spawn any queries
             checker.has_perm("change_project", projects[0])
@@ -381,7 +381,7 @@ class ObjectPermissionCheckerTest(ObjectPermissionTestCase):
             query_count = len(connection.queries)
 
             # Checking cache is filled
-            self.assertEqual(len(checker._obj_perms_cache), len(projects))
+            self.assertEqual(len(checker._obj_perms_cache), 2 * len(projects))
 
             # Checking shouldn't spawn any queries
             checker.has_perm("change_project", projects[0])
@@ -419,7 +419,7 @@ class ObjectPermissionCheckerTest(ObjectPermissionTestCase):
             query_count = len(connection.queries)
 
             # Checking cache is filled
-            self.assertEqual(len(checker._obj_perms_cache), len(projects))
+            self.assertEqual(len(checker._obj_perms_cache), 2 * len(projects))
 
             # Checking shouldn't spawn any queries
             checker.has_perm("change_project", projects[0])
@@ -1,3 +1,7 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
 from django.conf import global_settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, AnonymousUser
@@ -11,6 +15,7 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.template import TemplateDoesNotExist
 from django.test import TestCase
+from django.utils import timezone
 
 from guardian.compat import get_user_model_path
 from guardian.compat import get_user_permission_full_codename
@@ -18,6 +23,7 @@ import mock
 from guardian.decorators import permission_required, permission_required_or_403, permission_required_or_404
 from guardian.exceptions import GuardianError
 from guardian.exceptions import WrongAppError
+from guardian.models import UserObjectPermission
 from guardian.shortcuts import assign_perm
 from guardian.testapp.tests.conf import TestDataMixin
 from guardian.testapp.tests.conf import override_settings
@@ -237,6 +243,145 @@ class PermissionRequiredTest(TestDataMixin, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content, b'dummy_view')
 
+    def test_user_has_all_of_perms(self):
+
+        perms = [get_user_permission_full_codename('change'),
+                 get_user_permission_full_codename('delete')]
+        joe, created = User.objects.get_or_create(username='joe')
+        assign_perm(perms[0], self.user, obj=joe)
+
+        request = self._get_request(self.user)
+
+        @permission_required_or_403(perms, (
+            user_model_path, 'username', 'username'))
+        def dummy_view(request, username):
+            return HttpResponse('dummy_view')
+        response = dummy_view(request, username='joe')
+        self.assertEqual(response.status_code, 403)
+
+        assign_perm(perms[1], self.user, obj=joe)
+        response = dummy_view(request, username='joe')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'dummy_view')
+
+    def test_object_kwarg(self):
+
+        perm = get_user_permission_full_codename('change')
+        joe, created = User.objects.get_or_create(username='joe')
+        assign_perm(perm, self.user, obj=joe)
+
+        request = self._get_request(self.user)
+
+        @permission_required_or_404(perm, (
+            user_model_path, 'username', 'username'), object_kwarg='joe')
+        def dummy_view(request, username, joe):
+            return HttpResponse(joe.username)
+        response = dummy_view(request, username='joe')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'joe')
+        self.assertEqual(dummy_view(request, username='jane').status_code, 404)
+        self.assertEqual(dummy_view(self._get_request(joe), username='joe').status_code, 404)
+
+        self.user.is_active = False
+        self.assertEqual(dummy_view(request, username='joe').status_code, 404)
+
+    def test_object_kwarg_single_query(self):
+
+        perm = get_user_permission_full_codename('change')
+        joe, created = User.objects.get_or_create(username='joe')
+        assign_perm(perm, self.user, obj=joe)
+        self.user.is_superuser = True
+
+        @permission_required_or_403(perm, (
+            user_model_path, 'username', 'username'), object_kwarg='joe')
+        def dummy_view(request, username, joe):
+            return HttpResponse(joe.username)
+        # content type lookup of the permission and the object itself
+        with self.assertNumQueries(2):
+            response = dummy_view(self._get_request(self.user), username='joe')
+        self.assertEqual(response.content, b'joe')
+
+    def test_object_kwarg_expired_grant(self):
+
+        perm = get_user_permission_full_codename('change')
+        joe, created = User.objects.get_or_create(username='joe')
+        assign_perm(perm, self.user, obj=joe)
+        grants = UserObjectPermission.objects.filter(user=self.user)
+        grants.update(permission_expiry=timezone.now() - timedelta(days=1))
+        request = self._get_request(self.user)
+
+        @permission_required_or_404(perm, (user_model_path, 'username', 'username'))
+        def classic_view(request, username):
+            return HttpResponse('dummy_view')
+
+        @permission_required_or_404(perm, (
+            user_model_path, 'username', 'username'), object_kwarg='joe')
+        def dummy_view(request, username, joe):
+            return HttpResponse(joe.username)
+        self.assertEqual(classic_view(request, username='joe').status_code, 404)
+        self.assertEqual(dummy_view(request, username='joe').status_code, 404)
+
+        grants.update(permission_expiry=timezone.now() + timedelta(days=1))
+        self.assertEqual(dummy_view(request, username='joe').status_code, 200)
+
+    def test_object_kwarg_group_grant(self):
+        self.user.groups.add(self.group)
+        target = Group.objects.create(name='target')
+        assign_perm('auth.change_group', self.group, obj=target)
+        request = self._get_request(self.user)
+
+        @permission_required_or_404('auth.change_group', (Group, 'name', 'name'))
+        def classic_view(request, name):
+            return HttpResponse('dummy_view')
+
+        @permission_required_or_404('auth.change_group', (Group, 'name', 'name'), object_kwarg='target')
+        def dummy_view(request, name, target):
+            return HttpResponse(target.name)
+        self.assertEqual(classic_view(request, name='target').status_code, 404)
+        self.assertEqual(dummy_view(request, name='target').status_code, 404)
+
+    def test_object_kwarg_without_lookup_variables(self):
+        with self.assertRaises(GuardianError):
+            permission_required('auth.change_user', object_kwarg='user')
+
+    def test_async_view(self):
+
+        perm = get_user_permission_full_codename('change')
+        joe, created = User.objects.get_or_create(username='joe')
+        assign_perm(perm, self.user, obj=joe)
+
+        @permission_required_or_403(perm, (
+            user_model_path, 'username', 'username'))
+        async def dummy_view(request, username):
+            return HttpResponse('dummy_view')
+        self.assertTrue(asyncio.iscoroutinefunction(dummy_view))
+
+        response = async_to_sync(dummy_view)(self._get_request(self.user), username='joe')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'dummy_view')
+        response = async_to_sync(dummy_view)(self._get_request(joe), username='joe')
+        self.assertEqual(response.status_code, 403)
+
+    def test_async_view_object_kwarg(self):
+
+        perm = get_user_permission_full_codename('change')
+        joe, created = User.objects.get_or_create(username='joe')
+        assign_perm(perm, self.user, obj=joe)
+
+        @permission_required_or_404(perm, (
+            user_model_path, 'username', 'username'), object_kwarg='joe')
+        async def dummy_view(request, username, joe):
+            return HttpResponse(joe.username)
+        response = async_to_sync(dummy_view)(self._get_request(self.user), username='joe')
+        self.assertEqual(response.content, b'joe')
+        response = async_to_sync(dummy_view)(self._get_request(self.user), username='jane')
+        self.assertEqual(response.status_code, 404)
+
+    def test_wrong_perms_list(self):
+        for perms in ([], ['auth.change_user', 1]):
+            with self.assertRaises(GuardianError):
+                permission_required(perms)
+
     def test_user_has_access_on_model_with_metaclass(self):
         """
         Test to the fix issues of comparaison made via type()
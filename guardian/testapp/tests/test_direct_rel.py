@@ -1,6 +1,16 @@
+from datetime import timedelta
+from io import StringIO
+
+import mock
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from guardian.exceptions import ObjPermsMigrationError
+from guardian.models import GroupObjectPermission, UserObjectPermission
 
 from guardian.shortcuts import assign_perm
 from guardian.shortcuts import get_groups_with_perms
@@ -8,11 +18,13 @@ from guardian.shortcuts import get_objects_for_group
 from guardian.shortcuts import get_objects_for_user
 from guardian.shortcuts import get_users_with_perms
 from guardian.shortcuts import remove_perm
+from guardian.testapp.models import Document, DocumentUserObjectPermission
 from guardian.testapp.models import Mixed, ReverseMixed
 from guardian.testapp.models import Project
 from guardian.testapp.models import ProjectGroupObjectPermission
 from guardian.testapp.models import ProjectUserObjectPermission
 from guardian.testapp.tests.conf import skipUnlessTestApp
+from guardian.utils import migrate_obj_perms_to_direct_models
 
 User = get_user_model()
 
@@ -259,3 +271,103 @@ class TestMixedDirectAndGenericObjectPermission(TestCase):
         result = get_objects_for_user(self.joe, 'testapp.add_reversemixed')
         self.assertEqual(sorted(p.pk for p in result),
                          sorted([self.reverse_mixed.pk]))
+
+
+@skipUnlessTestApp
+class TestMigrateToDirectObjectPermissions(TestCase):
+
+    def setUp(self):
+        self.joe = User.objects.create_user('joe', 'joe@example.com', 'foobar')
+        self.group = Group.objects.create(name='admins')
+        self.projects = [Project.objects.create(name='project %d' % i) for i in range(3)]
+        self.ctype = ContentType.objects.get_for_model(Project)
+        self.change_project = Permission.objects.get(content_type=self.ctype, codename='change_project')
+        for project in self.projects:
+            UserObjectPermission.objects.create(user=self.joe, permission=self.change_project,
+                                                content_type=self.ctype, object_pk=str(project.pk))
+        GroupObjectPermission.objects.create(group=self.group, permission=self.change_project,
+                                             content_type=self.ctype, object_pk=str(self.projects[0].pk))
+        deleted = Project.objects.create(name='deleted')
+        self.orphan = UserObjectPermission.objects.create(user=self.joe, permission=self.change_project,
+                                                          content_type=self.ctype, object_pk=str(deleted.pk))
+        deleted.delete()
+
+    def test_migrate(self):
+        ProjectUserObjectPermission.objects.create(user=self.joe, permission=self.change_project,
+                                                   content_object=self.projects[0])
+        progress = mock.Mock()
+
+        migrated = migrate_obj_perms_to_direct_models(Project, batch_size=2, progress=progress)
+
+        self.assertEqual(migrated, {ProjectUserObjectPermission: 3, ProjectGroupObjectPermission: 1})
+        progress.assert_any_call(ProjectUserObjectPermission, 2)
+        self.assertEqual(set(ProjectUserObjectPermission.objects.values_list('content_object', flat=True)),
+                         {project.pk for project in self.projects})
+        self.assertEqual(ProjectGroupObjectPermission.objects.get().content_object, self.projects[0])
+        self.assertEqual(list(UserObjectPermission.objects.filter(content_type=self.ctype)), [self.orphan])
+        self.assertFalse(GroupObjectPermission.objects.filter(content_type=self.ctype).exists())
+
+    def test_migrate_verifies_batches(self):
+        with mock.patch.object(ProjectUserObjectPermission.objects, 'bulk_create'):
+            with self.assertRaises(ObjPermsMigrationError):
+                migrate_obj_perms_to_direct_models(Project)
+
+        self.assertEqual(UserObjectPermission.objects.filter(content_type=self.ctype).count(), 4)
+
+    def test_migrate_merges_existing_grants(self):
+        ctype = ContentType.objects.get_for_model(Document)
+        change_document = Permission.objects.get(content_type=ctype, codename='change_document')
+        now = timezone.now()
+        documents = [Document.objects.create(name='document %d' % i) for i in range(3)]
+        # (generic grant expiry, direct grant expiry) of each document
+        expiries = [(None, now + timedelta(days=1)),
+                    (now + timedelta(days=1), None),
+                    (now + timedelta(days=10), now + timedelta(days=1))]
+        for document, (generic_expiry, direct_expiry) in zip(documents, expiries):
+            UserObjectPermission.objects.create(user=self.joe, permission=change_document, content_type=ctype,
+                                                object_pk=str(document.pk), permission_expiry=generic_expiry,
+                                                permission_expiry_30day_email_sent=generic_expiry is not None)
+            DocumentUserObjectPermission.objects.create(user=self.joe, permission=change_document,
+                                                        content_object=document, permission_expiry=direct_expiry,
+                                                        permission_expiry_0day_email_sent=True)
+
+        migrated = migrate_obj_perms_to_direct_models(Document)
+
+        self.assertEqual(migrated, {DocumentUserObjectPermission: 3})
+        self.assertEqual(
+            list(DocumentUserObjectPermission.objects.order_by('content_object').values_list(
+                'permission_expiry', 'permission_expiry_30day_email_sent', 'permission_expiry_0day_email_sent')),
+            [(None, False, False), (None, False, True), (now + timedelta(days=10), True, False)])
+        self.assertFalse(UserObjectPermission.objects.filter(content_type=ctype).exists())
+
+    def test_migrate_verifies_merged_grants(self):
+        document = Document.objects.create(name='document')
+        ctype = ContentType.objects.get_for_model(Document)
+        change_document = Permission.objects.get(content_type=ctype, codename='change_document')
+        UserObjectPermission.objects.create(user=self.joe, permission=change_document, content_type=ctype,
+                                            object_pk=str(document.pk))
+        DocumentUserObjectPermission.objects.create(user=self.joe, permission=change_document,
+                                                    content_object=document, permission_expiry=timezone.now())
+        with mock.patch('django.db.models.query.QuerySet.update'):
+            with self.assertRaises(ObjPermsMigrationError):
+                migrate_obj_perms_to_direct_models(Document)
+
+        self.assertTrue(UserObjectPermission.objects.filter(content_type=ctype).exists())
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('migrate_obj_perms_to_direct', 'testapp.Project', stdout=out)
+        self.assertIn("Migrated 3 object permission entries to testapp.ProjectUserObjectPermission",
+                      out.getvalue())
+
+        out = StringIO()
+        call_command('generate_direct_obj_perms_models', 'testapp.Post', stdout=out)
+        source = out.getvalue()
+        self.assertIn("class PostUserObjectPermission(UserObjectPermissionBase):", source)
+        self.assertIn("class PostOrganizationObjectPermission(OrganizationObjectPermissionBase):", source)
+        self.assertIn("content_object = models.ForeignKey('testapp.Post', on_delete=models.CASCADE)", source)
+        self.assertIn("enabled = False", source)
+        compile(source, 'models.py', 'exec')
+
+        with self.assertRaises(CommandError):
+            call_command('migrate_obj_perms_to_direct', 'testapp.Post')
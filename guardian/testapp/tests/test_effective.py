@@ -0,0 +1,156 @@
+from datetime import timedelta
+from io import StringIO
+
+import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from organizations.models import Organization, OrganizationUser
+
+from guardian.core import ObjectPermissionChecker
+from guardian.handlers import connect_effective_obj_perms_handlers, disconnect_effective_obj_perms_handlers
+from guardian.models import EffectiveObjectPermission, GroupObjectPermission, UserObjectPermission
+from guardian.shortcuts import assign_perm, get_objects_for_user, remove_perm
+from guardian.testapp.models import Post
+from guardian.utils import delete_obj_perms, refresh_effective_obj_perms
+
+User = get_user_model()
+
+
+class EffectiveObjPermsTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('guardian.conf.settings.EFFECTIVE_OBJ_PERMS', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connect_effective_obj_perms_handlers()
+        self.addCleanup(disconnect_effective_obj_perms_handlers)
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.post = Post.objects.create(title='post')
+        self.other_post = Post.objects.create(title='other post')
+
+    def effective(self, user=None):
+        return set(EffectiveObjectPermission.objects
+                   .filter(user=user or self.user)
+                   .values_list('object_pk', 'permission__codename'))
+
+    def test_user_perms(self):
+        assign_perm('change_post', self.user, self.post)
+        self.assertEqual(self.effective(), {(str(self.post.pk), 'change_post')})
+
+        remove_perm('change_post', self.user, self.post)
+        self.assertEqual(self.effective(), set())
+
+    def test_group_perms(self):
+        assign_perm('change_post', self.group, self.post)
+        self.assertEqual(self.effective(), set())
+
+        self.user.groups.add(self.group)
+        self.assertEqual(self.effective(), {(str(self.post.pk), 'change_post')})
+        assign_perm('delete_post', self.group, self.post)
+        self.assertEqual(self.effective(), {(str(self.post.pk), 'change_post'),
+                                            (str(self.post.pk), 'delete_post')})
+
+        self.group.user_set.clear()
+        self.assertEqual(self.effective(), set())
+        self.group.user_set.add(self.user)
+        self.assertEqual(len(self.effective()), 2)
+
+        self.group.delete()
+        self.assertEqual(self.effective(), set())
+
+    def test_organization_perms(self):
+        assign_perm('change_post', self.organization, self.post)
+        membership = OrganizationUser.objects.create(user=self.user, organization=self.organization)
+        self.assertEqual(self.effective(), {(str(self.post.pk), 'change_post')})
+
+        membership.delete()
+        self.assertEqual(self.effective(), set())
+
+    def test_bulk_delete(self):
+        grant = assign_perm('change_post', self.user, self.post)
+        assign_perm('change_post', self.user, self.other_post)
+
+        delete_obj_perms(UserObjectPermission, [grant.pk])
+
+        self.assertEqual(self.effective(), {(str(self.other_post.pk), 'change_post')})
+
+    def test_latest_expiry(self):
+        now = timezone.now()
+        for days in (1, 10):
+            GroupObjectPermission.objects.create(
+                group=Group.objects.create(name='group %d' % days), content_type=ContentType.objects.get_for_model(Post),
+                object_pk=str(self.post.pk), permission=Permission.objects.get(codename='change_post'),
+                permission_expiry=now + timedelta(days=days)).group.user_set.add(self.user)
+        expiry = EffectiveObjectPermission.objects.get(object_pk=str(self.post.pk)).permission_expiry
+        self.assertEqual(expiry, now + timedelta(days=10))
+
+    def test_delete_user(self):
+        self.user.groups.add(self.group)
+        assign_perm('change_post', self.group, self.post)
+        assign_perm('change_post', self.user, self.post)
+
+        self.user.delete()
+
+        self.assertFalse(EffectiveObjectPermission.objects.exists())
+
+    def test_checker(self):
+        self.user.groups.add(self.group)
+        self.organization.users.add(self.user)
+        assign_perm('change_post', self.organization, self.post)
+        assign_perm('change_post', self.group, self.other_post)
+        checker = ObjectPermissionChecker(self.user)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(checker.get_perms(self.post), ['change_post'])
+        self.assertTrue(self.user.has_perm('testapp.change_post', self.post))
+        self.assertFalse(self.user.has_perm('testapp.change_post', self.other_post))
+
+    def test_checker_matches_disabled(self):
+        self.user.groups.add(self.group)
+        self.organization.users.add(self.user)
+        expired = timezone.now() - timedelta(days=1)
+        assign_perm('change_post', self.user, self.post)
+        assign_perm('delete_post', self.group, self.post)
+        assign_perm('change_post', self.organization, self.other_post)
+        assign_perm('delete_post', self.user, self.other_post)
+        assign_perm('delete_post', self.group, self.other_post)
+        UserObjectPermission.objects.filter(permission__codename='delete_post').update(permission_expiry=expired)
+        refresh_effective_obj_perms([self.user.pk])
+
+        def decisions():
+            return [ObjectPermissionChecker(self.user).has_perm(perm, post, permission_expiry=permission_expiry)
+                    for perm in ('change_post', 'delete_post') for post in (self.post, self.other_post)
+                    for permission_expiry in (False, True)]
+
+        enabled = decisions()
+        with mock.patch('guardian.conf.settings.EFFECTIVE_OBJ_PERMS', False):
+            self.assertEqual(enabled, decisions())
+        self.assertEqual(enabled, [True, True, True, True, False, False, True, False])
+
+    def test_get_objects_for_user(self):
+        self.user.groups.add(self.group)
+        assign_perm('change_post', self.group, self.post)
+        assign_perm('delete_post', self.user, self.post)
+        assign_perm('delete_post', self.user, self.other_post)
+
+        self.assertEqual(set(get_objects_for_user(self.user, 'testapp.delete_post')), {self.post, self.other_post})
+        self.assertEqual(list(get_objects_for_user(self.user, ['testapp.change_post', 'testapp.delete_post'])),
+                         [self.post])
+        self.assertEqual(set(get_objects_for_user(self.user, ['testapp.change_post', 'testapp.delete_post'],
+                                                  any_perm=True)), {self.post, self.other_post})
+
+    def test_rebuild(self):
+        assign_perm('change_post', self.user, self.post)
+        EffectiveObjectPermission.objects.all().delete()
+        out = StringIO()
+
+        call_command('rebuild_effective_obj_perms', stdout=out)
+
+        self.assertIn("Rebuilt effective object permissions of", out.getvalue())
+        self.assertEqual(self.effective(), {(str(self.post.pk), 'change_post')})
@@ -0,0 +1,221 @@
+from datetime import timedelta
+from io import StringIO
+
+import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from guardian.models import ArchivedObjectPermission, GroupObjectPermission, UserObjectPermission
+from guardian.shortcuts import renew_perms
+from guardian.signals import obj_perms_bulk_changed
+from guardian.testapp.models import Post
+from guardian.utils import purge_expired_obj_perms, sweep_expiring_obj_perms
+
+User = get_user_model()
+
+
+class ExpiryTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.ctype = ContentType.objects.get_for_model(Post)
+        self.change_post = Permission.objects.get(content_type=self.ctype, codename='change_post')
+        self.now = timezone.now()
+
+    def grant(self, model, identity, post, expiry, **kwargs):
+        kwargs[model.objects.user_or_group_field] = identity
+        return model.objects.create(permission=self.change_post, content_type=self.ctype,
+                                    object_pk=str(post.pk), permission_expiry=expiry, **kwargs)
+
+
+class SweepExpiringObjPermsTest(ExpiryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.expired = self.grant(UserObjectPermission, self.user, Post.objects.create(title='expired'),
+                                  self.now - timedelta(days=1))
+        self.soon = self.grant(GroupObjectPermission, self.group, Post.objects.create(title='soon'),
+                               self.now + timedelta(days=10))
+        self.later = self.grant(UserObjectPermission, self.user, Post.objects.create(title='later'),
+                                self.now + timedelta(days=60))
+        self.never = self.grant(UserObjectPermission, self.user, Post.objects.create(title='never'), None)
+        self.unsubscribed = self.grant(UserObjectPermission, self.user, Post.objects.create(title='quiet'),
+                                       self.now - timedelta(days=1),
+                                       permission_expiry_0day_email_sent=True,
+                                       permission_expiry_30day_email_sent=True)
+
+    def test_sweep(self):
+        callback = mock.Mock(return_value=None)
+
+        flagged = sweep_expiring_obj_perms(callback=callback, now=self.now)
+
+        self.assertEqual(flagged, {'0day': 1, '30day': 1})
+        callback.assert_any_call(UserObjectPermission, '0day', [self.expired])
+        callback.assert_any_call(GroupObjectPermission, '30day', [self.soon])
+        self.assertEqual(callback.call_count, 2)
+        self.expired.refresh_from_db()
+        self.soon.refresh_from_db()
+        self.later.refresh_from_db()
+        self.assertTrue(self.expired.permission_expiry_0day_email_sent)
+        self.assertTrue(self.soon.permission_expiry_30day_email_sent)
+        self.assertFalse(self.soon.permission_expiry_0day_email_sent)
+        self.assertFalse(self.later.permission_expiry_30day_email_sent)
+
+        # flagged grants are not offered again
+        callback.reset_mock()
+        self.assertEqual(sweep_expiring_obj_perms(callback=callback, now=self.now), {'0day': 0, '30day': 0})
+        callback.assert_not_called()
+
+    def test_sweep_batches(self):
+        posts = [Post.objects.create(title='post %d' % i) for i in range(5)]
+        for i, post in enumerate(posts):
+            self.grant(UserObjectPermission, self.user, post, self.now + timedelta(days=1, minutes=i))
+        batches = []
+
+        def callback(model, threshold, grants):
+            batches.append([grant.object_pk for grant in grants])
+
+        sweep_expiring_obj_perms(callback=callback, thresholds=['30day'], batch_size=2, now=self.now)
+
+        self.assertEqual(batches, [[str(posts[0].pk), str(posts[1].pk)],
+                                   [str(posts[2].pk), str(posts[3].pk)],
+                                   [str(posts[4].pk)],
+                                   [str(self.soon.object_pk)]])
+
+    def test_sweep_partially_notified(self):
+        flagged = sweep_expiring_obj_perms(callback=lambda model, threshold, grants: [],
+                                           thresholds=['0day'], now=self.now)
+
+        self.assertEqual(flagged, {'0day': 0})
+        self.expired.refresh_from_db()
+        self.assertFalse(self.expired.permission_expiry_0day_email_sent)
+
+    def test_sweep_counts_flagged_grants_of_batch(self):
+        def callback(model, threshold, grants):
+            # grants outside of the batch, flagged or not, are not counted
+            return [grant.pk for grant in grants] + [self.unsubscribed.pk, self.later.pk, 0]
+
+        flagged = sweep_expiring_obj_perms(callback=callback, thresholds=['0day'], now=self.now)
+
+        self.assertEqual(flagged, {'0day': 1})
+        self.later.refresh_from_db()
+        self.assertFalse(self.later.permission_expiry_0day_email_sent)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('guardian_expiry_sweep', threshold=['0day'], stdout=out)
+
+        self.assertIn("Flagged 1 object permission entries crossing the 0day expiry threshold",
+                      out.getvalue())
+        self.expired.refresh_from_db()
+        self.assertTrue(self.expired.permission_expiry_0day_email_sent)
+
+
+class PurgeExpiredObjPermsTest(ExpiryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old = self.grant(UserObjectPermission, self.user, Post.objects.create(title='old'),
+                              self.now - timedelta(days=100))
+        self.recent = self.grant(GroupObjectPermission, self.group, Post.objects.create(title='recent'),
+                                 self.now - timedelta(days=1))
+        self.active = self.grant(UserObjectPermission, self.user, Post.objects.create(title='active'),
+                                 self.now + timedelta(days=1))
+        self.never = self.grant(UserObjectPermission, self.user, Post.objects.create(title='never'), None)
+
+    def test_purge_archives(self):
+        purged = purge_expired_obj_perms(days=30, now=self.now)
+
+        self.assertEqual(purged[UserObjectPermission], 1)
+        self.assertEqual(purged[GroupObjectPermission], 0)
+        self.assertFalse(UserObjectPermission.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(UserObjectPermission.objects.count(), 2)
+        archived = ArchivedObjectPermission.objects.get()
+        self.assertEqual(archived.source, 'guardian.userobjectpermission')
+        self.assertEqual(archived.source_pk, self.old.pk)
+        self.assertEqual(archived.identity_id, str(self.user.pk))
+        self.assertEqual(archived.object_pk, self.old.object_pk)
+        self.assertEqual(archived.permission, self.change_post)
+
+    def test_purge_deletes_in_batches(self):
+        for i in range(4):
+            self.grant(UserObjectPermission, self.user, Post.objects.create(title='expired %d' % i),
+                       self.now - timedelta(days=2))
+        progress = mock.Mock()
+        received = []
+
+        def receiver(sender, action, rows, **kwargs):
+            received.append((sender, action, len(rows)))
+
+        obj_perms_bulk_changed.connect(receiver)
+        try:
+            purged = purge_expired_obj_perms(archive=False, batch_size=2, now=self.now, progress=progress)
+        finally:
+            obj_perms_bulk_changed.disconnect(receiver)
+
+        self.assertEqual(purged[UserObjectPermission], 5)
+        self.assertEqual(purged[GroupObjectPermission], 1)
+        self.assertFalse(ArchivedObjectPermission.objects.exists())
+        self.assertEqual(set(UserObjectPermission.objects.values_list('pk', flat=True)),
+                         {self.active.pk, self.never.pk})
+        self.assertEqual(received, [(UserObjectPermission, 'delete', 2)] * 2 +
+                                   [(UserObjectPermission, 'delete', 1),
+                                    (GroupObjectPermission, 'delete', 1)])
+        progress.assert_any_call(UserObjectPermission, 5)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('purge_expired_obj_perms', days=30, stdout=out)
+
+        self.assertIn("Purged 1 expired object permission entries", out.getvalue())
+        self.assertEqual(ArchivedObjectPermission.objects.count(), 1)
+
+
+class RenewPermsTest(ExpiryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.expired = self.grant(UserObjectPermission, self.user, Post.objects.create(title='expired'),
+                                  self.now - timedelta(days=10), permission_expiry_0day_email_sent=True)
+        self.active = self.grant(UserObjectPermission, self.user, Post.objects.create(title='active'),
+                                 self.now + timedelta(days=10), permission_expiry_30day_email_sent=True)
+        self.never = self.grant(GroupObjectPermission, self.group, Post.objects.create(title='never'), None)
+
+    def test_renew(self):
+        renewed = renew_perms({'permission': self.change_post}, timedelta(days=365), batch_size=2, now=self.now)
+
+        self.assertEqual(renewed[UserObjectPermission], 2)
+        self.assertEqual(renewed[GroupObjectPermission], 1)
+        for grant in (self.expired, self.active, self.never):
+            grant.refresh_from_db()
+            self.assertFalse(grant.permission_expiry_0day_email_sent)
+            self.assertFalse(grant.permission_expiry_30day_email_sent)
+        self.assertEqual(self.expired.permission_expiry, self.now + timedelta(days=365))
+        self.assertEqual(self.active.permission_expiry, self.now + timedelta(days=375))
+        self.assertEqual(self.never.permission_expiry, self.now + timedelta(days=365))
+
+    def test_renew_queryset(self):
+        received = []
+
+        def receiver(sender, action, rows, **kwargs):
+            received.append((sender, action, [row['pk'] for row in rows]))
+
+        obj_perms_bulk_changed.connect(receiver)
+        try:
+            renewed = renew_perms(UserObjectPermission.objects.filter(pk=self.active.pk), timedelta(days=1),
+                                  subscribe_to_emails=False, now=self.now)
+        finally:
+            obj_perms_bulk_changed.disconnect(receiver)
+
+        self.assertEqual(renewed, {UserObjectPermission: 1})
+        self.assertEqual(received, [(UserObjectPermission, 'update', [self.active.pk])])
+        self.active.refresh_from_db()
+        self.expired.refresh_from_db()
+        self.assertEqual(self.active.permission_expiry, self.now + timedelta(days=11))
+        self.assertTrue(self.active.permission_expiry_0day_email_sent)
+        self.assertEqual(self.expired.permission_expiry, self.now - timedelta(days=10))
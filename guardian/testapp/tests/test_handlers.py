@@ -0,0 +1,112 @@
+import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from guardian.handlers import PendingTargets, is_obj_perms_cleanup_registered, register_obj_perms_cleanup, \
+    unregister_obj_perms_cleanup
+from guardian.models import GroupObjectPermission, UserObjectPermission
+from guardian.testapp.models import Post
+
+User = get_user_model()
+
+
+class ObjPermsCleanupTest(TransactionTestCase):
+
+    def setUp(self):
+        register_obj_perms_cleanup(Post)
+        self.addCleanup(unregister_obj_perms_cleanup, Post)
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.ctype = ContentType.objects.get_for_model(Post)
+        self.change_post = Permission.objects.get(content_type=self.ctype, codename='change_post')
+        self.posts = [Post.objects.create(title='post %d' % i) for i in range(3)]
+        for post in self.posts:
+            UserObjectPermission.objects.create(user=self.user, permission=self.change_post,
+                                                content_type=self.ctype, object_pk=str(post.pk))
+            GroupObjectPermission.objects.create(group=self.group, permission=self.change_post,
+                                                 content_type=self.ctype, object_pk=str(post.pk))
+
+    def remaining(self, model):
+        return sorted(model.objects.values_list('object_pk', flat=True))
+
+    def test_registered(self):
+        self.assertTrue(is_obj_perms_cleanup_registered(Post))
+        self.assertFalse(is_obj_perms_cleanup_registered(Group))
+
+    def test_delete(self):
+        self.posts[0].delete()
+
+        self.assertEqual(self.remaining(UserObjectPermission), [str(self.posts[1].pk), str(self.posts[2].pk)])
+        self.assertEqual(self.remaining(GroupObjectPermission), [str(self.posts[1].pk), str(self.posts[2].pk)])
+
+    def test_bulk_delete(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                Post.objects.filter(pk__in=[self.posts[0].pk, self.posts[1].pk]).delete()
+                self.assertEqual(UserObjectPermission.objects.count(), 3)
+
+        deletes = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].startswith('DELETE') and 'objectpermission' in q['sql']]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(self.remaining(UserObjectPermission), [str(self.posts[2].pk)])
+        self.assertEqual(self.remaining(GroupObjectPermission), [str(self.posts[2].pk)])
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Post.objects.filter(pk=self.posts[0].pk).delete()
+                raise ValueError
+
+        self.assertEqual(UserObjectPermission.objects.count(), 3)
+        Post.objects.filter(pk=self.posts[1].pk).delete()
+        self.assertEqual(self.remaining(UserObjectPermission), [str(self.posts[0].pk), str(self.posts[2].pk)])
+
+    def test_savepoint_rollback(self):
+        with transaction.atomic():
+            Post.objects.filter(pk=self.posts[0].pk).delete()
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    Post.objects.filter(pk=self.posts[1].pk).delete()
+                    raise ValueError
+
+        self.assertEqual(self.remaining(UserObjectPermission), [str(self.posts[1].pk), str(self.posts[2].pk)])
+        self.assertEqual(self.remaining(GroupObjectPermission), [str(self.posts[1].pk), str(self.posts[2].pk)])
+
+    def test_single_hook(self):
+        scheduled = []
+
+        def on_commit(func, using=None):
+            # not keeping ``func``, which would keep dropped hooks alive
+            scheduled.append(using)
+            commit_hook(func, using)
+
+        commit_hook = transaction.on_commit
+        with mock.patch('guardian.handlers.transaction.on_commit', on_commit):
+            with transaction.atomic():
+                with self.assertRaises(ValueError):
+                    with transaction.atomic():
+                        Post.objects.filter(pk=self.posts[0].pk).delete()
+                        raise ValueError
+                Post.objects.filter(pk__in=[self.posts[1].pk, self.posts[2].pk]).delete()
+
+        # one hook per deletion, plus one replacing the rolled back hook
+        self.assertEqual(len(scheduled), 2)
+        self.assertEqual(self.remaining(UserObjectPermission), [str(self.posts[0].pk)])
+
+    def test_flush_batches(self):
+        pending = PendingTargets('default')
+        for post in self.posts:
+            pending.add(post)
+        Post.objects.filter(pk=self.posts[0].pk).delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            pending.flush(batch_size=2)
+
+        selects = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].startswith('SELECT') and 'testapp_post' in q['sql']]
+        self.assertEqual(len(selects), 2)
+        self.assertEqual(self.remaining(UserObjectPermission), [str(self.posts[1].pk), str(self.posts[2].pk)])
@@ -1,11 +1,16 @@
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ImproperlyConfigured
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.test.client import RequestFactory
+from django.views.generic import DetailView
 from django.views.generic import View
+from django.views.generic.detail import SingleObjectMixin
 from django.views.generic import ListView
 
 from guardian.shortcuts import assign_perm
@@ -41,12 +46,37 @@ class GlobalNoObjectView(PermissionRequiredMixin, RemoveDatabaseView):
     accept_global_perms = True
 
 
+class AsyncPostView(LoginRequiredMixin, PermissionRequiredMixin, SingleObjectMixin, View):
+    model = Post
+    permission_required = 'testapp.change_post'
+    raise_exception = True
+
+    async def get(self, request, *args, **kwargs):
+        return HttpResponse(self.get_permission_object().title)
+
+
+class PostDetailView(PermissionRequiredMixin, DetailView):
+    model = Post
+    permission_required = 'testapp.change_post'
+    return_403 = True
+
+    def render_to_response(self, context, **response_kwargs):
+        return HttpResponse(' '.join(sorted(context.get('object_perms') or [context['object'].title])))
+
+
 class PostPermissionListView(PermissionListMixin, ListView):
     model = Post
     permission_required = 'testapp.change_post'
     template_name = 'list.html'
 
 
+class PostPermissionPrefetchListView(PostPermissionListView):
+    prefetch_object_permissions = ['testapp.change_post', 'delete_post']
+    template_name = 'list_perms.html'
+    ordering = 'title'
+    paginate_by = 2
+
+
 class TestViewMixins(TestCase):
 
     def setUp(self):
@@ -174,6 +204,33 @@ class TestViewMixins(TestCase):
         with self.assertRaises(DatabaseRemovedError):
             view(request)
 
+    def test_permission_object_fetched_once(self):
+        request = self.factory.get('/')
+        request.user = self.user
+        request.user.add_obj_perm('change_post', self.post)
+        view = PostDetailView.as_view()
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request, pk=self.post.pk)
+        self.assertEqual(response.content, b'foo-post-title')
+        post_queries = [q for q in queries if 'FROM "testapp_post"' in q['sql']]
+        self.assertEqual(len(post_queries), 1)
+
+    def test_prefetch_object_perms(self):
+        request = self.factory.get('/')
+        request.user = self.user
+        request.user.add_obj_perm('change_post', self.post)
+        request.user.add_obj_perm('delete_post', self.post)
+        view = PostDetailView.as_view(prefetch_object_perms=True)
+        # the post, user's organizations and user's permissions for the post
+        with self.assertNumQueries(3):
+            response = view(request, pk=self.post.pk)
+        self.assertEqual(response.content, b'change_post delete_post')
+
+        request.user = get_user_model().objects.create_user('jane', 'jane@doe.com', 'doe')
+        request.user.add_obj_perm('delete_post', self.post)
+        response = view(request, pk=self.post.pk)
+        self.assertEqual(response.status_code, 403)
+
     def test_login_required_mixin(self):
 
         class SecretView(LoginRequiredMixin, View):
@@ -212,3 +269,51 @@ class TestViewMixins(TestCase):
 
         response = view(request)
         self.assertContains(response, b'foo-post-title')
+
+    def test_list_prefetch_object_permissions(self):
+        request = self.factory.get('/some-secret-list/')
+        request.user = self.user
+        posts = [self.post] + [Post.objects.create(title='post-%s' % i) for i in range(2)]
+        for post in posts:
+            request.user.add_obj_perm('change_post', post)
+        request.user.add_obj_perm('delete_post', posts[1])
+
+        view = PostPermissionPrefetchListView.as_view()
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+        # permissions are fetched at once, only for objects of the page
+        prefetch_queries = [q for q in queries if '"object_pk" IN (' in q['sql']]
+        self.assertEqual(len(prefetch_queries), 1)
+        self.assertIn("IN ('%s', '%s')" % (posts[0].pk, posts[1].pk), prefetch_queries[0]['sql'])
+        with self.assertNumQueries(0):
+            response.render()
+        self.assertEqual(response.content.decode().strip(),
+                         'foo-post-title:change_post:1;post-0:change_post,delete_post:2;')
+
+    def test_list_prefetch_object_permissions_anonymous(self):
+        request = self.factory.get('/some-secret-list/')
+        request.user = AnonymousUser()
+        self.user.add_obj_perm('change_post', self.post)
+
+        view = PostPermissionPrefetchListView.as_view()
+        response = view(request)
+        response.render()
+        self.assertEqual(response.content.decode().strip(), '')
+
+    def test_async_view(self):
+        view = AsyncPostView.as_view()
+
+        async def get(user):
+            request = self.factory.get('/')
+            request.user = user
+            return await view(request, pk=self.post.pk)
+
+        response = async_to_sync(get)(AnonymousUser())
+        self.assertEqual(response.status_code, 302)
+        with self.assertRaises(PermissionDenied):
+            async_to_sync(get)(self.user)
+
+        self.user.add_obj_perm('change_post', self.post)
+        response = async_to_sync(get)(self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'foo-post-title')
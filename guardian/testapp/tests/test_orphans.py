@@ -1,3 +1,6 @@
+from io import StringIO
+
+import mock
 from django.apps import apps as django_apps
 auth_app = django_apps.get_app_config("auth")
 
@@ -9,7 +12,8 @@ from django.test import TestCase
 
 from guardian.utils import clean_orphan_obj_perms
 from guardian.shortcuts import assign_perm
-from guardian.models import Group
+from guardian.models import Group, UserObjectPermission
+from guardian.testapp.models import NonIntPKModel, Post
 from guardian.testapp.tests.conf import skipUnlessTestApp
 
 
@@ -95,3 +99,48 @@ class OrphanedObjectPermissionsTest(TestCase):
             target.save()
             for perm in perms:
                 self.assertFalse(self.user.has_perm(perm, target))
+
+
+@skipUnlessTestApp
+class CleanOrphanObjPermsBatchesTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.posts = [Post.objects.create(title='post %d' % i) for i in range(5)]
+        self.char_pks = [NonIntPKModel.objects.create(char_pk='key-%d' % i) for i in range(3)]
+        for obj in self.posts + self.char_pks:
+            assign_perm('change_%s' % obj._meta.model_name, self.user, obj)
+        for obj in self.posts[:3] + self.char_pks[:1]:
+            obj.delete()
+
+    def test_clean_in_batches(self):
+        progress = mock.Mock()
+
+        removed = clean_orphan_obj_perms(batch_size=2, progress=progress)
+
+        self.assertEqual(removed, 4)
+        self.assertEqual(set(UserObjectPermission.objects.values_list('object_pk', flat=True)),
+                         {str(post.pk) for post in self.posts[3:]} | {'key-1', 'key-2'})
+        progress.assert_any_call(UserObjectPermission, ContentType.objects.get_for_model(Post), 3)
+
+    def test_dry_run(self):
+        self.assertEqual(clean_orphan_obj_perms(dry_run=True), 4)
+        self.assertEqual(UserObjectPermission.objects.count(), 8)
+
+    def test_content_types(self):
+        removed = clean_orphan_obj_perms(content_types=[ContentType.objects.get_for_model(NonIntPKModel)])
+
+        self.assertEqual(removed, 1)
+        self.assertEqual(UserObjectPermission.objects.count(), 7)
+
+    @mock.patch('guardian.utils._get_orphan_obj_perms_queryset', return_value=None)
+    def test_clean_without_anti_join(self, mocked_queryset):
+        self.assertEqual(clean_orphan_obj_perms(batch_size=2), 4)
+        self.assertEqual(UserObjectPermission.objects.count(), 4)
+
+    def test_command_options(self):
+        out = StringIO()
+        call_command("clean_orphan_obj_perms", dry_run=True, ctypes=['testapp.post'], stdout=out)
+
+        self.assertIn("Found 3 object permission entries with no targets", out.getvalue())
+        self.assertEqual(UserObjectPermission.objects.count(), 8)
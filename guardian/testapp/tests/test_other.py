@@ -8,7 +8,9 @@ from django.contrib.auth.models import Group
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 import guardian
 from guardian.backends import ObjectPermissionBackend
@@ -236,6 +238,30 @@ class ObjectPermissionBackendTests(TestCase):
         self.assertRaises(WrongAppError, self.backend.has_perm,
                           self.user, "no_app.change_user", self.user)
 
+    def test_has_perms_noobj(self):
+        result = self.backend.has_perms(self.user, ["change_contenttype"])
+        self.assertFalse(result)
+
+    def test_has_perms_wrong_app(self):
+        self.assertRaises(WrongAppError, self.backend.has_perms,
+                          self.user, ["change_user", "no_app.change_user"], self.user)
+
+    def test_has_perms_single_fetch(self):
+        ctype = ContentType.objects.create(
+            model='bar', app_label='fake-for-guardian-tests')
+        UserObjectPermission.objects.assign_perm('change_contenttype', self.user, ctype)
+        UserObjectPermission.objects.assign_perm('delete_contenttype', self.user, ctype)
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as single:
+            self.backend.has_perm(user, 'change_contenttype', ctype, check_permission_expiry=False)
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(len(single)):
+            self.assertTrue(self.backend.has_perms(user, ['contenttypes.change_contenttype',
+                                                          'delete_contenttype'], ctype,
+                                                   check_permission_expiry=False))
+        self.assertFalse(self.backend.has_perms(self.user, ['change_contenttype', 'add_contenttype'], ctype,
+                                                check_permission_expiry=False))
+
     def test_obj_is_not_model(self):
         for obj in (Group, 666, "String", [2, 1, 5, 7], {}):
             self.assertFalse(self.backend.has_perm(self.user,
@@ -1,11 +1,19 @@
 import warnings
+from datetime import timedelta
+from io import StringIO
 
 import django
+import mock
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
 from django.db.models.query import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import skipIf
 
 from guardian.shortcuts import get_perms_for_model
 from guardian.core import ObjectPermissionChecker
@@ -20,13 +28,24 @@ from guardian.shortcuts import get_users_with_perms
 from guardian.shortcuts import get_groups_with_perms
 from guardian.shortcuts import get_objects_for_user
 from guardian.shortcuts import get_objects_for_group
+from guardian.shortcuts import filter_pks_for_user
+from guardian.shortcuts import iter_objects_for_user
+from guardian.shortcuts import count_objects_for_group
+from guardian.shortcuts import count_objects_for_user
+from guardian.shortcuts import get_users_with_perms_bulk
+from guardian.shortcuts import permission_matrix
+from guardian.shortcuts import get_objects_for_organization
+from guardian.handlers import register_obj_perms_cleanup, unregister_obj_perms_cleanup
+from organizations.models import Organization
+from guardian import shortcuts
 from guardian.exceptions import MixedContentTypeError
 from guardian.exceptions import NotUserNorGroup
 from guardian.exceptions import WrongAppError
 from guardian.exceptions import MultipleIdentityAndObjectError
-from guardian.testapp.models import NonIntPKModel, ChildTestModel
+from guardian.testapp.models import NonIntPKModel, ChildTestModel, Post, UUIDPKModel
 from guardian.testapp.tests.test_core import ObjectPermissionTestCase
-from guardian.models import Group, Permission
+from guardian.models import Group, Permission, UserObjectPermission
+from guardian.utils import rebuild_effective_obj_perms
 
 
 User = get_user_model()
@@ -1255,3 +1274,364 @@ class GetObjectsForGroup(TestCase):
     def test_exception_different_ctypes(self):
         self.assertRaises(MixedContentTypeError, get_objects_for_group,
                           self.group1, ['auth.change_permission', 'auth.change_group'])
+
+
+class NativeObjectPkTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.post = Post.objects.create(title='post')
+        self.uuid_obj = UUIDPKModel.objects.create()
+        self.char_obj = NonIntPKModel.objects.create(char_pk='testprimarykey')
+        assign_perm('testapp.change_post', self.user, self.post)
+        assign_perm('testapp.change_uuidpkmodel', self.user, self.uuid_obj)
+        assign_perm('testapp.change_nonintpkmodel', self.user, self.char_obj)
+
+    def get_obj_perm(self, obj):
+        return UserObjectPermission.objects.get(
+            content_type=ContentType.objects.get_for_model(obj), object_pk=obj.pk)
+
+    def test_filled_on_save(self):
+        self.assertEqual(self.get_obj_perm(self.post).object_pk_int, self.post.pk)
+        self.assertIsNone(self.get_obj_perm(self.post).object_pk_uuid)
+        self.assertEqual(self.get_obj_perm(self.uuid_obj).object_pk_uuid, self.uuid_obj.pk)
+        self.assertIsNone(self.get_obj_perm(self.uuid_obj).object_pk_int)
+        self.assertIsNone(self.get_obj_perm(self.char_obj).object_pk_int)
+        self.assertIsNone(self.get_obj_perm(self.char_obj).object_pk_uuid)
+
+    @mock.patch('guardian.conf.settings.NATIVE_OBJECT_PK', True)
+    def test_get_objects_for_user(self):
+        Post.objects.create(title='other')
+        UUIDPKModel.objects.create()
+
+        posts = get_objects_for_user(self.user, 'testapp.change_post', any_perm=True)
+        uuid_objs = get_objects_for_user(self.user, 'testapp.change_uuidpkmodel', any_perm=True)
+        char_objs = get_objects_for_user(self.user, 'testapp.change_nonintpkmodel', any_perm=True)
+
+        self.assertIn('object_pk_int', str(posts.query))
+        self.assertNotIn('CAST', str(posts.query))
+        self.assertEqual(list(posts), [self.post])
+        self.assertIn('object_pk_uuid', str(uuid_objs.query))
+        self.assertEqual(list(uuid_objs), [self.uuid_obj])
+        self.assertEqual(list(char_objs), [self.char_obj])
+
+    @mock.patch('guardian.conf.settings.NATIVE_OBJECT_PK', True)
+    def test_other_lookups(self):
+        group = Group.objects.create(name='editors')
+        organization = Organization.objects.create(name='acme')
+        assign_perm('testapp.delete_post', group, self.post)
+        assign_perm('testapp.delete_uuidpkmodel', organization, self.uuid_obj)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ObjectPermissionChecker(self.user).get_perms(self.post), ['change_post'])
+            checker = ObjectPermissionChecker(self.user)
+            checker.prefetch_perms([self.post])
+            self.assertEqual(checker.get_perms(self.post, permission_expiry=True), ['change_post'])
+            self.assertEqual(list(get_users_with_perms(self.post)), [self.user])
+            self.assertEqual(list(get_groups_with_perms(self.post)), [group])
+            self.assertEqual(get_groups_with_perms(self.post, attach_perms=True), {group: ['delete_post']})
+            self.assertEqual(list(get_objects_for_organization(organization, 'testapp.delete_uuidpkmodel')),
+                             [self.uuid_obj])
+        # Text object_pk is selected, but never filtered by
+        self.assertEqual([query['sql'] for query in queries if '"object_pk" ' in query['sql'].split('WHERE', 1)[-1]],
+                         [])
+        self.assertEqual(list(ObjectPermissionChecker(self.user).get_perms(self.char_obj)),
+                         ['change_nonintpkmodel'])
+
+    def test_backfill(self):
+        UserObjectPermission.objects.update(object_pk_int=None, object_pk_uuid=None)
+        out = StringIO()
+
+        call_command('backfill_native_object_pks', stdout=out)
+
+        self.assertIn("Filled native object pk of 2 object permission entries", out.getvalue())
+        self.assertEqual(self.get_obj_perm(self.post).object_pk_int, self.post.pk)
+        self.assertEqual(self.get_obj_perm(self.uuid_obj).object_pk_uuid, self.uuid_obj.pk)
+
+
+class MatchObjPermPksTest(TestCase):
+    rows = [('1', 10), ('1', 11), ('2', 10), ('3', 11), ('3', 10), ('3', 10), ('4', 12)]
+
+    def check(self):
+        match = shortcuts._match_obj_perm_pks
+        self.assertEqual(sorted(map(int, match(iter(self.rows), 2, integer_pks=True))), [1, 3])
+        self.assertEqual(sorted(map(int, match(iter(self.rows), 3, any_perm=True, integer_pks=True))),
+                         [1, 2, 3, 4])
+        self.assertEqual(list(match(iter(self.rows), 4, integer_pks=True)), [])
+        self.assertEqual(list(match(iter([]), 1, integer_pks=True)), [])
+
+    @mock.patch('guardian.shortcuts.numpy', None)
+    def test_python(self):
+        self.check()
+        self.assertEqual(sorted(shortcuts._match_obj_perm_pks(iter(self.rows), 2)), ['1', '3'])
+
+    @skipIf(shortcuts.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        self.check()
+
+
+class FilterPksForUserTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.user.groups.add(self.group)
+        self.posts = [Post.objects.create(title='post %s' % i) for i in range(4)]
+        self.pks = [post.pk for post in reversed(self.posts)]
+
+    def test_all_perms(self):
+        assign_perm('change_post', self.user, self.posts[0])
+        assign_perm('delete_post', self.group, self.posts[0])
+        assign_perm('change_post', self.user, self.posts[1])
+        assign_perm('delete_post', self.group, self.posts[2])
+        self.assertEqual(filter_pks_for_user(self.user, ['testapp.change_post', 'testapp.delete_post'], self.pks),
+                         [self.posts[0].pk])
+        self.assertEqual(filter_pks_for_user(self.user, ['testapp.change_post', 'testapp.delete_post'], self.pks,
+                                             any_perm=True),
+                         [self.posts[2].pk, self.posts[1].pk, self.posts[0].pk])
+        self.assertEqual(filter_pks_for_user(self.user, ['testapp.delete_post'], self.pks, use_groups=False), [])
+
+    def test_matches_get_objects_for_user(self):
+        assign_perm('change_post', self.user, self.posts[1])
+        assign_perm('change_post', self.group, self.posts[3])
+        expected = set(get_objects_for_user(self.user, 'testapp.change_post').values_list('pk', flat=True))
+        self.assertEqual(set(filter_pks_for_user(self.user, 'testapp.change_post', self.pks)), expected)
+
+    def test_string_pks(self):
+        assign_perm('change_post', self.user, self.posts[1])
+        self.assertEqual(filter_pks_for_user(self.user, 'testapp.change_post', [str(self.posts[1].pk), '999']),
+                         [self.posts[1].pk])
+
+    def test_non_int_pks(self):
+        obj = NonIntPKModel.objects.create(char_pk='foo')
+        NonIntPKModel.objects.create(char_pk='bar')
+        assign_perm('testapp.change_nonintpkmodel', self.user, obj)
+        self.assertEqual(filter_pks_for_user(self.user, 'change_nonintpkmodel', ['bar', 'foo'], klass=NonIntPKModel),
+                         ['foo'])
+
+    def test_superuser(self):
+        self.user.is_superuser = True
+        with self.assertNumQueries(1):
+            self.assertEqual(filter_pks_for_user(self.user, 'testapp.change_post', self.pks), self.pks)
+
+    def test_global_perms(self):
+        self.user.user_permissions.add(Permission.objects.get(codename='change_post'))
+        self.assertEqual(filter_pks_for_user(self.user, 'testapp.change_post', self.pks), self.pks)
+        self.assertEqual(filter_pks_for_user(self.user, 'testapp.change_post', self.pks,
+                                             accept_global_perms=False), [])
+
+
+class IterObjectsForUserTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.user.groups.add(self.group)
+        self.posts = [Post.objects.create(title='post %s' % i) for i in range(7)]
+        for post in self.posts[1:6]:
+            assign_perm('change_post', self.user, post)
+        for post in self.posts[3:]:
+            assign_perm('delete_post', self.group, post)
+
+    def test_chunks(self):
+        self.assertEqual(list(iter_objects_for_user(self.user, 'testapp.change_post', chunk_size=2)),
+                         self.posts[1:6])
+        self.assertEqual(list(iter_objects_for_user(self.user, 'testapp.change_post', chunk_size=5)),
+                         self.posts[1:6])
+
+    def test_pks_only(self):
+        self.assertEqual(list(iter_objects_for_user(self.user, 'testapp.delete_post', chunk_size=3, pks_only=True)),
+                         [post.pk for post in self.posts[3:]])
+
+    def test_all_and_any_perms(self):
+        perms = ['testapp.change_post', 'testapp.delete_post']
+        self.assertEqual(list(iter_objects_for_user(self.user, perms, chunk_size=2)), self.posts[3:6])
+        self.assertEqual(list(iter_objects_for_user(self.user, perms, chunk_size=2, any_perm=True)),
+                         self.posts[1:])
+
+    def test_keyset_pagination(self):
+        iterator = iter_objects_for_user(self.user, 'testapp.change_post', chunk_size=2)
+        self.assertEqual(next(iterator), self.posts[1])
+        next(iterator)
+        with self.assertNumQueries(1) as context:
+            next(iterator)
+        sql = context.captured_queries[0]['sql']
+        self.assertIn('"testapp_post"."id" > %s' % self.posts[2].pk, sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_no_objects(self):
+        self.assertEqual(list(iter_objects_for_user(User.objects.create(username='jane'), 'testapp.change_post')),
+                         [])
+
+
+class CountObjectsForUserTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.group = Group.objects.create(name='editors')
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.user.groups.add(self.group)
+        self.organization.users.add(self.user)
+        self.posts = [Post.objects.create(title='post %s' % i) for i in range(6)]
+        for post in self.posts[:4]:
+            assign_perm('change_post', self.user, post)
+        for post in self.posts[2:]:
+            assign_perm('delete_post', self.group, post)
+        assign_perm('change_post', self.group, self.posts[0])
+        assign_perm('change_post', self.organization, self.posts[5])
+
+    def check_counts(self):
+        for perms in ('testapp.change_post', 'testapp.delete_post',
+                      ['testapp.change_post', 'testapp.delete_post']):
+            for any_perm in (False, True):
+                expected = len(filter_pks_for_user(self.user, perms, [post.pk for post in self.posts],
+                                                   any_perm=any_perm))
+                self.assertEqual(count_objects_for_user(self.user, perms, any_perm=any_perm), expected,
+                                 (perms, any_perm))
+
+    def test_joined(self):
+        self.check_counts()
+        with self.assertNumQueries(1) as context:
+            count_objects_for_user(self.user, ['change_post', 'delete_post'], Post)
+        self.assertIn('"testapp_post"', context.captured_queries[0]['sql'])
+
+    def test_grants_only(self):
+        register_obj_perms_cleanup(Post)
+        self.addCleanup(unregister_obj_perms_cleanup, Post)
+        self.check_counts()
+        with self.assertNumQueries(1) as context:
+            self.assertEqual(count_objects_for_user(self.user, ['change_post', 'delete_post'], Post), 3)
+        self.assertNotIn('"testapp_post"', context.captured_queries[0]['sql'])
+
+    def test_filtered_klass(self):
+        register_obj_perms_cleanup(Post)
+        self.addCleanup(unregister_obj_perms_cleanup, Post)
+        queryset = Post.objects.exclude(pk=self.posts[0].pk)
+        self.assertEqual(count_objects_for_user(self.user, 'change_post', queryset), 4)
+
+    def test_approximate(self):
+        self.assertEqual(count_objects_for_user(self.user, 'testapp.change_post', approximate=True), 6)
+        self.assertEqual(count_objects_for_user(self.user, ['testapp.change_post', 'testapp.delete_post'],
+                                                approximate=True), 4)
+
+    def test_global_perms(self):
+        self.user.user_permissions.add(Permission.objects.get(codename='delete_post'))
+        self.assertEqual(count_objects_for_user(self.user, 'testapp.delete_post'), 6)
+        self.assertEqual(count_objects_for_user(self.user, ['testapp.change_post', 'testapp.delete_post']), 5)
+
+    def test_superuser(self):
+        self.user.is_superuser = True
+        self.assertEqual(count_objects_for_user(self.user, 'testapp.change_post'), 6)
+
+    def test_count_objects_for_group(self):
+        self.assertEqual(count_objects_for_group(self.group, 'testapp.delete_post'), 4)
+        self.assertEqual(count_objects_for_group(self.group, ['testapp.change_post', 'testapp.delete_post']), 0)
+        self.assertEqual(count_objects_for_group(self.group, ['testapp.change_post', 'testapp.delete_post'],
+                                                 any_perm=True), 5)
+
+
+class GetUsersWithPermsBulkTest(TestCase):
+
+    def setUp(self):
+        self.joe = User.objects.create(username='joe')
+        self.jane = User.objects.create(username='jane')
+        self.admin = User.objects.create(username='admin', is_superuser=True)
+        self.group = Group.objects.create(name='editors')
+        self.group.user_set.add(self.joe, self.jane)
+        Group.objects.create(name='empty')
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.organization.users.add(self.jane)
+        self.posts = [Post.objects.create(title='post %s' % i) for i in range(5)]
+        assign_perm('change_post', self.joe, self.posts[0])
+        assign_perm('view_post', self.group, self.posts[1])
+        assign_perm('delete_post', self.organization, self.posts[2])
+        assign_perm('change_post', Group.objects.get(name='empty'), self.posts[3])
+
+    def test_users(self):
+        expected = {
+            self.posts[0].pk: {self.joe.pk},
+            self.posts[1].pk: {self.joe.pk, self.jane.pk},
+            self.posts[2].pk: {self.jane.pk},
+            self.posts[3].pk: set(),
+            self.posts[4].pk: set(),
+        }
+        self.assertEqual(get_users_with_perms_bulk(Post.objects.all()), expected)
+        self.assertEqual(get_users_with_perms_bulk(Post, chunk_size=2), expected)
+        for post in self.posts:
+            self.assertEqual(expected[post.pk], set(get_users_with_perms(post).values_list('pk', flat=True)))
+
+    def test_constant_queries(self):
+        # pks, then users, groups and organizations grants for each chunk
+        with self.assertNumQueries(4):
+            get_users_with_perms_bulk(Post.objects.all())
+        with self.assertNumQueries(1 + 3 * 3):
+            get_users_with_perms_bulk(Post.objects.all(), chunk_size=2)
+
+    def test_perms(self):
+        users = get_users_with_perms_bulk(Post.objects.all(), ['change_post', 'delete_post'])
+        self.assertEqual(users[self.posts[1].pk], set())
+        self.assertEqual(users[self.posts[2].pk], {self.jane.pk})
+
+    def test_options(self):
+        users = get_users_with_perms_bulk(Post.objects.filter(pk__in=[self.posts[1].pk, self.posts[4].pk]),
+                                          with_group_users=False, with_superusers=True)
+        self.assertEqual(users, {self.posts[1].pk: {self.admin.pk}, self.posts[4].pk: {self.admin.pk}})
+
+
+class PermissionMatrixTest(TestCase):
+
+    def setUp(self):
+        self.joe = User.objects.create(username='joe')
+        self.jane = User.objects.create(username='jane')
+        self.admin = User.objects.create(username='admin', is_superuser=True)
+        self.inactive = User.objects.create(username='inactive', is_active=False)
+        self.users = [self.joe, self.jane, self.admin, self.inactive]
+        self.group = Group.objects.create(name='editors')
+        self.group.user_set.add(self.jane)
+        self.organization = Organization.objects.create(name='acme', slug='acme')
+        self.organization.users.add(self.joe)
+        self.posts = [Post.objects.create(title='post %s' % i) for i in range(3)]
+        assign_perm('change_post', self.joe, self.posts[0])
+        assign_perm('delete_post', self.organization, self.posts[0])
+        assign_perm('change_post', self.group, self.posts[1])
+        assign_perm('change_post', self.inactive, self.posts[2])
+
+    def test_matrix(self):
+        with self.assertNumQueries(2):
+            matrix = permission_matrix(self.users, self.posts, ['testapp.change_post'], permission_expiry=False)
+        self.assertEqual(matrix, [0b001, 0, 0b111, 0])
+        self.assertEqual(permission_matrix(self.users, self.posts, ['change_post', 'delete_post'],
+                                           permission_expiry=False), [0b001, 0, 0b111, 0])
+        self.assertEqual(permission_matrix(self.users, self.posts, ['change_post', 'delete_post'], any_perm=True,
+                                           permission_expiry=False), [0b001, 0, 0b111, 0])
+
+    def test_matches_checker(self):
+        assign_perm('change_post', self.organization, self.posts[2])
+        UserObjectPermission.objects.filter(user=self.joe).update(permission_expiry=timezone.now() - timedelta(days=1))
+        for permission_expiry in (False, True):
+            matrix = permission_matrix(self.users, self.posts, ['change_post', 'delete_post'], any_perm=True,
+                                       permission_expiry=permission_expiry)
+            for i, user in enumerate(self.users):
+                checker = ObjectPermissionChecker(user)
+                for j, post in enumerate(self.posts):
+                    expected = any(checker.has_perm(perm, post, permission_expiry=permission_expiry)
+                                   for perm in ('change_post', 'delete_post'))
+                    self.assertEqual(bool(matrix[i] & (1 << j)), expected)
+
+    @mock.patch('guardian.conf.settings.EFFECTIVE_OBJ_PERMS', True)
+    def test_effective_obj_perms(self):
+        rebuild_effective_obj_perms()
+        with self.assertNumQueries(1):
+            matrix = permission_matrix(self.users, self.posts, 'change_post', permission_expiry=False)
+        self.assertEqual(matrix, [0b001, 0, 0b111, 0])
+
+    def test_empty(self):
+        self.assertEqual(permission_matrix(self.users, [], 'change_post'), [0, 0, 0, 0])
+        self.assertEqual(permission_matrix([], self.posts, 'change_post'), [])
+
+    @skipIf(shortcuts.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        matrix = permission_matrix(self.users, self.posts, 'change_post', permission_expiry=False, as_numpy=True)
+        self.assertEqual(matrix.shape, (4, 3))
+        self.assertEqual(matrix.tolist(), [[True, False, False], [False, False, False],
+                                           [True, True, True], [False, False, False]])
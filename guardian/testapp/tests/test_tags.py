@@ -1,9 +1,12 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, AnonymousUser
 from django.contrib.contenttypes.models import ContentType
 from django.template import Template, Context, TemplateSyntaxError
 from django.test import TestCase
+from django.utils import timezone
 
 from guardian.core import ObjectPermissionChecker
 from guardian.exceptions import NotUserNorGroup
@@ -149,3 +152,36 @@ class GetObjPermsTagTest(TestCase):
         output = render(template, context)
 
         self.assertEqual(output, 'delete_contenttype')
+
+    def test_checker_none(self):
+        UserObjectPermission.objects.assign_perm("change_contenttype", self.user, self.ctype)
+
+        template = ''.join((
+            '{% load guardian_tags %}',
+            '{% get_obj_perms user for contenttype as "obj_perms" checker %}',
+            '{{ obj_perms|join:" " }}',
+        ))
+        context = {'user': self.user, 'contenttype': self.ctype, 'checker': None}
+        output = render(template, context)
+
+        self.assertEqual(output, 'change_contenttype')
+
+    def test_checker_expired(self):
+        UserObjectPermission.objects.assign_perm("change_contenttype", self.user, self.ctype)
+        UserObjectPermission.objects.update(permission_expiry=timezone.now() - timedelta(days=1))
+        checker = ObjectPermissionChecker(self.user)
+        checker.prefetch_perms([self.ctype])
+
+        template = ''.join((
+            '{% load guardian_tags %}',
+            '{% get_obj_perms user for contenttype as "obj_perms" %}',
+            '{{ obj_perms|join:" " }}|',
+            '{% get_obj_perms user for contenttype as "obj_perms" checker %}',
+            '{{ obj_perms|join:" " }}',
+        ))
+        context = {'user': self.user, 'contenttype': self.ctype, 'checker': checker}
+        with self.assertNumQueries(1):
+            output = render(template, context)
+
+        self.assertEqual(output, 'change_contenttype|change_contenttype')
+        self.assertFalse(checker.has_perm('change_contenttype', self.ctype))
@@ -1,9 +1,10 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import Group, AnonymousUser
 from django.db import models
 
+from guardian.compat import get_user_permission_full_codename
 from guardian.testapp.tests.conf import skipUnlessTestApp
 from guardian.testapp.tests.test_core import ObjectPermissionTestCase
 from guardian.testapp.models import Project
@@ -12,11 +13,13 @@ from guardian.testapp.models import ProjectGroupObjectPermission
 from guardian.models import UserObjectPermission
 from guardian.models import UserObjectPermissionBase
 from guardian.models import GroupObjectPermission
+from guardian.shortcuts import assign_perm
 from guardian.utils import get_anonymous_user
 from guardian.utils import get_identity
 from guardian.utils import get_user_obj_perms_model
 from guardian.utils import get_group_obj_perms_model
 from guardian.utils import get_obj_perms_model
+from guardian.utils import user_has_perms
 from guardian.exceptions import NotUserNorGroup
 
 User = get_user_model()
@@ -142,3 +145,40 @@ class GetObjPermsModelTest(TestCase):
         perm_model = get_obj_perms_model(obj, UserObjectPermissionBase,
                                          UserObjectPermission)
         self.assertEqual(perm_model, UserObjectPermission)
+
+
+class ObjectPermissionsBackend:
+    """
+    Backend granting permission to change any user to users named ``jane``.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return obj is not None and user_obj.username == 'jane' and perm == get_user_permission_full_codename('change')
+
+
+@skipUnlessTestApp
+class UserHasPermsTest(TestCase):
+
+    def setUp(self):
+        self.joe = User.objects.create_user('joe', 'joe@example.com', 'foobar')
+        self.jane = User.objects.create_user('jane', 'jane@example.com', 'foobar')
+        self.perms = [get_user_permission_full_codename('change'), get_user_permission_full_codename('delete')]
+
+    def test_granted(self):
+        assign_perm(self.perms[0], self.joe, self.jane)
+        assign_perm(self.perms[1], self.joe, self.jane)
+        self.assertTrue(user_has_perms(self.joe, self.perms, self.jane))
+
+    def test_denied_with_single_fetch(self):
+        # Permissions of the object are fetched once: user's, organizations'
+        with self.assertNumQueries(2):
+            self.assertFalse(user_has_perms(self.joe, self.perms[:1], self.jane))
+
+    @override_settings(AUTHENTICATION_BACKENDS=('django.contrib.auth.backends.ModelBackend',
+                                                'guardian.backends.ObjectPermissionBackend',
+                                                'guardian.testapp.tests.test_utils.ObjectPermissionsBackend'))
+    def test_other_object_permissions_backends(self):
+        self.assertFalse(user_has_perms(self.jane, self.perms, self.joe))
+        assign_perm(self.perms[1], self.jane, self.joe)
+        self.assertTrue(user_has_perms(self.jane, self.perms, self.joe))
+        self.assertFalse(user_has_perms(self.joe, self.perms, self.jane))
@@ -7,21 +7,31 @@ they actual input parameters/output type may change in future releases.
 """
 import logging
 import os
-from datetime import datetime
-from itertools import chain
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 from django.conf import settings
-from django.contrib.auth import REDIRECT_FIELD_NAME, get_user_model
+from django.contrib.auth import REDIRECT_FIELD_NAME, get_backends, get_user_model
 from django.contrib.auth.models import AnonymousUser, Group
-from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
-from django.db.models import Model, QuerySet
+from django.core.exceptions import EmptyResultSet, ObjectDoesNotExist, PermissionDenied, ValidationError
+from django.db import connections, router, transaction
+from django.db.models import (
+    AutoField, BigIntegerField, CharField, Exists, ForeignKey, IntegerField, Model, OuterRef,
+    PositiveIntegerField, PositiveSmallIntegerField, Q, QuerySet, SmallIntegerField, TextField, UUIDField
+)
+from django.db.models.functions import Cast
 from django.http import HttpResponseForbidden, HttpResponseNotFound
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.module_loading import import_string
 from django.utils.timezone import utc
 
 from guardian.conf import settings as guardian_settings
 from guardian.ctypes import get_content_type
-from guardian.exceptions import NotUserNorGroup
+from guardian.exceptions import NotUserNorGroup, ObjPermsMigrationError
+from guardian.signals import obj_perms_bulk_changed
 from organizations.models import Organization
 
 logger = logging.getLogger(__name__)
@@ -32,7 +42,15 @@ def get_anonymous_user():
     """
     Returns ``User`` instance (not ``AnonymousUser``) depending on
     ``ANONYMOUS_USER_NAME`` configuration.
+
+    If :setting:`GUARDIAN_ANONYMOUS_USER_CACHE` is set, the user is fetched
+    only once per process (see
+    :func:`guardian.cache.get_cached_anonymous_user`).
     """
+    if guardian_settings.ANONYMOUS_USER_CACHE:
+        from guardian.cache import get_cached_anonymous_user
+
+        return get_cached_anonymous_user()
     User = get_user_model()
     lookup = {User.USERNAME_FIELD: guardian_settings.ANONYMOUS_USER_NAME}
     return User.objects.get(**lookup)
@@ -99,6 +117,52 @@ def get_identity(identity):
         "(got %s)" % identity)
 
 
+def _may_grant_obj_perms(backend):
+    # Django's ModelBackend and BaseBackend never grant object permissions
+    # unless their permission methods are overridden
+    from django.contrib.auth.backends import BaseBackend, ModelBackend
+
+    backend_class = type(backend)
+    if not hasattr(backend_class, 'has_perm'):
+        return False
+    if backend_class.has_perm not in (BaseBackend.has_perm, ModelBackend.has_perm):
+        return True
+    if backend_class.get_all_permissions is ModelBackend.get_all_permissions:
+        return False
+    return not (backend_class.get_all_permissions is BaseBackend.get_all_permissions and
+                backend_class.get_user_permissions is BaseBackend.get_user_permissions and
+                backend_class.get_group_permissions is BaseBackend.get_group_permissions)
+
+
+def user_has_perms(user, perms, obj):
+    """
+    Returns ``True`` if ``user`` has all of ``perms`` for ``obj``.
+
+    Authentication backends implementing ``has_perms`` (like
+    :class:`guardian.backends.ObjectPermissionBackend`) are asked for all
+    permissions at once, so that permissions of ``obj`` are fetched only
+    once. Other backends are asked only if they may grant object permissions
+    at all, and then only for permissions missing to the first ones.
+    """
+    if obj is None or not user.is_active or user.is_superuser:
+        return user.has_perms(perms, obj)
+    perms_backends, other_backends = [], []
+    for backend in get_backends():
+        if hasattr(backend, 'has_perms'):
+            perms_backends.append(backend)
+        elif _may_grant_obj_perms(backend):
+            other_backends.append(backend)
+    for backend in perms_backends:
+        if backend.has_perms(user, perms, obj):
+            return True
+    if not other_backends:
+        return False
+    missing = [perm for perm in perms if not any(backend.has_perm(user, perm, obj) for backend in other_backends)]
+    if len(missing) == len(perms):
+        return False
+    return not missing or any(backend.has_perms(user, missing, obj) for backend in perms_backends)
+
+
 def get_40x_or_None(request, perms, obj=None, login_url=None,
                     redirect_field_name=None, return_403=False,
                     return_404=False, accept_global_perms=False):
@@ -114,31 +178,41 @@ def get_40x_or_None(request, perms, obj=None, login_url=None,
         has_permissions = all(request.user.has_perm(perm) for perm in perms)
     # if still no permission granted, try obj perms
     if not has_permissions:
-        has_permissions = all(request.user.has_perm(perm, obj)
-                              for perm in perms)
+        has_permissions = user_has_perms(request.user, perms, obj)
 
     if not has_permissions:
-        if return_403:
-            if guardian_settings.RENDER_403:
-                response = render(request, guardian_settings.TEMPLATE_403)
-                response.status_code = 403
-                return response
-            elif guardian_settings.RAISE_403:
-                raise PermissionDenied
-            return HttpResponseForbidden()
-        if return_404:
-            if guardian_settings.RENDER_404:
-                response = render(request, guardian_settings.TEMPLATE_404)
-                response.status_code = 404
-                return response
-            elif guardian_settings.RAISE_404:
-                raise ObjectDoesNotExist
-            return HttpResponseNotFound()
-        else:
-            from django.contrib.auth.views import redirect_to_login
-            return redirect_to_login(request.get_full_path(),
-                                     login_url,
-                                     redirect_field_name)
+        return get_40x_response(request, login_url, redirect_field_name, return_403, return_404)
+
+
+def get_40x_response(request, login_url=None, redirect_field_name=None,
+                     return_403=False, return_404=False):
+    """
+    Returns response for a request denied by :func:`get_40x_or_None`.
+    """
+    login_url = login_url or settings.LOGIN_URL
+    redirect_field_name = redirect_field_name or REDIRECT_FIELD_NAME
+
+    if return_403:
+        if guardian_settings.RENDER_403:
+            response = render(request, guardian_settings.TEMPLATE_403)
+            response.status_code = 403
+            return response
+        elif guardian_settings.RAISE_403:
+            raise PermissionDenied
+        return HttpResponseForbidden()
+    if return_404:
+        if guardian_settings.RENDER_404:
+            response = render(request, guardian_settings.TEMPLATE_404)
+            response.status_code = 404
+            return response
+        elif guardian_settings.RAISE_404:
+            raise ObjectDoesNotExist
+        return HttpResponseNotFound()
+    else:
+        from django.contrib.auth.views import redirect_to_login
+        return redirect_to_login(request.get_full_path(),
+                                 login_url,
+                                 redirect_field_name)
 
 
 from django.apps import apps as django_apps
@@ -159,26 +233,236 @@ def get_obj_perm_model_by_conf(setting_name):
         ) from e
 
 
-def clean_orphan_obj_perms():
+def _get_target_pk_field(model):
+    pk = model._meta.pk
+    while isinstance(pk, ForeignKey):
+        pk = pk.target_field
+    return pk
+
+
+def is_integer_pk_model(model):
+    """
+    Returns ``True`` if primary key of ``model`` is an integer column.
+    """
+    return isinstance(_get_target_pk_field(model), (
+        IntegerField, AutoField, BigIntegerField, PositiveIntegerField,
+        PositiveSmallIntegerField, SmallIntegerField))
+
+
+def get_native_object_pk_field(model):
+    """
+    Returns name of the column of generic object permissions holding
+    ``object_pk`` of ``model`` instances in their native type -
+    ``'object_pk_int'`` for integer and ``'object_pk_uuid'`` for UUID primary
+    keys - or ``None`` for other primary keys.
+    """
+    if is_integer_pk_model(model):
+        return 'object_pk_int'
+    if isinstance(_get_target_pk_field(model), UUIDField):
+        return 'object_pk_uuid'
+    return None
+
+
+def get_object_pk_lookup(obj_perms_model, model):
+    """
+    Returns name of the field of generic ``obj_perms_model`` to look up
+    grants for ``model`` instances by their primary keys with - native typed
+    ``object_pk_int``/``object_pk_uuid`` column if enabled by
+    :setting:`GUARDIAN_NATIVE_OBJECT_PK`, ``object_pk`` otherwise.
+    """
+    if guardian_settings.NATIVE_OBJECT_PK:
+        native_field = get_native_object_pk_field(model)
+        if native_field and hasattr(obj_perms_model, native_field):
+            return native_field
+    return 'object_pk'
+
+
+def set_native_object_pk(obj_perm):
+    """
+    Fills ``object_pk_int``/``object_pk_uuid`` of generic ``obj_perm`` from
+    its ``object_pk``. Does not save ``obj_perm``.
+    """
+    from django.contrib.contenttypes.models import ContentType
+
+    obj_perm.object_pk_int = obj_perm.object_pk_uuid = None
+    target_model = ContentType.objects.get_for_id(obj_perm.content_type_id).model_class()
+    native_field = target_model and get_native_object_pk_field(target_model)
+    if native_field:
+        try:
+            value = _get_target_pk_field(target_model).to_python(obj_perm.object_pk)
+        except ValidationError:
+            return
+        setattr(obj_perm, native_field, value)
+
+
+def backfill_native_object_pks(batch_size=1000, progress=None):
+    """
+    Fills ``object_pk_int``/``object_pk_uuid`` of generic object permissions
+    created before those columns existed, with one ``UPDATE`` per
+    ``batch_size`` grants. Must be run once before enabling
+    :setting:`GUARDIAN_NATIVE_OBJECT_PK`.
+
+    :param progress: callable accepting ``(model, filled)`` called after each
+      batch.
+
+    Returns number of filled grants.
+    """
+    from django.contrib.contenttypes.models import ContentType
+
+    filled = 0
+    for model in get_generic_obj_perms_models():
+        model_filled = 0
+        ctype_ids = model.objects.order_by().values_list('content_type', flat=True).distinct()
+        for ctype_id in ctype_ids:
+            target_model = ContentType.objects.get_for_id(ctype_id).model_class()
+            native_field = target_model and get_native_object_pk_field(target_model)
+            if not native_field:
+                continue
+            pk_field = _get_target_pk_field(target_model)
+            queryset = (model.objects
+                        .filter(content_type_id=ctype_id, **{'%s__isnull' % native_field: True})
+                        .order_by('pk'))
+            last_pk = None
+            while True:
+                page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                rows = list(page.values_list('pk', 'object_pk')[:batch_size])
+                if not rows:
+                    break
+                obj_perms = []
+                for pk, object_pk in rows:
+                    try:
+                        obj_perms.append(model(pk=pk, **{native_field: pk_field.to_python(object_pk)}))
+                    except ValidationError:
+                        logger.warning("Cannot convert object_pk %r of %s %s", object_pk,
+                                       model._meta.label, pk)
+                model.objects.bulk_update(obj_perms, [native_field])
+                model_filled += len(obj_perms)
+                if progress:
+                    progress(model, model_filled)
+                if len(rows) < batch_size:
+                    break
+                last_pk = rows[-1][0]
+        filled += model_filled
+    return filled
+
+
+def _get_orphan_obj_perms_queryset(model, ctype):
+    """
+    Returns queryset of grants of the generic object permission ``model`` for
+    ``ctype`` pointing at non-existing targets, using a ``NOT EXISTS``
+    anti-join against target's table. Returns ``None`` if ``object_pk``
+    cannot be compared with target's primary key in SQL.
+    """
+    target_model = ctype.model_class()
+    pk_field = _get_target_pk_field(target_model)
+    if is_integer_pk_model(target_model):
+        target_pk = Cast(OuterRef('object_pk'), BigIntegerField())
+    elif isinstance(pk_field, (CharField, TextField)):
+        target_pk = OuterRef('object_pk')
+    else:
+        return None
+    targets = target_model._base_manager.filter(pk=target_pk).values('pk')
+    return (model.objects
+            .filter(content_type=ctype)
+            .annotate(target_exists=Exists(targets))
+            .filter(target_exists=False))
+
+
+def _iter_orphan_obj_perm_pks(model, ctype, batch_size):
+    """
+    Yields lists of at most ``batch_size`` primary keys of orphaned grants of
+    ``model`` for ``ctype``.
+    """
+    orphans = _get_orphan_obj_perms_queryset(model, ctype)
+    last_pk = None
+    while True:
+        if orphans is not None:
+            page = orphans if last_pk is None else orphans.filter(pk__gt=last_pk)
+            pks = list(page.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            scanned = pks
+        else:
+            # Targets can't be joined in SQL, look them up a batch at a time
+            page = model.objects.filter(content_type=ctype)
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            scanned = list(page.order_by('pk').values_list('pk', 'object_pk')[:batch_size])
+            target_model = ctype.model_class()
+            pk_field = _get_target_pk_field(target_model)
+            target_pks = {}
+            for pk, object_pk in scanned:
+                try:
+                    target_pks[pk] = pk_field.to_python(object_pk)
+                except ValidationError:
+                    target_pks[pk] = None
+            existing = set(target_model._base_manager
+                           .filter(pk__in=[v for v in target_pks.values() if v is not None])
+                           .values_list('pk', flat=True))
+            pks = [pk for pk, target_pk in target_pks.items() if target_pk not in existing]
+            scanned = [pk for pk, _ in scanned]
+        if pks:
+            yield pks
+        if len(scanned) < batch_size:
+            return
+        last_pk = scanned[-1]
+
+
+def _clean_orphan_obj_perms_for_ctype(model, ctype, batch_size, dry_run, progress):
+    removed = 0
+    try:
+        for pks in _iter_orphan_obj_perm_pks(model, ctype, batch_size):
+            if dry_run:
+                removed += len(pks)
+            else:
+                removed += delete_obj_perms(model, pks)
+            if progress:
+                progress(model, ctype, removed)
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            # Workers of the thread pool use connections of their own
+            connections.close_all()
+    return removed
+
+
+def clean_orphan_obj_perms(batch_size=1000, dry_run=False, content_types=None, workers=1, progress=None):
     """
     Seeks and removes all object permissions entries pointing at non-existing
     targets.
 
+    Grants are processed per content type; orphans are found with a single
+    anti-join against target's table and removed in chunks of ``batch_size``.
+    Grants of content types without a model class are left untouched (those
+    are removed along with stale content types).
+
+    :param dry_run: if ``True``, orphans are only counted.
+    :param content_types: iterable of ``ContentType`` instances to restrict
+      cleaning to.
+    :param workers: number of threads processing content types in parallel,
+      each using a database connection of its own.
+    :param progress: callable accepting ``(model, ctype, removed)`` called after
+      each chunk.
+
     Returns number of removed objects.
     """
-    from guardian.models import UserObjectPermission
-    from guardian.models import GroupObjectPermission
-    from guardian.models import OrganizationObjectPermission
+    from django.contrib.contenttypes.models import ContentType
 
-    deleted = 0
-    # TODO: optimise
-    for perm in chain(UserObjectPermission.objects.all().iterator(),
-                      GroupObjectPermission.objects.all().iterator(),
-                      OrganizationObjectPermission.objects.all().iterator()):
-        if perm.content_object is None:
-            logger.debug("Removing %s (pk=%d)" % (perm, perm.pk))
-            perm.delete()
-            deleted += 1
+    tasks = []
+    for model in get_generic_obj_perms_models():
+        ctype_ids = model.objects.order_by().values_list('content_type', flat=True).distinct()
+        ctypes = ContentType.objects.filter(pk__in=list(ctype_ids))
+        if content_types is not None:
+            ctypes = ctypes.filter(pk__in=[ctype.pk for ctype in content_types])
+        for ctype in ctypes:
+            if ctype.model_class() is None:
+                logger.warning("Skipping object permissions for %s.%s which has no model class"
+                               % (ctype.app_label, ctype.model))
+                continue
+            tasks.append((model, ctype, batch_size, dry_run, progress))
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            deleted = sum(executor.map(lambda task: _clean_orphan_obj_perms_for_ctype(*task), tasks))
+    else:
+        deleted = sum(_clean_orphan_obj_perms_for_ctype(*task) for task in tasks)
     logger.info("Total removed orphan object permissions instances: %d" %
                 deleted)
     return deleted
@@ -250,6 +534,489 @@ def get_organization_obj_perms_model(obj):
     return get_obj_perms_model(obj, OrganizationObjectPermissionBase, OrganizationObjectPermission)
 
 
+def get_generic_obj_perms_models():
+    """
+    Returns generic (``content_type``/``object_pk`` based) user, group and
+    organization object permission models, in that order.
+    """
+    return (get_user_obj_perms_model(),
+            get_group_obj_perms_model(),
+            get_organization_obj_perms_model(None))
+
+
+
+def get_direct_obj_perms_models(model):
+    """
+    Returns ``(generic_model, direct_model)`` pairs for user, group and
+    organization object permissions of ``model``, where ``direct_model`` is
+    the object permission model with direct foreign key to ``model`` (even if
+    disabled with ``enabled = False``) or ``None``.
+    """
+    from guardian.models import GroupObjectPermissionBase, OrganizationObjectPermissionBase, \
+        UserObjectPermissionBase
+
+    pairs = []
+    base_classes = (UserObjectPermissionBase, GroupObjectPermissionBase, OrganizationObjectPermissionBase)
+    for generic_model, base_cls in zip(get_generic_obj_perms_models(), base_classes):
+        direct_model = None
+        for field in model._meta.get_fields():
+            related_model = getattr(field, 'related_model', None)
+            if (field.one_to_many and field.auto_created and related_model and
+                    issubclass(related_model, base_cls) and not related_model.objects.is_generic()):
+                direct_model = related_model
+                break
+        pairs.append((generic_model, direct_model))
+    return pairs
+
+
+def _expires_later(grant, other):
+    """
+    Returns ``True`` if ``grant`` (dictionary of grant's values) expires
+    later than ``other``, no ``permission_expiry`` being the latest one.
+    Grants without expiry fields never expire later than each other.
+    """
+    if 'permission_expiry' not in grant:
+        return False
+    expiry, other_expiry = grant['permission_expiry'], other['permission_expiry']
+    return other_expiry is not None and (expiry is None or expiry > other_expiry)
+
+
+def migrate_obj_perms_to_direct_models(model, batch_size=1000, progress=None):
+    """
+    Moves generic user, group and organization object permissions of
+    ``model`` instances to its direct foreign key object permission models
+    (see :ref:`performance-direct-fk`), in batches of ``batch_size`` grants
+    ordered by primary key.
+
+    Each batch is copied within a single transaction: grants are inserted into
+    direct model's table, checked to be all present there and only then
+    removed from generic model's table. Grants already present in direct
+    model's table are merged with copied ones, keeping the later
+    ``permission_expiry`` (no expiry being the latest) together with its
+    notification flags. Grants pointing at non-existing objects are left in
+    generic tables.
+
+    :param progress: callable accepting ``(direct_model, migrated)`` called
+      after each batch.
+
+    :raises ObjPermsMigrationError: if a batch was not copied completely.
+
+    Returns dictionary mapping direct object permission model to number of
+    migrated grants.
+    """
+    ctype = get_content_type(model)
+    pk_field = _get_target_pk_field(model)
+    expiry_fields = ('permission_expiry', 'permission_expiry_30day_email_sent',
+                     'permission_expiry_0day_email_sent')
+    migrated = {}
+    for generic_model, direct_model in get_direct_obj_perms_models(model):
+        if direct_model is None:
+            continue
+        migrated[direct_model] = 0
+        identity_field = '%s_id' % generic_model.objects.user_or_group_field
+        direct_fields = {field.attname for field in direct_model._meta.concrete_fields}
+        copied_fields = [name for name in expiry_fields if name in direct_fields]
+        queryset = generic_model.objects.filter(content_type=ctype).order_by('pk')
+        last_pk = None
+        while True:
+            page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(page.values('pk', identity_field, 'permission_id', 'object_pk', *copied_fields)[:batch_size])
+            if not rows:
+                break
+            targets = {}
+            for row in rows:
+                try:
+                    targets[row['object_pk']] = pk_field.to_python(row['object_pk'])
+                except ValidationError:
+                    pass
+            existing = set(model._base_manager.filter(pk__in=targets.values()).values_list('pk', flat=True))
+            moved = [row for row in rows if targets.get(row['object_pk']) in existing]
+            if len(moved) < len(rows):
+                logger.warning("Skipping %d grants of %s pointing at non-existing %s objects",
+                               len(rows) - len(moved), generic_model._meta.label, model._meta.label)
+            expected = {(row[identity_field], row['permission_id'], targets[row['object_pk']]):
+                        tuple(row[name] for name in copied_fields) for row in moved}
+            with transaction.atomic(using=router.db_for_write(direct_model)):
+                batch_filters = {
+                    'content_object_id__in': {target for _, _, target in expected},
+                    '%s__in' % identity_field: {identity for identity, _, _ in expected},
+                }
+                key_fields = (identity_field, 'permission_id', 'content_object_id')
+                present = {}
+                for row in (direct_model.objects.select_for_update().filter(**batch_filters)
+                            .values('pk', *key_fields, *copied_fields)):
+                    key = tuple(row[name] for name in key_fields)
+                    if key in expected:
+                        present[key] = row['pk'], tuple(row[name] for name in copied_fields)
+                for key, (pk, values) in present.items():
+                    if not _expires_later(dict(zip(copied_fields, expected[key])), dict(zip(copied_fields, values))):
+                        expected[key] = values
+                    elif expected[key] != values:
+                        direct_model.objects.filter(pk=pk).update(**dict(zip(copied_fields, expected[key])))
+                direct_model.objects.bulk_create([
+                    direct_model(content_object_id=target,
+                                 **{identity_field: identity, 'permission_id': permission_id},
+                                 **dict(zip(copied_fields, values)))
+                    for (identity, permission_id, target), values in expected.items() if
+                    (identity, permission_id, target) not in present], ignore_conflicts=True)
+                copied = {tuple(row[:3]): tuple(row[3:]) for row in direct_model.objects.filter(**batch_filters)
+                          .values_list(*key_fields, *copied_fields)}
+                mismatched = [key for key, values in expected.items() if copied.get(key) != values]
+                if mismatched:
+                    raise ObjPermsMigrationError("%d grants of %s were not copied to %s" % (
+                        len(mismatched), generic_model._meta.label, direct_model._meta.label))
+                delete_obj_perms(generic_model, [row['pk'] for row in moved])
+            migrated[direct_model] += len(moved)
+            if progress:
+                progress(direct_model, migrated[direct_model])
+            if len(rows) < batch_size:
+                break
+            last_pk = rows[-1]['pk']
+    return migrated
+
+
+
+def use_effective_obj_perms(model):
+    """
+    Returns ``True`` if user object permissions of ``model`` instances should
+    be read from :model:`EffectiveObjectPermission`, i.e. if
+    :setting:`GUARDIAN_EFFECTIVE_OBJ_PERMS` is enabled and all object
+    permission models of ``model`` are generic.
+    """
+    return guardian_settings.EFFECTIVE_OBJ_PERMS and all(
+        obj_perms_model.objects.is_generic() for obj_perms_model in (
+            get_user_obj_perms_model(model),
+            get_group_obj_perms_model(model),
+            get_organization_obj_perms_model(model)))
+
+
+def get_identity_user_ids(identity_field, identity_ids):
+    """
+    Returns set of primary keys of users being given users
+    (``identity_field`` is ``'user'``), members of given groups (``'group'``)
+    or of given organizations (``'organization'``).
+    """
+    User = get_user_model()
+    if identity_field == 'user':
+        return set(identity_ids)
+    if identity_field == 'group':
+        lookup = User.groups.field.name
+    else:
+        lookup = Organization.users.field.related_query_name()
+    return set(User.objects.filter(**{'%s__in' % lookup: identity_ids}).values_list('pk', flat=True))
+
+
+def get_effective_obj_perms_sources(group_grants=True):
+    """
+    Returns values of :model:`EffectiveObjectPermission` ``source`` of user,
+    group (unless ``group_grants`` is ``False``, as read by
+    :class:`guardian.core.ObjectPermissionChecker`) and organization grants.
+    """
+    return [model._meta.label_lower for model in get_generic_obj_perms_models()
+            if group_grants or model is not get_group_obj_perms_model()]
+
+
+def refresh_effective_obj_perms(user_ids=None, ctype_id=None, object_pks=None, exclude_permission_ids=()):
+    """
+    Recomputes :model:`EffectiveObjectPermission` entries of given users (all
+    users if ``None``) from their user, group and organization object
+    permissions, optionally only for objects of content type ``ctype_id``
+    with given ``object_pks``. Entries are kept per source object permission
+    model; if a permission is granted by more than one group or organization,
+    the latest expiry is kept.
+
+    :param exclude_permission_ids: permissions which should not be granted,
+      i.e. because they are being deleted.
+    """
+    from guardian.models import EffectiveObjectPermission
+
+    User = get_user_model()
+    scope = Q()
+    if ctype_id is not None:
+        scope &= Q(content_type_id=ctype_id)
+    if object_pks is not None:
+        scope &= Q(object_pk__in=[str(pk) for pk in object_pks])
+
+    user_model, group_model, organization_model = get_generic_obj_perms_models()
+    sources = ((user_model, 'user'),
+               (group_model, 'group__%s' % User.groups.field.related_query_name()),
+               (organization_model, 'organization__users'))
+    effective = {}
+    for model, user_lookup in sources:
+        queryset = model.objects.filter(scope)
+        if user_ids is not None:
+            queryset = queryset.filter(**{'%s__in' % user_lookup: user_ids})
+        else:
+            queryset = queryset.filter(**{'%s__isnull' % user_lookup: False})
+        rows = queryset.values_list(user_lookup, 'content_type_id', 'object_pk', 'permission_id',
+                                    'permission_expiry')
+        for user_id, content_type_id, object_pk, permission_id, expiry in rows:
+            if permission_id in exclude_permission_ids:
+                continue
+            key = (user_id, content_type_id, object_pk, permission_id, model._meta.label_lower)
+            current = effective.get(key, False)
+            # ``None`` expiry means never expiring permission
+            if current is False or current is not None and (expiry is None or expiry > current):
+                effective[key] = expiry
+
+    stale = EffectiveObjectPermission.objects.filter(scope)
+    if user_ids is not None:
+        stale = stale.filter(user_id__in=user_ids)
+    with transaction.atomic(using=router.db_for_write(EffectiveObjectPermission)):
+        _delete_rows(stale)
+        EffectiveObjectPermission.objects.bulk_create([
+            EffectiveObjectPermission(user_id=user_id, content_type_id=content_type_id, object_pk=object_pk,
+                                      permission_id=permission_id, permission_expiry=expiry, source=source)
+            for (user_id, content_type_id, object_pk, permission_id, source), expiry in effective.items()
+        ], batch_size=500)
+
+
+def rebuild_effective_obj_perms(batch_size=1000, progress=None):
+    """
+    Recomputes all :model:`EffectiveObjectPermission` entries, for
+    ``batch_size`` users at once.
+
+    :param progress: callable accepting number of processed users, called
+      after each batch.
+
+    Returns number of processed users.
+    """
+    queryset = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+    processed = 0
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        user_ids = list(page[:batch_size])
+        if not user_ids:
+            break
+        refresh_effective_obj_perms(user_ids=user_ids)
+        processed += len(user_ids)
+        if progress:
+            progress(processed)
+        if len(user_ids) < batch_size:
+            break
+        last_pk = user_ids[-1]
+    return processed
+
+
+# Maps expiry notification threshold name to the flag marking the notification
+# as sent and to how long before ``permission_expiry`` the threshold is crossed.
+EXPIRY_THRESHOLDS = {
+    '0day': ('permission_expiry_0day_email_sent', timedelta(0)),
+    '30day': ('permission_expiry_30day_email_sent', timedelta(days=30)),
+}
+
+
+def iter_expiring_obj_perms(model, threshold, batch_size=1000, now=None):
+    """
+    Yields lists of at most ``batch_size`` grants of the generic object
+    permission ``model`` which crossed given ``threshold`` (one of
+    ``EXPIRY_THRESHOLDS`` keys) and were not flagged as notified yet.
+
+    Grants are read with a range scan over ``permission_expiry`` and paginated
+    with a ``(permission_expiry, pk)`` keyset, so every batch costs the same no
+    matter how big the table is. The ``30day`` threshold does not include
+    grants which have already expired.
+    """
+    flag, delta = EXPIRY_THRESHOLDS[threshold]
+    now = now or timezone.now()
+    queryset = model.objects.filter(**{flag: False, 'permission_expiry__lte': now + delta})
+    if delta:
+        queryset = queryset.filter(permission_expiry__gt=now)
+    queryset = (queryset
+                .select_related('permission', 'content_type', model.objects.user_or_group_field)
+                .order_by('permission_expiry', 'pk'))
+
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(permission_expiry__gt=last[0]) |
+                               Q(permission_expiry=last[0], pk__gt=last[1]))
+        batch = list(page[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last = (batch[-1].permission_expiry, batch[-1].pk)
+
+
+def log_expiring_obj_perms(model, threshold, grants):
+    """
+    Default callback of :func:`sweep_expiring_obj_perms`; only logs the grants.
+    """
+    for grant in grants:
+        logger.info("Object permission %s (pk=%s) crossed the %s expiry threshold (expires %s)"
+                    % (grant, grant.pk, threshold, grant.permission_expiry))
+
+
+def sweep_expiring_obj_perms(callback=None, thresholds=('0day', '30day'), batch_size=1000, now=None):
+    """
+    Hands grants crossing expiry notification ``thresholds`` over to
+    ``callback`` and flags them as notified.
+
+    :param callback: callable accepting ``(model, threshold, grants)``. If it
+      returns a collection of primary keys, only those grants are flagged as
+      notified and the others are offered again on the next sweep. Defaults to
+      the function pointed by :setting:`GUARDIAN_EXPIRY_SWEEP_CALLBACK`.
+    :param thresholds: iterable of ``EXPIRY_THRESHOLDS`` keys.
+    :param batch_size: maximum number of grants passed to a single
+      ``callback`` call; flags of each batch are set with a single ``UPDATE``.
+
+    Returns dictionary mapping threshold to number of grants flagged by the
+    sweep.
+    """
+    if callback is None:
+        callback = import_string(guardian_settings.EXPIRY_SWEEP_CALLBACK)
+    now = now or timezone.now()
+
+    flagged = {}
+    for threshold in thresholds:
+        flag = EXPIRY_THRESHOLDS[threshold][0]
+        flagged[threshold] = 0
+        for model in get_generic_obj_perms_models():
+            for grants in iter_expiring_obj_perms(model, threshold, batch_size, now):
+                notified = callback(model, threshold, grants)
+                pks = [grant.pk for grant in grants]
+                if notified is not None:
+                    # Only grants of the batch which are not flagged yet
+                    notified = set(notified)
+                    pks = [pk for pk in pks if pk in notified]
+                if pks:
+                    flagged[threshold] += model.objects.filter(pk__in=pks, **{flag: False}).update(**{flag: True})
+    return flagged
+
+
+def get_obj_perm_row_fields(model):
+    """
+    Returns names of fields identifying grants of the object permission
+    ``model``; rows sent with :data:`guardian.signals.obj_perms_bulk_changed`
+    contain values of these fields.
+    """
+    fields = ('pk', '%s_id' % model.objects.user_or_group_field, 'permission_id')
+    if model.objects.is_generic():
+        return fields + ('content_type_id', 'object_pk')
+    return fields + ('content_object_id',)
+
+
+def _delete_rows(queryset):
+    """
+    Deletes rows matched by ``queryset`` with a single ``DELETE`` query,
+    without fetching them for ``pre_delete``/``post_delete`` signals and
+    cascades. Returns number of deleted rows.
+    """
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    try:
+        sql, params = queryset.values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    pk_column = quote_name(queryset.model._meta.pk.column)
+    # The derived table lets MySQL delete from the table it selects from
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE %s IN (SELECT %s FROM (%s) %s)' % (
+            quote_name(queryset.model._meta.db_table), pk_column, pk_column, sql, quote_name('matched')), params)
+        return cursor.rowcount
+
+
+def _delete_obj_perms_queryset(queryset, rows=None):
+    model = queryset.model
+    if rows is None and obj_perms_bulk_changed.has_listeners(model):
+        rows = list(queryset.values(*get_obj_perm_row_fields(model)))
+    # Object permissions are never referenced by other models, so there is
+    # nothing to collect and no need to fetch rows for per-row signals
+    deleted = _delete_rows(queryset)
+    if rows:
+        obj_perms_bulk_changed.send(sender=model, action='delete', rows=rows)
+    return deleted
+
+
+def delete_obj_perms(model, pks, rows=None):
+    """
+    Deletes grants of the object permission ``model`` with given primary keys
+    using a single ``DELETE`` query and notifies receivers of
+    :data:`guardian.signals.obj_perms_bulk_changed`.
+
+    :param rows: values of ``get_obj_perm_row_fields(model)`` for deleted
+      grants, if already known by the caller.
+
+    Returns number of deleted grants.
+    """
+    return _delete_obj_perms_queryset(model.objects.filter(pk__in=pks), rows=rows)
+
+
+def delete_obj_perms_for_targets(ctype, object_pks, batch_size=500):
+    """
+    Deletes generic user, group and organization object permissions for
+    objects of ``ctype`` (``ContentType`` instance or its id) with given
+    primary keys, using one ``DELETE`` per object permission model and
+    ``batch_size`` targets.
+
+    Returns number of deleted grants.
+    """
+    object_pks = [str(pk) for pk in object_pks]
+    deleted = 0
+    for model in get_generic_obj_perms_models():
+        for i in range(0, len(object_pks), batch_size):
+            deleted += _delete_obj_perms_queryset(model.objects.filter(
+                content_type=ctype, object_pk__in=object_pks[i:i + batch_size]))
+    return deleted
+
+
+def purge_expired_obj_perms(days=0, archive=True, batch_size=1000, sleep=0, now=None, progress=None):
+    """
+    Removes generic object permissions which expired more than ``days`` ago
+    from object permission tables in batches, moving them to
+    :model:`ArchivedObjectPermission` first if ``archive`` is ``True``.
+
+    :param batch_size: number of grants removed by a single transaction.
+    :param sleep: seconds to sleep between batches, so that the purge does not
+      starve other database traffic.
+    :param progress: callable accepting ``(model, purged)`` called after each
+      batch.
+
+    Returns dictionary mapping object permission model to number of purged
+    grants.
+    """
+    from guardian.models import ArchivedObjectPermission
+
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    purged = {}
+    for model in get_generic_obj_perms_models():
+        purged[model] = 0
+        identity_field = '%s_id' % model.objects.user_or_group_field
+        fields = get_obj_perm_row_fields(model) + ('permission_expiry',)
+        queryset = model.objects.filter(permission_expiry__lt=cutoff).order_by('pk')
+        last_pk = None
+        while True:
+            page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(page.values(*fields)[:batch_size])
+            if not rows:
+                break
+            with transaction.atomic(using=router.db_for_write(model)):
+                if archive:
+                    ArchivedObjectPermission.objects.bulk_create([
+                        ArchivedObjectPermission(
+                            source=model._meta.label_lower,
+                            source_pk=row['pk'],
+                            identity_id=str(row[identity_field]),
+                            content_type_id=row['content_type_id'],
+                            object_pk=row['object_pk'],
+                            permission_id=row['permission_id'],
+                            permission_expiry=row['permission_expiry'],
+                        ) for row in rows])
+                delete_obj_perms(model, [row['pk'] for row in rows], rows=rows)
+            purged[model] += len(rows)
+            if progress:
+                progress(model, purged[model])
+            if len(rows) < batch_size:
+                break
+            last_pk = rows[-1]['pk']
+            if sleep:
+                time.sleep(sleep)
+    return purged
+
+
 def evict_obj_perms_cache(obj):
     if hasattr(obj, '_guardian_perms_cache'):
         delattr(obj, '_guardian_perms_cache')
@@ -28,12 +28,11 @@ setup(
     ],
     include_package_data=True,
     license='BSD',
-    install_requires=["Django>=2.1"],
+    install_requires=["Django>=2.2"],
     tests_require=['mock', 'django-environ', 'pytest', 'pytest-django'],
     classifiers=['Development Status :: 5 - Production/Stable',
                  'Environment :: Web Environment',
                  'Framework :: Django',
-                 'Framework :: Django :: 2.1',
                  'Framework :: Django :: 2.2',
                  'Framework :: Django :: 3.0',
                  'Intended Audience :: Developers',